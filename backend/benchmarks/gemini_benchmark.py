@@ -0,0 +1,115 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks the per-item latency of Gemini prompt generation.
+
+Compares creating a Gen AI client for each item, as prompt generation used to,
+with the client shared per project and location, on a synthetic image. The
+requests are sent to Vertex AI, so the application default credentials must
+be set up for the project.
+
+With --clients-only, only the clients are created, without calling Gemini,
+to show the setup cost alone.
+
+Usage:
+  python benchmarks/gemini_benchmark.py --project PROJECT --location LOCATION
+      [--model MODEL] [--items N] [--clients-only]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable
+
+from google import genai
+from PIL import Image
+
+from gen_v import models
+from gen_v.video import clients
+from gen_v.video import generation
+
+
+def make_request(model_name: str, image_dir: str) -> models.GeminiPromptRequest:
+  """Creates a prompt request with a small synthetic PNG image."""
+  image_path = os.path.join(image_dir, 'product.png')
+  Image.new('RGB', (512, 512), (200, 120, 40)).save(image_path)
+  return models.GeminiPromptRequest(
+      prompt_text='Describe a short product video for this image.',
+      image_file_path=image_path,
+      model_name=model_name,
+  )
+
+
+def time_items(run_item: Callable[[], object], items: int) -> list[float]:
+  """Returns the seconds taken by each run of an item."""
+  latencies = []
+  for _ in range(items):
+    start = time.perf_counter()
+    run_item()
+    latencies.append(time.perf_counter() - start)
+  return latencies
+
+
+def report(label: str, latencies: list[float]) -> float:
+  """Prints the latency of the items and returns the median."""
+  median = statistics.median(latencies)
+  print(
+      f'{label}: median {median * 1000:.1f} ms,'
+      f' mean {statistics.mean(latencies) * 1000:.1f} ms'
+      f' over {len(latencies)} items'
+  )
+  return median
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--project', required=True)
+  parser.add_argument('--location', required=True)
+  parser.add_argument('--model', default='gemini-2.0-flash')
+  parser.add_argument('--items', type=int, default=10)
+  parser.add_argument('--clients-only', action='store_true')
+  args = parser.parse_args()
+
+  # The request reads the image when created, so the file isn't needed after.
+  with tempfile.TemporaryDirectory() as image_dir:
+    request = make_request(args.model, image_dir)
+
+  def new_client() -> genai.Client:
+    return genai.Client(
+        vertexai=True, project=args.project, location=args.location
+    )
+
+  def shared_client() -> genai.Client:
+    return clients.get_genai_client(args.project, args.location)
+
+  if args.clients_only:
+    per_item, shared = new_client, shared_client
+  else:
+
+    def per_item():
+      generation.get_gemini_generated_video_prompt(request, client=new_client())
+
+    def shared():
+      generation.get_gemini_generated_video_prompt(
+          request, project_id=args.project, location=args.location
+      )
+
+  per_item_median = report('Client per item', time_items(per_item, args.items))
+  # The first item creates the shared client, as in a pipeline run.
+  shared_median = report('Shared client', time_items(shared, args.items))
+  print(f'Speed-up of the median: x{per_item_median / shared_median:.1f}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,188 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks for the image utilities.
+
+Compares the vectorized background recolouring with the previous per-pixel
+implementation on synthetic product shots, and the single-decode rescaling
+with the previous implementation on large supplier photos.
+
+Usage:
+  python benchmarks/image_benchmark.py [--repeat N] [--skip-per-pixel]
+"""
+import argparse
+import concurrent.futures
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from gen_v import models
+from gen_v.utils import image
+
+_SIZES = {
+    '720p': (1280, 720),
+    '4K': (3840, 2160),
+}
+_LARGE_PHOTOS = {
+    '24MP JPEG': ((6000, 4000), 'JPEG'),
+    '24MP PNG': ((6000, 4000), 'PNG'),
+}
+_FIT_SIZE = (1280, 720)
+_TARGET_COLOR = models.RGBColor(r=255, g=255, b=255)
+_REPLACEMENT_COLOR = models.RGBColor(r=0, g=64, b=128)
+
+
+def make_product_shot(width: int, height: int) -> Image.Image:
+  """Creates a white-background image with a noisy product in the middle."""
+  rng = np.random.default_rng(seed=0)
+  pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+  pixels[height // 4 : 3 * height // 4, width // 4 : 3 * width // 4] = (
+      rng.integers(0, 256, size=(height // 2, width // 2, 3), dtype=np.uint8)
+  )
+  return Image.fromarray(pixels, 'RGB')
+
+
+def recolor_per_pixel(
+    source_image: Image.Image,
+    target_color: models.RGBColor,
+    replacement_color: models.RGBColor,
+    threshold: int = 25,
+) -> Image.Image:
+  """The per-pixel implementation that replace_background_color used to run."""
+  result = source_image.convert('RGBA')
+  image_data = result.load()
+  replacement_rgba = (*replacement_color.to_tuple(), 255)
+  for x in range(result.width):
+    for y in range(result.height):
+      current_color = models.RGBColor.from_tuple(image_data[x, y][:3])
+      if current_color.distance_to(target_color) < threshold:
+        image_data[x, y] = replacement_rgba
+  return result
+
+
+def rescale_image_to_fit_full_decode(
+    image_path: str, desired_width: int, desired_height: int
+) -> Image.Image:
+  """The previous rescale_image_to_fit, which decoded at full resolution."""
+  with Image.open(image_path) as source_image:
+    image_aspect_ratio = source_image.width / source_image.height
+  source_image = Image.open(image_path)
+  if image_aspect_ratio > desired_width / desired_height:
+    desired_height = int(
+        source_image.height * (desired_width / source_image.width)
+    )
+  else:
+    desired_width = int(
+        source_image.width * (desired_height / source_image.height)
+    )
+  resized_image = source_image.resize(
+      (desired_width, desired_height), Image.Resampling.LANCZOS
+  )
+  return resized_image.convert('RGBA')
+
+
+def _measure_rescale(rescale_func, image_path: str) -> tuple[float, float]:
+  """Runs a rescale in the current process, returning seconds and peak MiB."""
+  baseline_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  start = time.perf_counter()
+  rescale_func(image_path, *_FIT_SIZE)
+  elapsed = time.perf_counter() - start
+  peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return elapsed, (peak_kib - baseline_kib) / 1024
+
+
+def measure_rescale(rescale_func, image_path: str) -> tuple[float, float]:
+  """Measures a rescale in a fresh process so peak memory isn't shared.
+
+  Workers are forked from a small fork server, so they don't inherit the
+  benchmark's own peak memory.
+  """
+  with concurrent.futures.ProcessPoolExecutor(
+      1, mp_context=multiprocessing.get_context('forkserver')
+  ) as executor:
+    return executor.submit(_measure_rescale, rescale_func, image_path).result()
+
+
+def benchmark_rescale() -> None:
+  """Prints latency and peak memory of rescaling large photos to 720p."""
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    for name, (size, image_format) in _LARGE_PHOTOS.items():
+      image_path = os.path.join(tmp_dir, f'photo.{image_format.lower()}')
+      buffer = io.BytesIO()
+      make_product_shot(*size).save(buffer, image_format)
+      with open(image_path, 'wb') as f:
+        f.write(buffer.getvalue())
+      for label, rescale_func in (
+          ('full decode', rescale_image_to_fit_full_decode),
+          ('single decode', image.rescale_image_to_fit),
+      ):
+        elapsed, peak_mib = measure_rescale(rescale_func, image_path)
+        print(
+            f'{name} -> {_FIT_SIZE[0]}x{_FIT_SIZE[1]} {label}:'
+            f' {elapsed * 1000:.0f} ms, peak +{peak_mib:.0f} MiB'
+        )
+
+
+def time_call(func, repeat: int) -> float:
+  """Returns the best wall-clock time in seconds over `repeat` runs."""
+  best = float('inf')
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func()
+    best = min(best, time.perf_counter() - start)
+  return best
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument(
+      '--skip-per-pixel',
+      action='store_true',
+      help='Only time the vectorized implementation.',
+  )
+  args = parser.parse_args()
+
+  for name, (width, height) in _SIZES.items():
+    source_image = make_product_shot(width, height)
+    vectorized = time_call(
+        lambda img=source_image: image.recolor_image_background(
+            img, _TARGET_COLOR, _REPLACEMENT_COLOR
+        ),
+        args.repeat,
+    )
+    print(f'{name} ({width}x{height}) vectorized: {vectorized * 1000:.1f} ms')
+    if args.skip_per_pixel:
+      continue
+    per_pixel = time_call(
+        lambda img=source_image: recolor_per_pixel(
+            img, _TARGET_COLOR, _REPLACEMENT_COLOR
+        ),
+        1,
+    )
+    print(
+        f'{name} ({width}x{height}) per-pixel: {per_pixel * 1000:.1f} ms'
+        f' (speedup x{per_pixel / vectorized:.0f})'
+    )
+
+  benchmark_rescale()
+
+
+if __name__ == '__main__':
+  main()
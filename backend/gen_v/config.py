@@ -22,8 +22,11 @@ from typing import Literal
 import pydantic
 import pydantic_settings
 
+from gen_v import storage
 from gen_v import utils
 
+_MIB = 1024 * 1024
+
 
 class AppSettings(pydantic_settings.BaseSettings):
   """The settings used in the application.
@@ -41,13 +44,76 @@ class AppSettings(pydantic_settings.BaseSettings):
     veo_person_generation: Default setting for VEO person generation.
     veo_add_date_to_output_path: If True, appends '/weekY-YYYY' to the base
       output path.
+    veo_poll_initial_interval_seconds: The interval between the first polls
+      of a Veo generation job.
+    veo_poll_max_interval_seconds: The longest the interval between polls of
+      a Veo job grows to.
+    veo_poll_timeout_seconds: How long a Veo job is polled before giving up.
+    veo_max_workers: The number of items whose generation is requested at
+      once, and the number whose videos are downloaded at once.
+    veo_requests_per_minute: The rate of Veo generation requests, within the
+      Vertex AI quota of the model.
+    veo_max_concurrent_requests: The number of Veo generation requests in
+      flight at once.
+    veo_poll_requests_per_minute: The rate of polls of Veo jobs.
     gemini_model_name: The name of the Gemini model used for prompt generation.
+    gemini_requests_per_minute: The rate of Gemini prompt generation requests.
+    gemini_max_concurrent_requests: The number of Gemini requests in flight
+      at once.
+    gemini_prompt_cache_enabled: If True, images whose content, prompt text
+      and model are unchanged since a previous run reuse the prompt Gemini
+      generated then.
+    gemini_prompt_cache_index_path: If set, a local JSON file indexing the
+      cached prompts.
+    gemini_prompt_cache_shared: If True, the cached prompts are also kept in
+      a manifest on the bucket, shared by every machine.
     prompt_type: The method for generating video prompts ('CUSTOM' or 'GEMINI').
     custom_video_prompt: The prompt text to use when prompt_type is 'CUSTOM'.
     gemini_base_prompt: The base prompt text passed to Gemini when
       prompt_type is 'GEMINI'.
     video_orientation: The desired aspect ratio orientation
       ('LANDSCAPE' or 'PORTRAIT').
+    api_connection_pool_size: The maximum number of connections the shared
+      Google API client keeps open to each host, for Veo predictions and
+      polls.
+    api_max_retries: The number of times a Veo or Gemini request rejected for
+      quota (429) or overload (503) is retried before the item fails.
+    api_retry_max_backoff_seconds: The longest delay before retrying a
+      rejected request.
+    storage_connection_pool_size: The maximum number of connections the
+      shared Cloud Storage client keeps open.
+    storage_chunked_transfer_threshold_mb: The size from which files are
+      downloaded and uploaded in concurrent chunks. None uses a single stream
+      for every file.
+    storage_transfer_chunk_size_mb: The size of each chunk of a chunked
+      transfer.
+    storage_transfer_max_workers: The number of chunks of a file transferred
+      at once.
+    blob_cache_dir: The local directory of the cache of assets downloaded
+      many times, such as fonts. Defaults to a directory in the system
+      temporary directory.
+    blob_cache_max_mb: The total size of the cached assets to stay within.
+    blob_cache_ttl_seconds: How long the generation of a cached asset is
+      trusted before it is checked again. 0 checks it on every use.
+    prefetch_max_files: The number of files a pipeline stage downloads ahead
+      of the one it is processing.
+    prefetch_max_mb: The disk space, or memory, the files downloaded ahead
+      may use.
+    image_prep_max_workers: The number of processes used to prepare the
+      product images. 1 processes them sequentially.
+    image_worker_memory_budget_mb: If set, the memory each image preparation
+      worker may use for reducing and recoloring buffers. Large images are
+      then processed in horizontal bands. The decoded source image is not
+      counted, and is only decoded at a reduced scale for JPEGs.
+    background_color_metric: How colour distances are measured when replacing
+      the background colour ('RGB' or 'CIELAB').
+    color_table_cache_dir: If set, a local directory where the background
+      colour lookup tables are stored and shared between processes.
+    prepared_image_cache_enabled: If True, product images whose content and
+      preparation parameters are unchanged since a previous run reuse the
+      images prepared then.
+    prepared_image_cache_index_path: If set, a local JSON file indexing the
+      prepared images, in addition to the manifest on the bucket.
   """
 
   gcp_project_id: str
@@ -63,9 +129,21 @@ class AppSettings(pydantic_settings.BaseSettings):
   veo_prompt_enhance: bool = True
   veo_person_generation: Literal["allow_adult", "dont_allow"] = "allow_adult"
   veo_add_date_to_output_path: bool = True
+  veo_poll_initial_interval_seconds: float = pydantic.Field(default=2, gt=0)
+  veo_poll_max_interval_seconds: float = pydantic.Field(default=30, gt=0)
+  veo_poll_timeout_seconds: float = pydantic.Field(default=600, gt=0)
+  veo_max_workers: int = pydantic.Field(default=8, ge=1)
+  veo_requests_per_minute: float = pydantic.Field(default=10, gt=0)
+  veo_max_concurrent_requests: int = pydantic.Field(default=4, ge=1)
+  veo_poll_requests_per_minute: float = pydantic.Field(default=300, gt=0)
 
   # Gemini settings
   gemini_model_name: str = "gemini-2.0-flash"
+  gemini_requests_per_minute: float = pydantic.Field(default=60, gt=0)
+  gemini_max_concurrent_requests: int = pydantic.Field(default=8, ge=1)
+  gemini_prompt_cache_enabled: bool = False
+  gemini_prompt_cache_index_path: str | None = None
+  gemini_prompt_cache_shared: bool = True
 
   # Prompt generation settings
   prompt_type: Literal["CUSTOM", "GEMINI"] = "CUSTOM"
@@ -86,6 +164,32 @@ class AppSettings(pydantic_settings.BaseSettings):
   # Video format settings
   video_orientation: Literal["LANDSCAPE", "PORTRAIT"] = "LANDSCAPE"
 
+  # Google API settings
+  api_connection_pool_size: int = pydantic.Field(default=32, ge=1)
+  api_max_retries: int = pydantic.Field(default=5, ge=0)
+  api_retry_max_backoff_seconds: float = pydantic.Field(default=60, gt=0)
+
+  # Storage settings
+  storage_connection_pool_size: int = pydantic.Field(default=32, ge=1)
+  storage_chunked_transfer_threshold_mb: int | None = pydantic.Field(
+      default=100, ge=1
+  )
+  storage_transfer_chunk_size_mb: int = pydantic.Field(default=32, ge=5)
+  storage_transfer_max_workers: int = pydantic.Field(default=8, ge=1)
+  blob_cache_dir: str | None = None
+  blob_cache_max_mb: int = pydantic.Field(default=2048, ge=1)
+  blob_cache_ttl_seconds: float = pydantic.Field(default=0, ge=0)
+  prefetch_max_files: int = pydantic.Field(default=4, ge=1)
+  prefetch_max_mb: int = pydantic.Field(default=1024, ge=1)
+
+  # Image preparation settings
+  image_prep_max_workers: int = pydantic.Field(default=1, ge=1)
+  image_worker_memory_budget_mb: int | None = pydantic.Field(default=None, ge=1)
+  background_color_metric: Literal["RGB", "CIELAB"] = "RGB"
+  color_table_cache_dir: str | None = None
+  prepared_image_cache_enabled: bool = False
+  prepared_image_cache_index_path: str | None = None
+
   @pydantic.computed_field(return_type=str)
   @property
   def images_uri(self) -> str:
@@ -95,6 +199,32 @@ class AppSettings(pydantic_settings.BaseSettings):
         f"input-images/{utils.get_current_week_year_str()}"
     )
 
+  @pydantic.computed_field(return_type=int | None)
+  @property
+  def image_worker_memory_budget_bytes(self) -> int | None:
+    """Returns the image worker memory budget in bytes, if set."""
+    if self.image_worker_memory_budget_mb is None:
+      return None
+    return self.image_worker_memory_budget_mb * _MIB
+
+  @pydantic.computed_field(return_type=str)
+  @property
+  def prepared_images_manifest_uri(self) -> str:
+    """Returns the GCS URI of the shared prepared image cache manifest."""
+    return (
+        f"gs://{self.gcp_bucket_name}/{self.gcs_folder_name}/"
+        "prepared-images-manifest.json"
+    )
+
+  @pydantic.computed_field(return_type=str)
+  @property
+  def gemini_prompts_manifest_uri(self) -> str:
+    """Returns the GCS URI of the shared Gemini prompt cache manifest."""
+    return (
+        f"gs://{self.gcp_bucket_name}/{self.gcs_folder_name}/"
+        "gemini-prompts-manifest.json"
+    )
+
   @pydantic.computed_field(return_type=str)
   @property
   def intros_outros_uri(self) -> str:
@@ -160,3 +290,27 @@ class AppSettings(pydantic_settings.BaseSettings):
     if self.video_orientation == "PORTRAIT":
       return "video-portrait"
     return "video-landscape"
+
+
+def configure_storage(settings: AppSettings) -> None:
+  """Configures the storage client, transfers, blob cache and prefetching.
+
+  Args:
+    settings: The settings to apply.
+  """
+  storage.configure_storage_client(settings.storage_connection_pool_size)
+  threshold_mb = settings.storage_chunked_transfer_threshold_mb
+  storage.configure_chunked_transfers(
+      threshold_bytes=threshold_mb * _MIB if threshold_mb else None,
+      chunk_size_bytes=settings.storage_transfer_chunk_size_mb * _MIB,
+      max_workers=settings.storage_transfer_max_workers,
+  )
+  storage.configure_blob_cache(
+      cache_dir=settings.blob_cache_dir,
+      max_bytes=settings.blob_cache_max_mb * _MIB,
+      metadata_ttl_seconds=settings.blob_cache_ttl_seconds,
+  )
+  storage.configure_prefetching(
+      max_files=settings.prefetch_max_files,
+      max_bytes=settings.prefetch_max_mb * _MIB,
+  )
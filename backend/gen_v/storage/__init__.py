@@ -12,20 +12,90 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Exposes core data models for the gen_v package."""
-from gen_v.storage.gcs import download_file_locally
-from gen_v.storage.gcs import download_files
-from gen_v.storage.gcs import retrieve_all_files_from_gcs_folder
+from gen_v.storage.aio import AsyncStorage
+from gen_v.storage.backends import GcsBackend
+from gen_v.storage.backends import LocalBackend
+from gen_v.storage.backends import MemoryBackend
+from gen_v.storage.backends import StorageBackend
+from gen_v.storage.backends import get_backend
+from gen_v.storage.backends import register_backend
+from gen_v.storage.backends import to_uri
+from gen_v.storage.cache import BlobCache
+from gen_v.storage.cache import configure_blob_cache
+from gen_v.storage.cache import get_blob_cache
+from gen_v.storage.chunked import configure_chunked_transfers
+from gen_v.storage.client import configure_storage_client
+from gen_v.storage.client import get_storage_client
+from gen_v.storage.client import reset_storage_client
+from gen_v.storage.files import download_bytes
+from gen_v.storage.files import download_file_locally
+from gen_v.storage.files import get_blob_fingerprint
+from gen_v.storage.files import iter_file_fingerprints_in_gcs_folder
+from gen_v.storage.files import iter_files_in_gcs_folder
+from gen_v.storage.files import open_read
+from gen_v.storage.files import open_write
+from gen_v.storage.files import retrieve_all_files_from_gcs_folder
+from gen_v.storage.files import upload_bytes
+from gen_v.storage.files import upload_file_to_gcs
+from gen_v.storage.gcs import get_blob
+from gen_v.storage.gcs import get_existing_blob
 from gen_v.storage.gcs import get_file_name_from_gcs_url
-from gen_v.storage.gcs import upload_file_to_gcs
 from gen_v.storage.gcs import create_gcs_folders_in_subfolder
+from gen_v.storage.gcs import get_moved_blob_uri
 from gen_v.storage.gcs import move_blob
+from gen_v.storage.prefetch import PrefetchedFile
+from gen_v.storage.prefetch import Prefetcher
+from gen_v.storage.prefetch import configure_prefetching
+from gen_v.storage.prefetch import prefetch_bytes
+from gen_v.storage.prefetch import prefetch_files
+from gen_v.storage.transfer import TransferResult
+from gen_v.storage.transfer import download_files
+from gen_v.storage.transfer import download_many
+from gen_v.storage.transfer import move_many
+from gen_v.storage.transfer import upload_many
+from gen_v.storage.transfer import upload_many_bytes
 
 __all__ = [
+    'AsyncStorage',
+    'GcsBackend',
+    'LocalBackend',
+    'MemoryBackend',
+    'StorageBackend',
+    'get_backend',
+    'register_backend',
+    'to_uri',
+    'BlobCache',
+    'configure_blob_cache',
+    'get_blob_cache',
+    'configure_chunked_transfers',
+    'configure_storage_client',
+    'get_storage_client',
+    'reset_storage_client',
+    'download_bytes',
     'download_file_locally',
+    'get_blob',
+    'get_blob_fingerprint',
+    'get_existing_blob',
     'download_files',
+    'iter_file_fingerprints_in_gcs_folder',
+    'iter_files_in_gcs_folder',
     'retrieve_all_files_from_gcs_folder',
     'get_file_name_from_gcs_url',
     'upload_file_to_gcs',
     'create_gcs_folders_in_subfolder',
+    'get_moved_blob_uri',
     'move_blob',
+    'PrefetchedFile',
+    'Prefetcher',
+    'configure_prefetching',
+    'prefetch_bytes',
+    'prefetch_files',
+    'open_read',
+    'open_write',
+    'upload_bytes',
+    'TransferResult',
+    'download_many',
+    'move_many',
+    'upload_many',
+    'upload_many_bytes',
 ]
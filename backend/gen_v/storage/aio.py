@@ -0,0 +1,260 @@
+"""An asyncio API for storage, for orchestrators driven by an event loop.
+
+Whole-file reads and writes of Cloud Storage blobs, download_bytes and
+upload_bytes, are made on the event loop by an async HTTP client, see
+gcs_aio. Hundreds of them can be in flight at once, each costing a coroutine
+and a pooled connection rather than an OS thread.
+
+The other calls, and those to other backends, use blocking libraries, so
+they run on a pool of max_workers threads sharing the pooled storage client.
+Set the storage connection pool size to at least max_workers, so the threads
+don't wait for connections.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import logging
+import os
+import sys
+from typing import AsyncIterator, Callable, TypeVar
+
+from google.cloud import storage
+
+from gen_v.storage import backends
+from gen_v.storage import gcs
+from gen_v.storage import gcs_aio
+from gen_v.storage import transfer
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_MAX_CONCURRENCY = gcs_aio.DEFAULT_MAX_CONNECTIONS
+DEFAULT_MAX_WORKERS = transfer.DEFAULT_MAX_WORKERS
+# The number of URIs fetched from a listing per call to the pool.
+_LIST_BATCH_SIZE = 1000
+
+_T = TypeVar("_T")
+
+
+class AsyncStorage:
+  """Awaitable storage calls, with a bound on the calls in flight.
+
+  Use it as an async context manager, or await close once done:
+
+    async with storage.AsyncStorage(max_concurrency=256) as aio_storage:
+      contents = await asyncio.gather(
+          *(aio_storage.download_bytes(uri) for uri in uris)
+      )
+  """
+
+  def __init__(
+      self,
+      max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+      max_workers: int = DEFAULT_MAX_WORKERS,
+      executor: concurrent.futures.ThreadPoolExecutor | None = None,
+      storage_client: storage.Client = None,
+      gcs_client: gcs_aio.AsyncGcsClient | None = None,
+  ):
+    """Initialises the facade.
+
+    Args:
+      max_concurrency: The maximum number of Cloud Storage reads and writes
+        made on the event loop at once.
+      max_workers: The maximum number of the other storage calls running at
+        once, each on a thread.
+      executor: (Optional) The executor to run the blocking storage calls on.
+        By default, a pool of max_workers threads is created, and shut down
+        by close.
+      storage_client: The Google Cloud Storage client of the blocking calls.
+        Defaults to the shared client.
+      gcs_client: (Optional) The client of the reads and writes made on the
+        event loop. By default, one with max_concurrency connections and the
+        application default credentials is created, and closed by close.
+
+    Raises:
+      ValueError: If max_concurrency or max_workers is less than 1.
+    """
+    if max_concurrency < 1:
+      raise ValueError("max_concurrency must be at least 1.")
+    if max_workers < 1:
+      raise ValueError("max_workers must be at least 1.")
+    self._transfer_semaphore = asyncio.Semaphore(max_concurrency)
+    self._pool_semaphore = asyncio.Semaphore(max_workers)
+    self._owns_executor = executor is None
+    self._executor = executor or concurrent.futures.ThreadPoolExecutor(
+        max_workers, thread_name_prefix="gen_v_aio_storage"
+    )
+    self._storage_client = storage_client
+    self._owns_gcs_client = gcs_client is None
+    self._gcs_client = gcs_client or gcs_aio.AsyncGcsClient(max_concurrency)
+
+  async def __aenter__(self) -> "AsyncStorage":
+    return self
+
+  async def __aexit__(self, *exc_info) -> None:
+    await self.close()
+
+  async def close(self) -> None:
+    """Closes the thread pool and client, if they were created by the facade."""
+    if self._owns_executor:
+      self._executor.shutdown(wait=False)
+    if self._owns_gcs_client:
+      await self._gcs_client.aclose()
+
+  async def _run(self, func: Callable[..., _T], *args, **kwargs) -> _T:
+    """Runs a blocking storage call on the pool once a slot is free."""
+    async with self._pool_semaphore:
+      return await asyncio.get_running_loop().run_in_executor(
+          self._executor, functools.partial(func, *args, **kwargs)
+      )
+
+  def _get_backend(self, uri: str) -> backends.StorageBackend:
+    return backends.get_backend(uri, self._storage_client)
+
+  def _is_on_event_loop(self, uri: str) -> bool:
+    """Whether the reads and writes of a file are made by the async client."""
+    return isinstance(self._get_backend(uri), backends.GcsBackend)
+
+  async def download_bytes(self, uri: str) -> bytes:
+    """Downloads the content of a file into memory."""
+    if self._is_on_event_loop(uri):
+      async with self._transfer_semaphore:
+        return await self._gcs_client.download_bytes(uri)
+    return await self._run(self._get_backend(uri).read_bytes, uri)
+
+  async def upload_bytes(
+      self, data: bytes, uri: str, content_type: str | None = None
+  ) -> None:
+    """Uploads content from memory to a file."""
+    if self._is_on_event_loop(uri):
+      async with self._transfer_semaphore:
+        await self._gcs_client.upload_bytes(data, uri, content_type)
+      return
+    await self._run(self._get_backend(uri).write_bytes, data, uri, content_type)
+
+  async def download_file(
+      self, uri: str, local_file_path: str, use_cache: bool = False
+  ) -> None:
+    """Downloads a file to a local path, see download_file_locally."""
+    await self._run(
+        self._get_backend(uri).download_file,
+        uri,
+        local_file_path,
+        use_cache=use_cache,
+    )
+
+  async def upload_file(self, local_file_path: str, uri: str) -> None:
+    """Uploads a local file, keeping the local copy."""
+    await self._run(self._get_backend(uri).upload_file, local_file_path, uri)
+
+  async def get_fingerprint(self, uri: str) -> str:
+    """Returns a string identifying the current content of a file."""
+    return await self._run(self._get_backend(uri).get_fingerprint, uri)
+
+  async def list_files(
+      self,
+      uri: str,
+      match_glob: str | None = None,
+      extensions: list[str] | None = None,
+      recursive: bool = True,
+  ) -> AsyncIterator[str]:
+    """Lists the files in a folder lazily, see iter_files_in_gcs_folder.
+
+    Args:
+      uri: The URI of the folder to list files from.
+      match_glob: (Optional) A glob the paths of the files must match.
+      extensions: (Optional) The file extensions to keep, e.g. ['png'].
+      recursive: (Optional) Whether to list files in subfolders as well.
+
+    Yields:
+      The URI of each file, in lexicographical order.
+    """
+    uris = await self._run(
+        self._get_backend(uri).list_files,
+        uri,
+        match_glob=match_glob,
+        extensions=extensions,
+        recursive=recursive,
+    )
+    while True:
+      batch = await self._run(
+          lambda: list(itertools.islice(uris, _LIST_BATCH_SIZE))
+      )
+      for file_uri in batch:
+        yield file_uri
+      if len(batch) < _LIST_BATCH_SIZE:
+        return
+
+  async def _run_transfers(
+      self,
+      run: Callable[[str, str], None],
+      pairs: list[tuple[str, str]],
+  ) -> list[transfer.TransferResult]:
+    """Runs transfers concurrently, collecting a result per file."""
+
+    async def run_transfer(
+        source: str, destination: str
+    ) -> transfer.TransferResult:
+      try:
+        await self._run(run, source, destination)
+      except transfer.TRANSFER_ERRORS as e:
+        logger.error("Failed to transfer %s to %s: %s", source, destination, e)
+        return transfer.TransferResult(source, destination, e)
+      return transfer.TransferResult(source, destination)
+
+    return list(
+        await asyncio.gather(*(
+            run_transfer(source, destination) for source, destination in pairs
+        ))
+    )
+
+  async def download_many(
+      self,
+      uris: list[str],
+      destination_dir: str = "/content",
+      file_names: list[str] | None = None,
+  ) -> list[transfer.TransferResult]:
+    """Downloads files concurrently, see transfer.download_many."""
+    if file_names is None:
+      file_names = [gcs.get_file_name_from_gcs_url(uri) for uri in uris]
+    pairs = [
+        (uri, os.path.join(destination_dir, file_name))
+        for uri, file_name in zip(uris, file_names, strict=True)
+    ]
+    return await self._run_transfers(
+        lambda uri, path: self._get_backend(uri).download_file(uri, path),
+        pairs,
+    )
+
+  async def upload_many(
+      self, pairs: list[tuple[str, str]]
+  ) -> list[transfer.TransferResult]:
+    """Uploads local files concurrently, keeping the local copies."""
+    return await self._run_transfers(
+        lambda path, uri: self._get_backend(uri).upload_file(path, uri),
+        pairs,
+    )
+
+  async def move_many(
+      self, moves: list[tuple[str, str]]
+  ) -> list[transfer.TransferResult]:
+    """Moves files within their storage, see transfer.move_many.
+
+    Raises:
+      ValueError: If a file would be moved to another scheme.
+    """
+    transfer.check_moves(moves)
+    results = await self._run_transfers(
+        lambda source, destination: self._get_backend(source).copy(
+            source, destination
+        ),
+        moves,
+    )
+    await self._run(
+        transfer.delete_copied_sources, results, self._storage_client
+    )
+    return results
@@ -0,0 +1,547 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Storage backends, selected by the scheme of a URI.
+
+The storage functions accept gs:// URIs for Cloud Storage, file:// URIs for
+a local or network file system, and mem:// URIs for an in-process store. The
+local and in-memory backends let the pipeline run against fast scratch space,
+or offline to profile its own CPU cost without network noise. URIs without a
+scheme are Cloud Storage paths, as they have always been.
+
+A URI is read as scheme://authority/path. The authority is the bucket for
+gs:// and mem:// URIs, and is empty for file:// URIs, whose path is absolute.
+"""
+
+import abc
+import base64
+import hashlib
+import io
+import os
+import re
+import shutil
+import threading
+from typing import BinaryIO, Callable, Iterator
+
+from google.api_core import exceptions as api_core_exceptions
+from google.cloud import storage
+
+from gen_v.storage import chunked
+from gen_v.storage import client
+from gen_v.storage import gcs
+
+
+GCS_SCHEME = "gs"
+LOCAL_SCHEME = "file"
+MEMORY_SCHEME = "mem"
+# The maximum number of calls Cloud Storage accepts in one batch request.
+_MAX_BATCH_SIZE = 100
+_CHECKSUM_READ_SIZE = 8 * 1024 * 1024
+
+
+class StorageBackend(abc.ABC):
+  """Reads and writes files addressed by URI in one kind of storage.
+
+  Missing files raise FileNotFoundError, or a google.api_core NotFound error
+  for Cloud Storage.
+  """
+
+  @abc.abstractmethod
+  def read_bytes(self, uri: str) -> bytes:
+    """Returns the content of a file."""
+
+  @abc.abstractmethod
+  def write_bytes(
+      self, data: bytes, uri: str, content_type: str | None = None
+  ) -> None:
+    """Writes content to a file, replacing it if it exists."""
+
+  @abc.abstractmethod
+  def open_read(self, uri: str) -> BinaryIO:
+    """Opens a file as a binary stream for reading."""
+
+  @abc.abstractmethod
+  def open_write(self, uri: str, content_type: str | None = None) -> BinaryIO:
+    """Opens a file as a binary stream, written when the stream is closed."""
+
+  @abc.abstractmethod
+  def download_file(
+      self, uri: str, local_file_path: str, use_cache: bool = False
+  ) -> None:
+    """Copies a file to the local file system.
+
+    Args:
+      uri: The URI of the file.
+      local_file_path: The local path to copy the file to.
+      use_cache: (Optional) Whether a local cache may serve the file, for
+        backends that have one.
+    """
+
+  @abc.abstractmethod
+  def upload_file(self, local_file_path: str, uri: str) -> None:
+    """Copies a file from the local file system."""
+
+  @abc.abstractmethod
+  def list_files(
+      self,
+      uri: str,
+      match_glob: str | None = None,
+      extensions: list[str] | None = None,
+      recursive: bool = True,
+  ) -> Iterator[str]:
+    """Lists the files whose URI starts with a prefix, in order.
+
+    Args:
+      uri: The URI prefix, usually a folder.
+      match_glob: (Optional) A glob the paths of the files must match, with
+        Cloud Storage's syntax.
+      extensions: (Optional) The file extensions to keep, e.g. ['png'].
+      recursive: (Optional) Whether to list files in subfolders as well.
+
+    Yields:
+      The URI of each file. Paths without a dot, such as folder
+      placeholders, are skipped.
+    """
+
+  @abc.abstractmethod
+  def get_fingerprint(self, uri: str) -> str:
+    """Returns a string identifying the current content of a file."""
+
+  def list_fingerprints(
+      self,
+      uri: str,
+      match_glob: str | None = None,
+      extensions: list[str] | None = None,
+      recursive: bool = True,
+  ) -> Iterator[tuple[str, str]]:
+    """Lists files as list_files does, with the fingerprint of each.
+
+    Yields:
+      The URI and the fingerprint of each file.
+    """
+    for file_uri in self.list_files(uri, match_glob, extensions, recursive):
+      yield file_uri, self.get_fingerprint(file_uri)
+
+  @abc.abstractmethod
+  def copy(self, source_uri: str, destination_uri: str) -> None:
+    """Copies a file within the backend."""
+
+  @abc.abstractmethod
+  def delete(self, uri: str) -> None:
+    """Deletes a file."""
+
+  def delete_many(self, uris: list[str]) -> list[Exception | None]:
+    """Deletes files, returning the error deleting each, or None."""
+    errors = []
+    for uri in uris:
+      try:
+        self.delete(uri)
+      except OSError as e:
+        errors.append(e)
+      else:
+        errors.append(None)
+    return errors
+
+
+def get_scheme(uri: str) -> str:
+  """Returns the scheme of a URI, gs for URIs without one."""
+  scheme, separator, _ = uri.partition("://")
+  return scheme if separator else GCS_SCHEME
+
+
+def to_uri(path: str) -> str:
+  """Returns a URI for a bucket path, which is in Cloud Storage by default.
+
+  Args:
+    path: A bucket path such as 'bucket/folder', or a URI with a scheme.
+
+  Returns:
+    The path with gs:// prepended, or the URI unchanged.
+  """
+  return path if "://" in path else f"{GCS_SCHEME}://{path}"
+
+
+def _split_uri(uri: str) -> tuple[str, str]:
+  """Returns the authority and the path of a URI."""
+  _, separator, rest = uri.partition("://")
+  authority, _, path = (rest if separator else uri).partition("/")
+  return authority, path
+
+
+def _glob_to_regex(pattern: str) -> re.Pattern:
+  """Compiles a glob with Cloud Storage's syntax to a regular expression."""
+  tokens = re.findall(r"\*\*|\*|\?|\{[^}]*\}|\[[^\]]*\]|.", pattern)
+  parts = []
+  for token in tokens:
+    if token == "**":
+      parts.append(".*")
+    elif token == "*":
+      parts.append("[^/]*")
+    elif token == "?":
+      parts.append("[^/]")
+    elif token.startswith("{") and len(token) > 1:
+      alternatives = token[1:-1].split(",")
+      parts.append(f"(?:{'|'.join(map(re.escape, alternatives))})")
+    elif token.startswith("[") and len(token) > 1:
+      parts.append(token)
+    else:
+      parts.append(re.escape(token))
+  return re.compile("".join(parts))
+
+
+def _get_path_filter(
+    match_glob: str | None, extensions: list[str] | None
+) -> Callable[[str], bool]:
+  """Returns whether a listed path is kept, as Cloud Storage listing does."""
+  pattern = _glob_to_regex(match_glob) if match_glob else None
+  suffixes = None
+  if extensions and not match_glob:
+    suffixes = tuple(f".{extension.lstrip('.')}" for extension in extensions)
+
+  def is_listed(path: str) -> bool:
+    if "." not in path:
+      return False
+    if suffixes and not path.endswith(suffixes):
+      return False
+    return pattern is None or pattern.fullmatch(path) is not None
+
+  return is_listed
+
+
+def _md5_fingerprint(digest: bytes) -> str:
+  """Formats an MD5 digest as Cloud Storage fingerprints are."""
+  return f"md5:{base64.b64encode(digest).decode('utf-8')}"
+
+
+class GcsBackend(StorageBackend):
+  """Files in Google Cloud Storage, at gs:// URIs."""
+
+  def __init__(self, storage_client: storage.Client = None):
+    """Initialises the backend.
+
+    Args:
+      storage_client: (Optional) The Google Cloud Storage client. Defaults to
+        the client shared by the current process.
+    """
+    self._storage_client = storage_client
+
+  @property
+  def storage_client(self) -> storage.Client:
+    """The Google Cloud Storage client."""
+    return self._storage_client or client.get_storage_client()
+
+  def read_bytes(self, uri: str) -> bytes:
+    return gcs.download_bytes(uri, self.storage_client)
+
+  def write_bytes(
+      self, data: bytes, uri: str, content_type: str | None = None
+  ) -> None:
+    gcs.upload_bytes(data, uri, content_type, self.storage_client)
+
+  def open_read(self, uri: str) -> BinaryIO:
+    return gcs.open_read(uri, self.storage_client)
+
+  def open_write(self, uri: str, content_type: str | None = None) -> BinaryIO:
+    return gcs.open_write(uri, content_type, self.storage_client)
+
+  def download_file(
+      self, uri: str, local_file_path: str, use_cache: bool = False
+  ) -> None:
+    gcs.download_to_file(uri, local_file_path, self.storage_client, use_cache)
+
+  def upload_file(self, local_file_path: str, uri: str) -> None:
+    storage_client = self.storage_client
+    chunked.upload_file_to_blob(
+        local_file_path, gcs.get_blob(uri, storage_client), storage_client
+    )
+
+  def list_files(
+      self,
+      uri: str,
+      match_glob: str | None = None,
+      extensions: list[str] | None = None,
+      recursive: bool = True,
+  ) -> Iterator[str]:
+    return gcs.iter_files_in_gcs_folder(
+        uri,
+        match_glob=match_glob,
+        extensions=extensions,
+        recursive=recursive,
+        storage_client=self.storage_client,
+    )
+
+  def get_fingerprint(self, uri: str) -> str:
+    return gcs.get_blob_fingerprint(uri, self.storage_client)
+
+  def list_fingerprints(
+      self,
+      uri: str,
+      match_glob: str | None = None,
+      extensions: list[str] | None = None,
+      recursive: bool = True,
+  ) -> Iterator[tuple[str, str]]:
+    """Lists blobs with the checksums returned by the listing itself."""
+    return gcs.iter_file_fingerprints_in_gcs_folder(
+        uri,
+        match_glob=match_glob,
+        extensions=extensions,
+        recursive=recursive,
+        storage_client=self.storage_client,
+    )
+
+  def copy(self, source_uri: str, destination_uri: str) -> None:
+    """Copies a blob server-side, continuing the rewrite until it is done.
+
+    Large objects, or copies across locations or storage classes, take
+    several rewrite calls, each returning a token to continue from.
+    """
+    source_blob = gcs.get_blob(source_uri, self.storage_client)
+    destination_blob = gcs.get_blob(destination_uri, self.storage_client)
+    token, _, _ = destination_blob.rewrite(source_blob)
+    while token is not None:
+      token, _, _ = destination_blob.rewrite(source_blob, token=token)
+
+  def delete(self, uri: str) -> None:
+    gcs.get_blob(uri, self.storage_client).delete()
+
+  def delete_many(self, uris: list[str]) -> list[Exception | None]:
+    """Deletes blobs in batch requests, returning the error for each."""
+    storage_client = self.storage_client
+    blobs = [gcs.get_blob(uri, storage_client) for uri in uris]
+    errors = [None] * len(blobs)
+    for start in range(0, len(blobs), _MAX_BATCH_SIZE):
+      batch = blobs[start : start + _MAX_BATCH_SIZE]
+      try:
+        with storage_client.batch():
+          for blob in batch:
+            blob.delete()
+      except api_core_exceptions.GoogleAPICallError:
+        # A batch only raises its last error, so find which deletes failed.
+        for i, blob in enumerate(batch, start=start):
+          try:
+            blob.delete(client=storage_client)
+          except api_core_exceptions.NotFound:
+            pass  # Deleted by the batch.
+          except api_core_exceptions.GoogleAPICallError as e:
+            errors[i] = e
+    return errors
+
+
+class LocalBackend(StorageBackend):
+  """Files on a local or network file system, at file:// URIs."""
+
+  @staticmethod
+  def _get_path(uri: str) -> str:
+    """Returns the absolute path of a file:// URI."""
+    authority, path = _split_uri(uri)
+    if authority:
+      raise ValueError(f"file:// URIs must have an absolute path, got {uri}")
+    return f"/{path}"
+
+  @staticmethod
+  def _open_for_writing(path: str) -> BinaryIO:
+    """Opens a file for writing, creating its folders if needed."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "wb")
+
+  def read_bytes(self, uri: str) -> bytes:
+    with open(self._get_path(uri), "rb") as f:
+      return f.read()
+
+  def write_bytes(
+      self, data: bytes, uri: str, content_type: str | None = None
+  ) -> None:
+    with self._open_for_writing(self._get_path(uri)) as f:
+      f.write(data)
+
+  def open_read(self, uri: str) -> BinaryIO:
+    return open(self._get_path(uri), "rb")
+
+  def open_write(self, uri: str, content_type: str | None = None) -> BinaryIO:
+    return self._open_for_writing(self._get_path(uri))
+
+  def download_file(
+      self, uri: str, local_file_path: str, use_cache: bool = False
+  ) -> None:
+    shutil.copyfile(self._get_path(uri), local_file_path)
+
+  def upload_file(self, local_file_path: str, uri: str) -> None:
+    path = self._get_path(uri)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    shutil.copyfile(local_file_path, path)
+
+  def list_files(
+      self,
+      uri: str,
+      match_glob: str | None = None,
+      extensions: list[str] | None = None,
+      recursive: bool = True,
+  ) -> Iterator[str]:
+    prefix = self._get_path(uri)
+    is_listed = _get_path_filter(match_glob, extensions)
+    paths = []
+    for dir_path, dir_names, file_names in os.walk(os.path.dirname(prefix)):
+      if not recursive:
+        dir_names.clear()
+      paths.extend(
+          os.path.join(dir_path, file_name) for file_name in file_names
+      )
+    for path in sorted(paths):
+      if path.startswith(prefix) and is_listed(path[1:]):
+        yield f"{LOCAL_SCHEME}://{path}"
+
+  def get_fingerprint(self, uri: str) -> str:
+    md5 = hashlib.md5()
+    with open(self._get_path(uri), "rb") as f:
+      while chunk := f.read(_CHECKSUM_READ_SIZE):
+        md5.update(chunk)
+    return _md5_fingerprint(md5.digest())
+
+  def copy(self, source_uri: str, destination_uri: str) -> None:
+    self.upload_file(self._get_path(source_uri), destination_uri)
+
+  def delete(self, uri: str) -> None:
+    os.remove(self._get_path(uri))
+
+
+class _MemoryWriter(io.BytesIO):
+  """A stream that stores its content in a MemoryBackend when closed."""
+
+  def __init__(self, on_close: Callable[[bytes], None]):
+    super().__init__()
+    self._on_close = on_close
+
+  def close(self) -> None:
+    if not self.closed:
+      self._on_close(self.getvalue())
+    super().close()
+
+
+class MemoryBackend(StorageBackend):
+  """Files held in the memory of the current process, at mem:// URIs.
+
+  Worker processes each have their own files, so the pipeline should run
+  with a single worker process against this backend.
+  """
+
+  def __init__(self):
+    self._files = {}
+    self._lock = threading.Lock()
+
+  def read_bytes(self, uri: str) -> bytes:
+    with self._lock:
+      data = self._files.get(uri)
+    if data is None:
+      raise FileNotFoundError(f"File not found at URI: {uri}")
+    return data
+
+  def write_bytes(
+      self, data: bytes, uri: str, content_type: str | None = None
+  ) -> None:
+    with self._lock:
+      self._files[uri] = bytes(data)
+
+  def open_read(self, uri: str) -> BinaryIO:
+    return io.BytesIO(self.read_bytes(uri))
+
+  def open_write(self, uri: str, content_type: str | None = None) -> BinaryIO:
+    return _MemoryWriter(lambda data: self.write_bytes(data, uri))
+
+  def download_file(
+      self, uri: str, local_file_path: str, use_cache: bool = False
+  ) -> None:
+    with open(local_file_path, "wb") as f:
+      f.write(self.read_bytes(uri))
+
+  def upload_file(self, local_file_path: str, uri: str) -> None:
+    with open(local_file_path, "rb") as f:
+      self.write_bytes(f.read(), uri)
+
+  def list_files(
+      self,
+      uri: str,
+      match_glob: str | None = None,
+      extensions: list[str] | None = None,
+      recursive: bool = True,
+  ) -> Iterator[str]:
+    is_listed = _get_path_filter(match_glob, extensions)
+    with self._lock:
+      uris = sorted(self._files)
+    for file_uri in uris:
+      if not file_uri.startswith(uri):
+        continue
+      if not recursive and "/" in file_uri[len(uri) :]:
+        continue
+      if is_listed(_split_uri(file_uri)[1]):
+        yield file_uri
+
+  def get_fingerprint(self, uri: str) -> str:
+    return _md5_fingerprint(hashlib.md5(self.read_bytes(uri)).digest())
+
+  def copy(self, source_uri: str, destination_uri: str) -> None:
+    self.write_bytes(self.read_bytes(source_uri), destination_uri)
+
+  def delete(self, uri: str) -> None:
+    with self._lock:
+      if self._files.pop(uri, None) is None:
+        raise FileNotFoundError(f"File not found at URI: {uri}")
+
+  def clear(self) -> None:
+    """Removes all files."""
+    with self._lock:
+      self._files.clear()
+
+
+_lock = threading.Lock()
+_backends = {
+    GCS_SCHEME: GcsBackend(),
+    LOCAL_SCHEME: LocalBackend(),
+    MEMORY_SCHEME: MemoryBackend(),
+}
+
+
+def register_backend(scheme: str, backend: StorageBackend) -> None:
+  """Sets the backend used for URIs with a scheme.
+
+  Args:
+    scheme: The URI scheme, without '://', e.g. 'file'.
+    backend: The backend to use for the scheme.
+  """
+  with _lock:
+    _backends[scheme] = backend
+
+
+def get_backend(
+    uri: str, storage_client: storage.Client = None
+) -> StorageBackend:
+  """Returns the backend for the scheme of a URI.
+
+  Args:
+    uri: The URI of a file.
+    storage_client: (Optional) The Google Cloud Storage client to use for
+      gs:// URIs, instead of the registered backend's.
+
+  Returns:
+    The storage backend.
+
+  Raises:
+    ValueError: If no backend is registered for the scheme.
+  """
+  scheme = get_scheme(uri)
+  if storage_client is not None and scheme == GCS_SCHEME:
+    return GcsBackend(storage_client)
+  with _lock:
+    backend = _backends.get(scheme)
+  if backend is None:
+    raise ValueError(f"No storage backend is registered for {uri}")
+  return backend
@@ -0,0 +1,262 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A local disk cache of blobs that are downloaded again and again.
+
+Fonts, logos, intros, outros and audio beds are used by many videos. Cached
+copies are keyed by bucket, path and generation, so an overwritten blob is
+downloaded again. The cache directory may be shared by several processes:
+entries are written atomically and guarded by file locks, and the least
+recently used entries are evicted to stay within a byte budget.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from google.api_core import exceptions as api_core_exceptions
+from google.cloud import storage
+
+from gen_v.storage import chunked
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "gen_v_blob_cache")
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Entries are locked in shards, so the number of lock files stays bounded.
+_LOCK_SHARD_CHARS = 2
+
+
+class BlobCache:
+  """An LRU cache of blobs in a local directory.
+
+  Attributes:
+    hits: The number of fetches served from the cache.
+    misses: The number of fetches that downloaded the blob.
+  """
+
+  def __init__(
+      self,
+      cache_dir: str = DEFAULT_CACHE_DIR,
+      max_bytes: int = DEFAULT_MAX_BYTES,
+      metadata_ttl_seconds: float = 0,
+  ):
+    """Initialises the cache, creating its directory if needed.
+
+    Args:
+      cache_dir: The directory to store the cached blobs in.
+      max_bytes: The total size of the cached blobs to stay within.
+      metadata_ttl_seconds: How long the generation of a blob is trusted
+        before it is checked again with a metadata request. With 0, every
+        fetch checks it.
+    """
+    self._objects_dir = os.path.join(cache_dir, "objects")
+    self._metadata_dir = os.path.join(cache_dir, "metadata")
+    self._locks_dir = os.path.join(cache_dir, "locks")
+    for directory in (self._objects_dir, self._metadata_dir, self._locks_dir):
+      os.makedirs(directory, exist_ok=True)
+    self._eviction_lock_path = os.path.join(cache_dir, "eviction.lock")
+    self._max_bytes = max_bytes
+    self._metadata_ttl_seconds = metadata_ttl_seconds
+    # Entries are locked one at a time, so fetches of different entries
+    # update the counters concurrently.
+    self._counters_lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def fetch(
+      self,
+      blob: storage.Blob,
+      local_file_path: str,
+      storage_client: storage.Client,
+  ) -> None:
+    """Copies a blob to a local file, downloading it if it isn't cached.
+
+    Args:
+      blob: The blob to fetch.
+      local_file_path: The local path to copy the blob to.
+      storage_client: The Google Cloud Storage client.
+
+    Raises:
+      google.api_core.exceptions.NotFound: If the blob does not exist.
+    """
+    blob_name = f"{blob.bucket.name}/{blob.name}"
+    generation = self._get_recent_generation(blob_name)
+    if generation is not None:
+      try:
+        self._fetch_generation(blob, generation, local_file_path)
+        return
+      except api_core_exceptions.NotFound:
+        logger.info("%s was replaced, checking its generation.", blob_name)
+    blob.reload(client=storage_client)
+    self._set_recent_generation(blob_name, blob.generation)
+    self._fetch_generation(blob, blob.generation, local_file_path)
+
+  def _fetch_generation(
+      self,
+      blob: storage.Blob,
+      generation: int,
+      local_file_path: str,
+  ) -> None:
+    """Copies a generation of a blob to a local file, downloading if needed."""
+    entry_name = _hash(f"{blob.bucket.name}/{blob.name}#{generation}")
+    entry_path = os.path.join(self._objects_dir, entry_name)
+    with self._lock_entry(entry_name):
+      if os.path.exists(entry_path):
+        os.utime(entry_path)
+        shutil.copyfile(entry_path, local_file_path)
+        with self._counters_lock:
+          self.hits += 1
+        return
+      if blob.generation != generation:
+        blob = blob.bucket.blob(blob.name, generation=generation)
+      with tempfile.NamedTemporaryFile(
+          dir=self._objects_dir, suffix=".tmp", delete=False
+      ) as tmp_file:
+        tmp_path = tmp_file.name
+      try:
+        chunked.download_blob_to_file(blob, tmp_path)
+        os.replace(tmp_path, entry_path)
+      except BaseException:
+        os.remove(tmp_path)
+        raise
+      shutil.copyfile(entry_path, local_file_path)
+      with self._counters_lock:
+        self.misses += 1
+    self._evict()
+
+  def _get_recent_generation(self, blob_name: str) -> int | None:
+    """Returns the generation of a blob if it was checked within the TTL."""
+    if self._metadata_ttl_seconds <= 0:
+      return None
+    metadata_path = os.path.join(self._metadata_dir, _hash(blob_name))
+    try:
+      with open(metadata_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    except (OSError, ValueError):
+      return None
+    if time.time() - metadata["checked_at"] > self._metadata_ttl_seconds:
+      return None
+    return metadata["generation"]
+
+  def _set_recent_generation(self, blob_name: str, generation: int) -> None:
+    """Records the generation of a blob as just checked."""
+    if self._metadata_ttl_seconds <= 0:
+      return
+    with tempfile.NamedTemporaryFile(
+        "w", dir=self._metadata_dir, delete=False, encoding="utf-8"
+    ) as tmp_file:
+      json.dump({"generation": generation, "checked_at": time.time()}, tmp_file)
+    os.replace(
+        tmp_file.name, os.path.join(self._metadata_dir, _hash(blob_name))
+    )
+
+  @contextlib.contextmanager
+  def _lock_entry(self, entry_name: str, blocking: bool = True):
+    """Locks an entry across threads and processes.
+
+    Args:
+      entry_name: The name of the entry.
+      blocking: Whether to wait for the lock.
+
+    Yields:
+      Whether the lock was acquired, which is always True when blocking.
+    """
+    lock_path = os.path.join(
+        self._locks_dir, f"{entry_name[:_LOCK_SHARD_CHARS]}.lock"
+    )
+    with open(lock_path, "a", encoding="utf-8") as lock_file:
+      try:
+        fcntl.flock(
+            lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+        )
+      except BlockingIOError:
+        yield False
+        return
+      try:
+        yield True
+      finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+  def _evict(self) -> None:
+    """Removes the least recently used entries until within the budget."""
+    with open(self._eviction_lock_path, "a", encoding="utf-8") as lock_file:
+      fcntl.flock(lock_file, fcntl.LOCK_EX)
+      entries = []
+      with os.scandir(self._objects_dir) as it:
+        for entry in it:
+          if entry.is_file() and not entry.name.endswith(".tmp"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.name))
+      total_bytes = sum(size for _, size, _ in entries)
+      for _, size, entry_name in sorted(entries):
+        if total_bytes <= self._max_bytes:
+          break
+        with self._lock_entry(entry_name, blocking=False) as locked:
+          # An entry being read or written is left for a later eviction.
+          if not locked:
+            continue
+          with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(self._objects_dir, entry_name))
+          total_bytes -= size
+          logger.info("Evicted %s from the blob cache", entry_name)
+
+
+def _hash(name: str) -> str:
+  """Returns a file name for a blob or entry name."""
+  return hashlib.sha256(name.encode("utf-8")).hexdigest()
+
+
+_lock = threading.Lock()
+_default_cache = None
+
+
+def configure_blob_cache(
+    cache_dir: str | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    metadata_ttl_seconds: float = 0,
+) -> None:
+  """Sets up the blob cache used by download_file_locally.
+
+  Args:
+    cache_dir: (Optional) The directory to store the cached blobs in.
+      Defaults to DEFAULT_CACHE_DIR.
+    max_bytes: The total size of the cached blobs to stay within.
+    metadata_ttl_seconds: How long the generation of a blob is trusted before
+      it is checked again.
+  """
+  global _default_cache
+  with _lock:
+    _default_cache = BlobCache(
+        cache_dir or DEFAULT_CACHE_DIR, max_bytes, metadata_ttl_seconds
+    )
+
+
+def get_blob_cache() -> BlobCache:
+  """Returns the blob cache used by download_file_locally."""
+  global _default_cache
+  with _lock:
+    if _default_cache is None:
+      _default_cache = BlobCache()
+    return _default_cache
@@ -0,0 +1,248 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Blob transfers that switch to several connections for large files.
+
+A single stream can't fill the bandwidth of a VM for large videos, so files
+above a size threshold are downloaded as concurrent range reads and uploaded
+as concurrent parts of a multipart upload. The assembled file or object is
+then checked against the CRC32C checksum of the other side.
+"""
+
+import base64
+import concurrent.futures
+import dataclasses
+import logging
+import os
+import sys
+import threading
+
+from google import resumable_media
+from google.api_core import exceptions as api_core_exceptions
+from google.cloud import storage
+from google.cloud.storage import transfer_manager
+import google_crc32c
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_MIB = 1024 * 1024
+_CHECKSUM_READ_SIZE = 8 * _MIB
+
+
+@dataclasses.dataclass(frozen=True)
+class ChunkedTransferSettings:
+  """How large files are transferred.
+
+  Attributes:
+    threshold_bytes: The size from which files are transferred in chunks, or
+      None to always use a single stream.
+    chunk_size_bytes: The size of each chunk.
+    max_workers: The maximum number of chunks transferred at once.
+  """
+
+  threshold_bytes: int | None = 100 * _MIB
+  chunk_size_bytes: int = 32 * _MIB
+  max_workers: int = 8
+
+
+_lock = threading.Lock()
+_settings = ChunkedTransferSettings()
+
+
+def configure_chunked_transfers(
+    threshold_bytes: int | None = ChunkedTransferSettings.threshold_bytes,
+    chunk_size_bytes: int = ChunkedTransferSettings.chunk_size_bytes,
+    max_workers: int = ChunkedTransferSettings.max_workers,
+) -> None:
+  """Sets how the storage functions transfer large files.
+
+  Args:
+    threshold_bytes: The size from which files are transferred in chunks, or
+      None to always use a single stream.
+    chunk_size_bytes: The size of each chunk. Multipart uploads need chunks
+      of at least 5 MiB.
+    max_workers: The maximum number of chunks transferred at once.
+
+  Raises:
+    ValueError: If chunk_size_bytes or max_workers is less than 1.
+  """
+  global _settings
+  if chunk_size_bytes < 1 or max_workers < 1:
+    raise ValueError(
+        "chunk_size_bytes and max_workers must be at least 1, got"
+        f" {chunk_size_bytes} and {max_workers}"
+    )
+  with _lock:
+    _settings = ChunkedTransferSettings(
+        threshold_bytes, chunk_size_bytes, max_workers
+    )
+
+
+def get_chunked_transfer_settings() -> ChunkedTransferSettings:
+  """Returns how the storage functions transfer large files."""
+  return _settings
+
+
+def _is_large(size: int | None, settings: ChunkedTransferSettings) -> bool:
+  """Returns whether a file of the given size is transferred in chunks."""
+  return (
+      settings.threshold_bytes is not None
+      and size is not None
+      and size >= settings.threshold_bytes
+  )
+
+
+def compute_file_crc32c(file_path: str) -> str:
+  """Returns the base64 CRC32C checksum of a file, as Cloud Storage does."""
+  checksum = google_crc32c.Checksum()
+  with open(file_path, "rb") as f:
+    while chunk := f.read(_CHECKSUM_READ_SIZE):
+      checksum.update(chunk)
+  return base64.b64encode(checksum.digest()).decode("utf-8")
+
+
+def download_blob_to_file(blob: storage.Blob, file_path: str) -> None:
+  """Downloads a blob, in concurrent chunks if it is large.
+
+  The size of the blob is used if known, e.g. from a listing. Otherwise the
+  first threshold_bytes are read with a single range request, which returns
+  smaller blobs whole without a metadata request, and is rejected for empty
+  blobs. Only blobs that turn out to be larger have their metadata fetched,
+  to read the rest in chunks.
+
+  Args:
+    blob: The blob to download.
+    file_path: The local path to download the blob to.
+
+  Raises:
+    google.resumable_media.DataCorruption: If the checksum of the downloaded
+      file doesn't match the blob. The file is removed.
+  """
+  settings = get_chunked_transfer_settings()
+  if settings.threshold_bytes is None or (
+      blob.size is not None and not _is_large(blob.size, settings)
+  ):
+    blob.download_to_filename(file_path)
+    return
+
+  if blob.size is None:
+    with open(file_path, "wb") as f:
+      try:
+        blob.download_to_file(
+            f, start=0, end=settings.threshold_bytes - 1, checksum=None
+        )
+      except api_core_exceptions.RequestRangeNotSatisfiable:
+        # No range of an empty blob can be satisfied, so the file is empty.
+        pass
+      start = f.tell()
+    if start < settings.threshold_bytes:
+      # The whole blob was read. Its checksum came with the response.
+      _check_downloaded_file(blob, file_path)
+      return
+    # Read the rest from the same generation as the first range.
+    blob.reload(if_generation_match=blob.generation)
+  else:
+    if blob.generation is None or blob.crc32c is None:
+      blob.reload()
+    start = 0
+    with open(file_path, "wb"):
+      pass
+
+  logger.info(
+      "Downloading %s (%d bytes) in %d byte chunks",
+      blob.name,
+      blob.size,
+      settings.chunk_size_bytes,
+  )
+  with concurrent.futures.ThreadPoolExecutor(settings.max_workers) as executor:
+    futures = [
+        executor.submit(
+            _download_range,
+            blob,
+            file_path,
+            chunk_start,
+            min(chunk_start + settings.chunk_size_bytes, blob.size) - 1,
+        )
+        for chunk_start in range(start, blob.size, settings.chunk_size_bytes)
+    ]
+  for future in futures:
+    future.result()
+  _check_downloaded_file(blob, file_path)
+
+
+def _download_range(
+    blob: storage.Blob, file_path: str, start: int, end: int
+) -> None:
+  """Downloads the bytes from start to end, inclusive, in place in a file."""
+  with open(file_path, "r+b") as f:
+    f.seek(start)
+    blob.download_to_file(f, start=start, end=end, checksum=None)
+
+
+def _check_downloaded_file(blob: storage.Blob, file_path: str) -> None:
+  """Removes the file and raises if its checksum doesn't match the blob."""
+  actual_crc32c = compute_file_crc32c(file_path)
+  if blob.crc32c is not None and actual_crc32c != blob.crc32c:
+    os.remove(file_path)
+    raise resumable_media.DataCorruption(
+        None,
+        f"Checksum mismatch downloading {blob.name} to {file_path}: expected"
+        f" {blob.crc32c}, got {actual_crc32c}. The file was removed.",
+    )
+
+
+def upload_file_to_blob(
+    file_path: str, blob: storage.Blob, storage_client: storage.Client
+) -> None:
+  """Uploads a file to a blob, in concurrent parts if it is large.
+
+  Args:
+    file_path: The local path of the file to upload.
+    blob: The blob to upload to.
+    storage_client: The Google Cloud Storage client.
+
+  Raises:
+    google.resumable_media.DataCorruption: If the checksum of the uploaded
+      object doesn't match the file. The object is deleted.
+  """
+  settings = get_chunked_transfer_settings()
+  size = os.path.getsize(file_path)
+  if not _is_large(size, settings):
+    blob.upload_from_filename(filename=file_path, client=storage_client)
+    return
+  logger.info(
+      "Uploading %s (%d bytes) in %d byte parts",
+      file_path,
+      size,
+      settings.chunk_size_bytes,
+  )
+  transfer_manager.upload_chunks_concurrently(
+      file_path,
+      blob,
+      chunk_size=settings.chunk_size_bytes,
+      worker_type=transfer_manager.THREAD,
+      max_workers=settings.max_workers,
+  )
+  # Parts are checked one by one, so check the assembled object as well.
+  blob.reload(client=storage_client)
+  expected_crc32c = compute_file_crc32c(file_path)
+  if blob.crc32c != expected_crc32c:
+    blob.delete(client=storage_client)
+    raise resumable_media.DataCorruption(
+        None,
+        f"Checksum mismatch uploading {file_path} to {blob.name}: expected"
+        f" {expected_crc32c}, got {blob.crc32c}. The object was deleted.",
+    )
@@ -0,0 +1,110 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""The Cloud Storage client shared by the storage functions.
+
+Creating a storage.Client discovers credentials and opens a new HTTP session,
+so a client per call pays for credentials and a cold TLS connection on every
+file. The functions in this package instead default to a single client per
+process, whose session keeps a pool of warm connections.
+"""
+
+import logging
+import os
+import sys
+import threading
+
+import google.auth
+from google.auth.transport import requests as google_auth_requests
+from google.cloud import storage
+from requests import adapters
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_CONNECTION_POOL_SIZE = 32
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_connection_pool_size = DEFAULT_CONNECTION_POOL_SIZE
+
+
+def _create_storage_client(connection_pool_size: int) -> storage.Client:
+  """Creates a storage client with a connection pool of the given size."""
+  credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+  session = google_auth_requests.AuthorizedSession(credentials)
+  adapter = adapters.HTTPAdapter(
+      pool_connections=connection_pool_size,
+      pool_maxsize=connection_pool_size,
+  )
+  session.mount("https://", adapter)
+  return storage.Client(project=project, credentials=credentials, _http=session)
+
+
+def get_storage_client() -> storage.Client:
+  """Returns the storage client shared by the current process.
+
+  The client is created on first use and is safe to use from several
+  threads. A process forked from one that already had a client creates its
+  own, as connections can't be shared across processes.
+
+  Returns:
+    The shared Google Cloud Storage client.
+  """
+  global _client, _client_pid
+  with _lock:
+    if _client is None or _client_pid != os.getpid():
+      _client = _create_storage_client(_connection_pool_size)
+      _client_pid = os.getpid()
+      logger.info(
+          "Created storage client with %d pooled connections.",
+          _connection_pool_size,
+      )
+    return _client
+
+
+def configure_storage_client(
+    connection_pool_size: int = DEFAULT_CONNECTION_POOL_SIZE,
+) -> None:
+  """Sets how the shared storage client is created.
+
+  Should be called before the storage functions are used. If the pool size
+  changes, the shared client is created again on next use.
+
+  Args:
+    connection_pool_size: The maximum number of connections kept open to
+      Cloud Storage. Should be at least the number of threads transferring
+      files at once.
+
+  Raises:
+    ValueError: If connection_pool_size is less than 1.
+  """
+  global _client, _connection_pool_size
+  if connection_pool_size < 1:
+    raise ValueError(
+        f"connection_pool_size must be at least 1, got {connection_pool_size}"
+    )
+  with _lock:
+    if connection_pool_size != _connection_pool_size:
+      _connection_pool_size = connection_pool_size
+      _client = None
+
+
+def reset_storage_client() -> None:
+  """Discards the shared storage client, so the next use creates a new one."""
+  global _client
+  with _lock:
+    _client = None
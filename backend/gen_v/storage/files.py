@@ -0,0 +1,298 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Storage functions for files at any URI with a registered backend.
+
+These are the functions the pipeline uses. They keep their Cloud Storage
+names, but also accept file:// and mem:// URIs, see backends. The Cloud
+Storage client is only used for gs:// URIs.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+from typing import BinaryIO, Iterator
+
+from google import resumable_media
+from google.cloud import storage
+
+from gen_v.storage import backends
+from gen_v.storage import gcs
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def download_file_locally(
+    uri: str,
+    file_name: str = None,
+    tmp_string: str = "/content",
+    storage_client: storage.Client = None,
+    use_cache: bool = False,
+) -> str:
+  """Downloads a file to the local file system.
+
+  Args:
+    uri: The URI of the file to download.
+    file_name: (Optional) The name to give the downloaded file. If not
+      provided, the file name will be extracted from the URI.
+    tmp_string: (Optional) The directory the download should be placed in.
+    storage_client: The Google Cloud Storage client.
+    use_cache: (Optional) Whether to copy the file from the local blob cache,
+      downloading it only if its current generation isn't cached. Useful for
+      assets used many times, such as fonts, logos and audio.
+
+  Returns:
+    The path to the local file where the file was saved.
+
+  Raises:
+    FileNotFoundError: If the file at the given URI does not exist.
+  """
+  backend = backends.get_backend(uri, storage_client)
+  if not file_name:
+    file_name = gcs.get_file_name_from_gcs_url(uri)
+  if tmp_string not in file_name:
+    local_file_path = f"{tmp_string}/{file_name}"
+  else:
+    local_file_path = file_name
+
+  backend.download_file(uri, local_file_path, use_cache=use_cache)
+  return local_file_path
+
+
+def download_bytes(
+    uri: str, storage_client: storage.Client = None, use_cache: bool = False
+) -> bytes:
+  """Downloads the content of a file into memory.
+
+  Args:
+    uri: The URI of the file to download.
+    storage_client: The Google Cloud Storage client.
+    use_cache: (Optional) Whether to read the file from the local blob cache,
+      downloading it only if its current generation isn't cached. Useful for
+      assets used many times, such as logos.
+
+  Returns:
+    The content of the file.
+  """
+  backend = backends.get_backend(uri, storage_client)
+  if not use_cache:
+    return backend.read_bytes(uri)
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    local_file_path = os.path.join(tmp_dir, "file")
+    backend.download_file(uri, local_file_path, use_cache=True)
+    with open(local_file_path, "rb") as f:
+      return f.read()
+
+
+def open_read(uri: str, storage_client: storage.Client = None) -> BinaryIO:
+  """Opens a file as a binary stream for reading.
+
+  Cloud Storage files are fetched in chunks as they are read, so large files
+  can be streamed without being held in memory or written to disk.
+
+  Args:
+    uri: The URI of the file to read.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    A binary file-like object, to be closed after use.
+  """
+  return backends.get_backend(uri, storage_client).open_read(uri)
+
+
+def upload_bytes(
+    data: bytes,
+    gcs_uri: str,
+    content_type: str | None = None,
+    storage_client: storage.Client = None,
+) -> None:
+  """Uploads content from memory to a file.
+
+  Args:
+    data: The content to upload.
+    gcs_uri: The URI where the content should be uploaded.
+    content_type: (Optional) The content type of the file, e.g. 'image/png'.
+    storage_client: The Google Cloud Storage client.
+  """
+  backends.get_backend(gcs_uri, storage_client).write_bytes(
+      data, gcs_uri, content_type
+  )
+
+
+def open_write(
+    gcs_uri: str,
+    content_type: str | None = None,
+    storage_client: storage.Client = None,
+) -> BinaryIO:
+  """Opens a file as a binary stream for writing.
+
+  The file is only complete once the stream is closed.
+
+  Args:
+    gcs_uri: The URI of the file to write.
+    content_type: (Optional) The content type of the file, e.g. 'video/mp4'.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    A binary file-like object, to be closed to finish the upload.
+  """
+  return backends.get_backend(gcs_uri, storage_client).open_write(
+      gcs_uri, content_type
+  )
+
+
+def upload_file_to_gcs(
+    local_file_path: str, gcs_uri: str, storage_client: storage.Client = None
+) -> None:
+  """Upload a file, then remove the local copy.
+
+  Args:
+      local_file_path: The local system path to the file to upload.
+      gcs_uri: The URI where the file should be uploaded.
+      storage_client: The Google Cloud Storage client.
+  """
+  try:
+    backends.get_backend(gcs_uri, storage_client).upload_file(
+        local_file_path, gcs_uri
+    )
+    print(f"Uploaded file to: {gcs_uri}")
+    os.remove(local_file_path)
+  except OSError as e:
+    print(f"Unable to remove local copy of uploaded file: {e}")
+  except resumable_media.InvalidResponse as e:
+    print(f"Error in upload_file_to_gcs: {e}")
+    print(f"Can not upload file: {local_file_path}")
+    print(f"to gcs_uri: {gcs_uri}")
+  except resumable_media.DataCorruption as e:
+    print(f"Error in upload_file_to_gcs: {e}")
+    print(f"Can not upload file: {local_file_path}")
+    print(f"to gcs_uri: {gcs_uri}")
+
+
+def iter_files_in_gcs_folder(
+    gcs_uri: str,
+    match_glob: str | None = None,
+    extensions: list[str] | None = None,
+    recursive: bool = True,
+    storage_client: storage.Client = None,
+) -> Iterator[str]:
+  """Lists the files in a folder lazily.
+
+  Cloud Storage folders are listed one page at a time, with the filtering
+  done by Cloud Storage.
+
+  Args:
+    gcs_uri: The URI of the folder to list files from.
+    match_glob: (Optional) A glob the paths of the files must match, e.g.
+      'images/**.png'.
+    extensions: (Optional) The file extensions to keep, e.g. ['png', 'jpg'].
+      Matching is case-sensitive. Ignored if match_glob is set.
+    recursive: (Optional) Whether to list files in subfolders as well.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    An iterator over the URI of each file, in lexicographical order. Paths
+    without a dot, such as folder placeholders, are skipped.
+  """
+  return backends.get_backend(gcs_uri, storage_client).list_files(
+      gcs_uri,
+      match_glob=match_glob,
+      extensions=extensions,
+      recursive=recursive,
+  )
+
+
+def iter_file_fingerprints_in_gcs_folder(
+    gcs_uri: str,
+    match_glob: str | None = None,
+    extensions: list[str] | None = None,
+    recursive: bool = True,
+    storage_client: storage.Client = None,
+) -> Iterator[tuple[str, str]]:
+  """Lists the files in a folder lazily, with their fingerprints.
+
+  Cloud Storage returns the checksums in the listing, so no metadata request
+  is made per file. Other backends compute the fingerprint of each file.
+
+  Args:
+    gcs_uri: The URI of the folder to list files from.
+    match_glob: (Optional) A glob the paths of the files must match.
+    extensions: (Optional) The file extensions to keep, e.g. ['png'].
+    recursive: (Optional) Whether to list files in subfolders as well.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    An iterator over the URI and the fingerprint (see get_blob_fingerprint)
+    of each file, in lexicographical order.
+  """
+  return backends.get_backend(gcs_uri, storage_client).list_fingerprints(
+      gcs_uri,
+      match_glob=match_glob,
+      extensions=extensions,
+      recursive=recursive,
+  )
+
+
+def retrieve_all_files_from_gcs_folder(
+    gcs_uri: str,
+    storage_client: storage.Client = None,
+    match_glob: str | None = None,
+    extensions: list[str] | None = None,
+) -> list[str]:
+  """Retrieve all files from a folder.
+
+  Use iter_files_in_gcs_folder to start on the files before they are all
+  listed.
+
+  Args:
+      gcs_uri: The URI of the folder to retrieve files from.
+      storage_client: The Google Cloud Storage client.
+      match_glob: (Optional) A glob the paths of the files must match.
+      extensions: (Optional) The file extensions to keep, e.g. ['png'].
+
+  Returns:
+      A list of URIs for all files in the folder.
+  """
+  return list(
+      iter_files_in_gcs_folder(
+          gcs_uri,
+          match_glob=match_glob,
+          extensions=extensions,
+          storage_client=storage_client,
+      )
+  )
+
+
+def get_blob_fingerprint(
+    uri: str, storage_client: storage.Client = None
+) -> str:
+  """Returns a string identifying the current content of a file.
+
+  Files with the same content have the same fingerprint in every backend,
+  except Cloud Storage composite objects, which have no MD5 hash.
+
+  Args:
+    uri: The URI of the file.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    The fingerprint of the file content.
+
+  Raises:
+    FileNotFoundError: If the file at the given URI does not exist.
+  """
+  return backends.get_backend(uri, storage_client).get_fingerprint(uri)
@@ -15,15 +15,25 @@
 """Functions to interact with Cloud storage"""
 
 import logging
-import os
 import sys
+from typing import BinaryIO, Iterator
 
 from google.cloud import storage
 
+from gen_v.storage import cache
+from gen_v.storage import chunked
+from gen_v.storage import client
+
 logging.basicConfig(stream=sys.stdout)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+DEFAULT_LIST_PAGE_SIZE = 1000
+# Only the names and checksums are needed, and the page token to fetch the
+# next page. The checksums let listings fingerprint files without a GET each.
+_LIST_FIELDS = "items(name,md5Hash,crc32c,size),nextPageToken"
+_GLOB_SPECIAL_CHARS = frozenset("*?[]{}\\")
+
 
 def get_blob(uri: str, storage_client: storage.Client = None) -> any:
   """Returns a Google Cloud Storage blob object from a full URI.
@@ -35,120 +45,269 @@ def get_blob(uri: str, storage_client: storage.Client = None) -> any:
   Returns:
     A Google Cloud Storage blob object.
   """
-  storage_client = storage_client or storage.Client()
+  storage_client = storage_client or client.get_storage_client()
   bucket = get_bucket_name_from_gcs_url(uri)
   path = get_path_from_gcs_url(uri)
   return storage_client.bucket(bucket).blob(path)
 
 
-def download_file_locally(
-    uri: str,
-    file_name: str = None,
-    tmp_string: str = "/content",
-    storage_client: storage.Client = None,
-) -> str:
-  """Downloads a file from Google Cloud Storage to the local file system.
+def get_existing_blob(uri: str, storage_client: storage.Client = None) -> any:
+  """Returns a blob with its metadata, such as generation and checksums.
 
   Args:
-    uri: The Google Cloud Storage URI of the file to download.
-    file_name: (Optional) The name to give the downloaded file. If not
-      provided, the file name will be extracted from the URI.
-    tmp_string: (Optional) The directory the download should be placed in.
+    uri: The full Google Cloud Storage URI of the blob.
     storage_client: The Google Cloud Storage client.
 
+  Returns:
+    A Google Cloud Storage blob object with its metadata loaded.
+
+  Raises:
+    FileNotFoundError: If the blob at the given URI does not exist.
+  """
+  storage_client = storage_client or client.get_storage_client()
+  bucket = storage_client.bucket(get_bucket_name_from_gcs_url(uri))
+  blob = bucket.get_blob(get_path_from_gcs_url(uri))
+  if blob is None:
+    raise FileNotFoundError(f"File not found at URI: {uri}")
+  return blob
+
+
+def get_blob_fingerprint(
+    uri: str, storage_client: storage.Client = None
+) -> str:
+  """Returns a string identifying the current content of a blob.
+
+  Uses the MD5 hash of the content, or its CRC32C checksum and size for
+  composite objects, which have no MD5 hash. Only the blob metadata is
+  fetched.
+
+  Args:
+    uri: The full Google Cloud Storage URI of the blob.
+    storage_client: The Google Cloud Storage client.
 
   Returns:
-    The path to the local file where the file was saved.
+    The fingerprint of the blob content.
 
   Raises:
-    FileNotFoundError: If the file at the given URI does not exist.
+    FileNotFoundError: If the blob at the given URI does not exist.
   """
-  storage_client = storage_client or storage.Client()
+  return _get_fingerprint(get_existing_blob(uri, storage_client))
+
+
+def _get_fingerprint(blob: storage.Blob) -> str:
+  """Returns the fingerprint of a blob whose checksums are loaded."""
+  if blob.md5_hash:
+    return f"md5:{blob.md5_hash}"
+  return f"crc32c:{blob.crc32c}:{blob.size}"
+
+
+def download_to_file(
+    uri: str,
+    local_file_path: str,
+    storage_client: storage.Client = None,
+    use_cache: bool = False,
+) -> None:
+  """Downloads a file from Google Cloud Storage to a local path.
+
+  Args:
+    uri: The Google Cloud Storage URI of the file to download.
+    local_file_path: The local path to download the file to.
+    storage_client: The Google Cloud Storage client.
+    use_cache: (Optional) Whether to copy the file from the local blob cache,
+      downloading it only if its current generation isn't cached.
+  """
+  storage_client = storage_client or client.get_storage_client()
   blob = get_blob(uri, storage_client)
-  if not blob:
-    raise FileNotFoundError(f"File not found at URI: {uri}")
-  if not file_name:
-    file_name = get_file_name_from_gcs_url(uri)
-  if tmp_string not in file_name:
-    local_file_path = f"{tmp_string}/{file_name}"
+  if use_cache:
+    cache.get_blob_cache().fetch(blob, local_file_path, storage_client)
   else:
-    local_file_path = file_name
+    chunked.download_blob_to_file(blob, local_file_path)
+
+
+def download_bytes(uri: str, storage_client: storage.Client = None) -> bytes:
+  """Downloads the content of a file from Google Cloud Storage into memory.
+
+  Args:
+    uri: The Google Cloud Storage URI of the file to download.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    The content of the file.
+  """
+  storage_client = storage_client or client.get_storage_client()
+  return get_blob(uri, storage_client).download_as_bytes()
+
+
+def open_read(uri: str, storage_client: storage.Client = None) -> BinaryIO:
+  """Opens a file in Google Cloud Storage as a binary stream for reading.
+
+  The content is fetched in chunks as it is read, so large files can be
+  streamed without being held in memory or written to disk.
+
+  Args:
+    uri: The Google Cloud Storage URI of the file to read.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    A seekable binary file-like object, to be closed after use.
+  """
+  storage_client = storage_client or client.get_storage_client()
+  return get_blob(uri, storage_client).open("rb")
+
+
+def upload_bytes(
+    data: bytes,
+    gcs_uri: str,
+    content_type: str | None = None,
+    storage_client: storage.Client = None,
+) -> None:
+  """Uploads content from memory to a file in Google Cloud Storage.
+
+  Args:
+    data: The content to upload.
+    gcs_uri: The GCS URI where the content should be uploaded.
+    content_type: (Optional) The content type of the file, e.g. 'image/png'.
+    storage_client: The Google Cloud Storage client.
+  """
+  storage_client = storage_client or client.get_storage_client()
+  get_blob(gcs_uri, storage_client).upload_from_string(
+      data, content_type=content_type or "application/octet-stream"
+  )
 
-  blob.download_to_filename(local_file_path)
-  return local_file_path
 
+def open_write(
+    gcs_uri: str,
+    content_type: str | None = None,
+    storage_client: storage.Client = None,
+) -> BinaryIO:
+  """Opens a file in Google Cloud Storage as a binary stream for writing.
 
-def download_files(gcs_uris: list[str]) -> list[str]:
-  """Downloads files from Google Cloud Storage to the local file system.
+  The content is uploaded in chunks as it is written, and the file is only
+  created once the stream is closed.
 
   Args:
-    gcs_uris: A list of Google Cloud Storage URIs of the files to download.
+    gcs_uri: The GCS URI of the file to write.
+    content_type: (Optional) The content type of the file, e.g. 'video/mp4'.
+    storage_client: The Google Cloud Storage client.
 
   Returns:
-    A list of local file paths where the files were saved.
+    A binary file-like object, to be closed to finish the upload.
   """
-  local_file_paths = []
-  for gcs_uri in gcs_uris:
-    local_file_paths.append(download_file_locally(gcs_uri))
-  return local_file_paths
+  storage_client = storage_client or client.get_storage_client()
+  return get_blob(gcs_uri, storage_client).open("wb", content_type=content_type)
+
 
+def _build_extensions_glob(path: str, extensions: list[str]) -> str | None:
+  """Returns a glob matching files under a path with any of the extensions.
 
-def retrieve_all_files_from_gcs_folder(
-    gcs_uri: str, storage_client: storage.Client = None
-) -> list[str]:
-  """Retrieve all files from a GCS folder.
   Args:
-      gcs_uri: The GCS folder to retrieve files from.
-      storage_client: The Google Cloud Storage client.
+    path: The prefix the files are under.
+    extensions: The extensions, with or without the leading dot.
+
   Returns:
-      A list of GCS URIs for all files in the folder.
+    The glob, or None if the path has characters with a meaning in globs.
   """
-  storage_client = storage_client or storage.Client()
-  bucket_name = get_bucket_name_from_gcs_url(gcs_uri)
-  bucket = storage_client.bucket(bucket_name)
+  if _GLOB_SPECIAL_CHARS.intersection(path):
+    return None
+  suffixes = [extension.lstrip(".") for extension in extensions]
+  if len(suffixes) == 1:
+    return f"{path}**.{suffixes[0]}"
+  return f"{path}**.{{{','.join(suffixes)}}}"
+
+
+def iter_files_in_gcs_folder(
+    gcs_uri: str,
+    match_glob: str | None = None,
+    extensions: list[str] | None = None,
+    recursive: bool = True,
+    page_size: int = DEFAULT_LIST_PAGE_SIZE,
+    storage_client: storage.Client = None,
+) -> Iterator[str]:
+  """Lists the files in a GCS folder lazily, one page at a time.
 
-  path = get_path_from_gcs_url(gcs_uri)
+  Filtering is done by Cloud Storage and only the object names and checksums
+  are fetched, so the first URIs are yielded as soon as the first page
+  arrives, however many objects the folder holds.
 
-  blobs = bucket.list_blobs(prefix=path)
-  output = []
-  for blob in blobs:
-    if len(blob.name.split(".")) > 1:
-      output.append(f"gs://{bucket_name}/{blob.name}")
-  return output
+  Args:
+    gcs_uri: The GCS folder to list files from.
+    match_glob: (Optional) A glob the full object names must match, e.g.
+      'images/**.png'.
+    extensions: (Optional) The file extensions to keep, e.g. ['png', 'jpg'].
+      Matching is case-sensitive. Ignored if match_glob is set.
+    recursive: (Optional) Whether to list files in subfolders as well.
+    page_size: (Optional) The maximum number of objects fetched per request.
+    storage_client: The Google Cloud Storage client.
 
+  Yields:
+    The GCS URI of each file, in lexicographical order. Objects without a
+    dot in their name, such as folder placeholders, are skipped.
+  """
+  for uri, _ in _iter_blobs_in_gcs_folder(
+      gcs_uri, match_glob, extensions, recursive, page_size, storage_client
+  ):
+    yield uri
+
+
+def iter_file_fingerprints_in_gcs_folder(
+    gcs_uri: str,
+    match_glob: str | None = None,
+    extensions: list[str] | None = None,
+    recursive: bool = True,
+    page_size: int = DEFAULT_LIST_PAGE_SIZE,
+    storage_client: storage.Client = None,
+) -> Iterator[tuple[str, str]]:
+  """Lists the files in a GCS folder lazily, with their fingerprints.
 
-def upload_file_to_gcs(
-    local_file_path: str, gcs_uri: str, storage_client: storage.Client = None
-) -> None:
-  """Upload a file to GCS
-
-  Args:
-      local_file_path: The local system path to the file to upload.
-      gcs_uri: The GCS URI where the file should be uploaded.
-      storage_client: The Google Cloud Storage client.
-  """
-  storage_client = storage_client or storage.Client()
-  try:
-    bucket_name = get_bucket_name_from_gcs_url(gcs_uri)
-    bucket = storage_client.bucket(bucket_name)
-    subdirectory_path = get_path_from_gcs_url(gcs_uri)
-
-    output_blob = bucket.blob(subdirectory_path)
-    output_blob.upload_from_filename(
-        filename=local_file_path, client=storage_client
-    )
-    print(f"Uploaded file to: {gcs_uri}")
-    os.remove(local_file_path)
-  except OSError as e:
-    print(f"Unable to remove local copy of uploaded file: {e}")
-  except storage.exceptions.InvalidResponse as e:
-    print(f"Error in upload_file_to_gcs: {e}")
-    print(f"Can not upload file: {local_file_path}")
-    print(f"to gcs_uri: {gcs_uri}")
-  except storage.exceptions.DataCorruption as e:
-    print(f"Error in upload_file_to_gcs: {e}")
-    print(f"Can not upload file: {local_file_path}")
-    print(f"to gcs_uri: {gcs_uri}")
+  The fingerprints come from the listing itself, so no metadata request is
+  made per file. See iter_files_in_gcs_folder for the arguments.
+
+  Yields:
+    The GCS URI and the fingerprint (see get_blob_fingerprint) of each file,
+    in lexicographical order.
+  """
+  for uri, blob in _iter_blobs_in_gcs_folder(
+      gcs_uri, match_glob, extensions, recursive, page_size, storage_client
+  ):
+    yield uri, _get_fingerprint(blob)
+
+
+def _iter_blobs_in_gcs_folder(
+    gcs_uri: str,
+    match_glob: str | None,
+    extensions: list[str] | None,
+    recursive: bool,
+    page_size: int,
+    storage_client: storage.Client | None,
+) -> Iterator[tuple[str, storage.Blob]]:
+  """Lists the files in a GCS folder, see iter_files_in_gcs_folder.
+
+  Yields:
+    The GCS URI of each file and its listed blob, with its checksums.
+  """
+  storage_client = storage_client or client.get_storage_client()
+  bucket_name = get_bucket_name_from_gcs_url(gcs_uri)
+  path = get_path_from_gcs_url(gcs_uri)
+  suffixes = None
+  if extensions and not match_glob:
+    match_glob = _build_extensions_glob(path, extensions)
+    if match_glob is None:
+      suffixes = tuple(f".{extension.lstrip('.')}" for extension in extensions)
+
+  blobs = storage_client.list_blobs(
+      bucket_name,
+      prefix=path,
+      delimiter=None if recursive else "/",
+      match_glob=match_glob,
+      page_size=page_size,
+      fields=_LIST_FIELDS,
+  )
+  for blob in blobs:
+    if "." not in blob.name:
+      continue
+    if suffixes and not blob.name.endswith(suffixes):
+      continue
+    yield f"gs://{bucket_name}/{blob.name}", blob
 
 
 def get_file_name_from_gcs_url(gcs_uri: str) -> str:
@@ -194,7 +353,7 @@ def create_gcs_folders_in_subfolder(
       subfolder_name: The name of the subfolder.
       folder_names: A list of folder names to create within the subfolder.
   """
-  storage_client = storage_client or storage.Client()
+  storage_client = storage_client or client.get_storage_client()
   bucket = storage_client.bucket(bucket_name)
 
   for folder_name in folder_names:
@@ -206,26 +365,50 @@ def create_gcs_folders_in_subfolder(
       logger.info("Folder created: %s", folder_name)
 
 
+def get_moved_blob_uri(
+    source_blob_gcsuri: str, destination_folder_name: str
+) -> str:
+  """Returns the URI move_blob moves a blob to.
+
+  The blob is moved to a folder next to the one it is in, e.g.
+  gs://bucket/a/b/video.mp4 is moved to gs://bucket/a/<folder>/video.mp4.
+  URIs with other schemes are handled the same way.
+
+  Args:
+      source_blob_gcsuri: The GCS URI of the blob to move.
+      destination_folder_name: The destination folder for the blob.
+
+  Returns:
+      The GCS URI of the moved blob.
+  """
+  parent_folder = source_blob_gcsuri.rsplit("/", 2)[0]
+  file = get_file_name_from_gcs_url(source_blob_gcsuri)
+  return f"{parent_folder}/{destination_folder_name}/{file}"
+
+
 def move_blob(
     source_blob_gcsuri: str,
     destination_folder_name: str,
     storage_client: storage.Client = None,
 ) -> None:
   """Moves folders (and their contents) within the same GCS bucket.
+
+  Use move_many to move several blobs at once.
+
   Args:
       bucket_name: The name of the bucket.
       source_blob_name: The source blob.
       destination_folder_name: The destination folder for the blob.
   """
-  storage_client = storage_client or storage.Client()
+  storage_client = storage_client or client.get_storage_client()
   bucket = storage_client.bucket(
       get_bucket_name_from_gcs_url(source_blob_gcsuri)
   )
   source_blob = bucket.blob(get_path_from_gcs_url(source_blob_gcsuri))
 
-  root = "/".join(source_blob_gcsuri.replace("gs://", "").split("/")[1:-2])
-  file = get_file_name_from_gcs_url(source_blob_gcsuri)
-  destination = f"{root}/{destination_folder_name}/{file}"
+  destination = get_path_from_gcs_url(
+      get_moved_blob_uri(source_blob_gcsuri, destination_folder_name)
+  )
   new_blob = bucket.copy_blob(source_blob, bucket, destination)
   source_blob.delete()
 
@@ -0,0 +1,250 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Cloud Storage transfers on the event loop, over the JSON API.
+
+The Cloud Storage library is blocking, so awaiting one of its calls holds a
+thread until the call returns. These transfers use an async HTTP client
+instead: a transfer in flight costs a coroutine and a pooled connection, not
+an OS thread. Only discovering and refreshing credentials run on a thread,
+once per token.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import sys
+from urllib import parse
+import uuid
+
+from google import resumable_media
+from google.api_core import exceptions as api_core_exceptions
+import google.auth
+from google.auth import credentials as google_auth_credentials
+from google.auth.transport import requests as google_auth_requests
+from google.cloud import storage
+import google_crc32c
+import httpx
+
+from gen_v.storage import gcs
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_MAX_CONNECTIONS = 128
+DEFAULT_TIMEOUT_SECONDS = 60.0
+_API_URL = "https://storage.googleapis.com/storage/v1"
+_UPLOAD_URL = "https://storage.googleapis.com/upload/storage/v1"
+# Reads are retried on these statuses, as by the Cloud Storage library.
+_RETRYABLE_STATUS_CODES = frozenset((408, 429, 500, 502, 503, 504))
+_MAX_READ_ATTEMPTS = 4
+_INITIAL_BACKOFF_SECONDS = 1.0
+
+
+class AsyncGcsClient:
+  """Awaitable reads and writes of whole blobs, over pooled connections.
+
+  Use it from a single event loop, and call aclose once done.
+  """
+
+  def __init__(
+      self,
+      max_connections: int = DEFAULT_MAX_CONNECTIONS,
+      credentials: google_auth_credentials.Credentials | None = None,
+      transport: httpx.AsyncBaseTransport | None = None,
+  ):
+    """Initialises the client.
+
+    Args:
+      max_connections: The maximum number of connections kept open to Cloud
+        Storage, so the maximum number of transfers in flight.
+      credentials: (Optional) The credentials to authorize requests with.
+        Defaults to the application default credentials.
+      transport: (Optional) The HTTP transport, for tests.
+    """
+    self._credentials = credentials
+    self._credentials_lock = asyncio.Lock()
+    self._http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        ),
+        # Requests wait for a connection for as long as the pool is busy.
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT_SECONDS, pool=None),
+        transport=transport,
+    )
+
+  async def aclose(self) -> None:
+    """Closes the pooled connections."""
+    await self._http_client.aclose()
+
+  async def download_bytes(self, uri: str) -> bytes:
+    """Downloads the content of a blob into memory.
+
+    Args:
+      uri: The Google Cloud Storage URI of the blob.
+
+    Returns:
+      The content of the blob.
+
+    Raises:
+      google.api_core.exceptions.NotFound: If the blob does not exist.
+      google.resumable_media.DataCorruption: If the content doesn't match
+        the checksum of the blob.
+    """
+    response = await self._request(
+        "GET",
+        _get_object_url(uri),
+        params={"alt": "media"},
+        retry=True,
+    )
+    data = response.content
+    expected_crc32c = _get_header_crc32c(response.headers)
+    # Blobs stored compressed are served decompressed, so their checksum is
+    # that of the stored bytes.
+    stored_encoding = response.headers.get("x-goog-stored-content-encoding")
+    if stored_encoding in (None, "identity") and expected_crc32c is not None:
+      actual_crc32c = compute_crc32c(data)
+      if actual_crc32c != expected_crc32c:
+        raise resumable_media.DataCorruption(
+            response,
+            f"Checksum mismatch downloading {uri}: expected"
+            f" {expected_crc32c}, got {actual_crc32c}.",
+        )
+    return data
+
+  async def upload_bytes(
+      self, data: bytes, uri: str, content_type: str | None = None
+  ) -> None:
+    """Uploads content from memory to a blob.
+
+    The CRC32C checksum of the content is sent with it, so Cloud Storage
+    rejects a corrupted upload instead of storing it.
+
+    Args:
+      data: The content to upload.
+      uri: The Google Cloud Storage URI of the blob.
+      content_type: (Optional) The content type of the blob, e.g.
+        'image/png'.
+
+    Raises:
+      google.api_core.exceptions.GoogleAPICallError: If the upload failed.
+    """
+    content_type = content_type or "application/octet-stream"
+    metadata = {
+        "name": gcs.get_path_from_gcs_url(uri),
+        "contentType": content_type,
+        "crc32c": compute_crc32c(data),
+    }
+    boundary = uuid.uuid4().hex
+    body = b"".join((
+        f"--{boundary}\r\n".encode(),
+        b"Content-Type: application/json; charset=UTF-8\r\n\r\n",
+        json.dumps(metadata).encode(),
+        f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\n\r\n".encode(),
+        data,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ))
+    # Uploads without a generation precondition aren't retried, as by the
+    # Cloud Storage library.
+    await self._request(
+        "POST",
+        f"{_UPLOAD_URL}/b/{gcs.get_bucket_name_from_gcs_url(uri)}/o",
+        params={"uploadType": "multipart"},
+        headers={"Content-Type": f"multipart/related; boundary={boundary}"},
+        content=body,
+        retry=False,
+    )
+
+  async def _get_auth_headers(self) -> dict[str, str]:
+    """Returns the authorization headers, refreshing the token if needed."""
+    async with self._credentials_lock:
+      if self._credentials is None:
+        self._credentials, _ = await asyncio.to_thread(
+            google.auth.default, scopes=storage.Client.SCOPE
+        )
+      if not self._credentials.valid:
+        await asyncio.to_thread(
+            self._credentials.refresh, google_auth_requests.Request()
+        )
+      headers = {}
+      self._credentials.apply(headers)
+      return headers
+
+  async def _request(
+      self,
+      method: str,
+      url: str,
+      retry: bool,
+      headers: dict[str, str] | None = None,
+      **kwargs,
+  ) -> httpx.Response:
+    """Sends a request, retrying transient errors if retry is set.
+
+    Raises:
+      google.api_core.exceptions.GoogleAPICallError: If the response is an
+        error.
+    """
+    attempts = _MAX_READ_ATTEMPTS if retry else 1
+    for attempt in range(1, attempts + 1):
+      request_headers = {**(headers or {}), **await self._get_auth_headers()}
+      try:
+        response = await self._http_client.request(
+            method, url, headers=request_headers, **kwargs
+        )
+      except httpx.TransportError as e:
+        if attempt == attempts:
+          raise
+        logger.warning("Retrying %s %s after: %s", method, url, e)
+      else:
+        if (
+            response.status_code not in _RETRYABLE_STATUS_CODES
+            or attempt == attempts
+        ):
+          break
+        logger.warning(
+            "Retrying %s %s after status %d", method, url, response.status_code
+        )
+      await asyncio.sleep(_INITIAL_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    if response.is_error:
+      raise api_core_exceptions.from_http_status(
+          response.status_code,
+          f"{method} {url}: {response.text}",
+          response=response,
+      )
+    return response
+
+
+def _get_object_url(uri: str) -> str:
+  """Returns the JSON API URL of a blob."""
+  bucket = gcs.get_bucket_name_from_gcs_url(uri)
+  path = parse.quote(gcs.get_path_from_gcs_url(uri), safe="")
+  return f"{_API_URL}/b/{bucket}/o/{path}"
+
+
+def _get_header_crc32c(headers: httpx.Headers) -> str | None:
+  """Returns the CRC32C checksum in the x-goog-hash headers, if any."""
+  for header in headers.get_list("x-goog-hash", split_commas=True):
+    name, _, value = header.strip().partition("=")
+    if name == "crc32c":
+      return value
+  return None
+
+
+def compute_crc32c(data: bytes) -> str:
+  """Returns the base64 CRC32C checksum of content, as Cloud Storage does."""
+  checksum = google_crc32c.Checksum(data)
+  return base64.b64encode(checksum.digest()).decode("utf-8")
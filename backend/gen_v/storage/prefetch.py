@@ -0,0 +1,356 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Downloads the next files of a pipeline stage while one is processed.
+
+A stage that downloads a file, processes it, then downloads the next leaves
+the CPU idle during transfers and the network idle during processing. The
+prefetcher keeps a few downloads ahead of the consumer, within a budget, and
+removes each file, from disk or memory, once it has been released.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import dataclasses
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from typing import Callable, Iterable
+
+from google.cloud import storage
+
+from gen_v.storage import backends
+from gen_v.storage import gcs
+from gen_v.storage import transfer
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_MIB = 1024 * 1024
+
+
+@dataclasses.dataclass(frozen=True)
+class PrefetchSettings:
+  """How far ahead files are downloaded.
+
+  Attributes:
+    max_files: The maximum number of files downloaded ahead of the consumer.
+    max_bytes: The total size of the downloaded, unreleased files from which
+      no further download is started.
+  """
+
+  max_files: int = 4
+  max_bytes: int = 1024 * _MIB
+
+
+_lock = threading.Lock()
+_settings = PrefetchSettings()
+
+
+def configure_prefetching(
+    max_files: int = PrefetchSettings.max_files,
+    max_bytes: int = PrefetchSettings.max_bytes,
+) -> None:
+  """Sets how far ahead prefetch_files downloads files by default.
+
+  Args:
+    max_files: The maximum number of files downloaded ahead of the consumer.
+    max_bytes: The budget of the downloaded, unreleased files, on disk or in
+      memory.
+
+  Raises:
+    ValueError: If max_files or max_bytes is less than 1.
+  """
+  global _settings
+  if max_files < 1 or max_bytes < 1:
+    raise ValueError(
+        "max_files and max_bytes must be at least 1, got"
+        f" {max_files} and {max_bytes}"
+    )
+  with _lock:
+    _settings = PrefetchSettings(max_files, max_bytes)
+
+
+def get_prefetch_settings() -> PrefetchSettings:
+  """Returns how far ahead prefetch_files downloads files by default."""
+  return _settings
+
+
+@dataclasses.dataclass
+class PrefetchedFile(transfer.TransferResult):
+  """A file downloaded ahead of its use, removed once released.
+
+  Use it as a context manager, or call release once the local file is no
+  longer needed. A file read into memory has no destination, and its content
+  is in data instead.
+
+  Attributes:
+    size: The size of the local file in bytes, 0 if the download failed.
+    data: The content of a file read into memory, None once released.
+  """
+
+  size: int = 0
+  data: bytes | None = dataclasses.field(default=None, repr=False)
+  _release: Callable[["PrefetchedFile"], None] | None = dataclasses.field(
+      default=None, repr=False, compare=False
+  )
+
+  def release(self) -> None:
+    """Removes the local file and frees its share of the budget."""
+    if self._release is not None:
+      self._release(self)
+      self._release = None
+
+  def __enter__(self) -> "PrefetchedFile":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.release()
+
+
+class Prefetcher:
+  """Iterates over files in order, downloading the next ones in the background.
+
+  A download is started while fewer than max_files are waiting to be
+  consumed and the downloaded files not yet released take less than
+  max_bytes. The files being downloaded are only counted once complete, so
+  the budget can be exceeded by up to max_files files. The next file is
+  always downloaded ahead, so files held by the consumer can't stall the
+  iteration.
+
+  Closing the prefetcher, or leaving it as a context manager, cancels the
+  pending downloads and removes every file that wasn't released.
+  """
+
+  def __init__(
+      self,
+      uris: Iterable[str],
+      destination_dir: str | None = None,
+      file_names: Iterable[str] | None = None,
+      max_files: int | None = None,
+      max_bytes: int | None = None,
+      storage_client: storage.Client = None,
+      in_memory: bool = False,
+  ):
+    """Initialises the prefetcher. No download starts before iterating.
+
+    Args:
+      uris: The URIs of the files to download. It is consumed lazily, so it
+        can be a listing still in progress.
+      destination_dir: (Optional) The directory to download the files into.
+        Defaults to a temporary directory removed on close.
+      file_names: (Optional) The name to give each downloaded file. Defaults
+        to the file names in the URIs, prefixed with their position so files
+        from different folders don't clash.
+      max_files: (Optional) The maximum number of files downloaded ahead.
+        Defaults to the configured setting.
+      max_bytes: (Optional) The budget of the downloaded, unreleased files.
+        Defaults to the configured setting.
+      storage_client: The Google Cloud Storage client.
+      in_memory: (Optional) Whether to read the files into memory instead of
+        downloading them to disk, for consumers that decode them anyway.
+    """
+    settings = get_prefetch_settings()
+    self._max_files = max_files or settings.max_files
+    self._max_bytes = max_bytes or settings.max_bytes
+    if file_names is None:
+      self._items = enumerate((uri, None) for uri in uris)
+    else:
+      self._items = enumerate(zip(uris, file_names, strict=True))
+    self._in_memory = in_memory
+    self._owns_destination_dir = destination_dir is None and not in_memory
+    self._destination_dir = destination_dir
+    if self._owns_destination_dir:
+      self._destination_dir = tempfile.mkdtemp(prefix="gen_v_prefetch_")
+    self._storage_client = storage_client
+    self._executor = concurrent.futures.ThreadPoolExecutor(
+        self._max_files, thread_name_prefix="gen_v_prefetch"
+    )
+    self._pending = collections.deque()
+    self._lock = threading.Lock()
+    self._unreleased = {}
+    self._unreleased_bytes = 0
+    self._exhausted = False
+    self._closed = False
+
+  def __iter__(self) -> "Prefetcher":
+    return self
+
+  def __next__(self) -> PrefetchedFile:
+    if self._closed:
+      raise StopIteration
+    self._fill()
+    if not self._pending:
+      raise StopIteration
+    prefetched = self._pending.popleft().result()
+    self._fill()
+    return prefetched
+
+  def __enter__(self) -> "Prefetcher":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def close(self) -> None:
+    """Stops downloading and removes the files that weren't released."""
+    if self._closed:
+      return
+    self._closed = True
+    for future in self._pending:
+      future.cancel()
+    self._executor.shutdown(wait=True)
+    with self._lock:
+      unreleased = list(self._unreleased.values())
+    for prefetched in unreleased:
+      prefetched.release()
+    if self._owns_destination_dir:
+      shutil.rmtree(self._destination_dir, ignore_errors=True)
+
+  def _fill(self) -> None:
+    """Starts downloads until the lookahead or the budget is reached."""
+    while not self._exhausted and (
+        not self._pending
+        or (
+            len(self._pending) < self._max_files
+            and self._unreleased_bytes < self._max_bytes
+        )
+    ):
+      try:
+        i, (uri, file_name) = next(self._items)
+      except StopIteration:
+        self._exhausted = True
+        return
+      local_file_path = None
+      if not self._in_memory:
+        if file_name is None:
+          file_name = f"{i}_{gcs.get_file_name_from_gcs_url(uri)}"
+        local_file_path = os.path.join(self._destination_dir, file_name)
+      self._pending.append(
+          self._executor.submit(self._download, uri, local_file_path)
+      )
+
+  def _download(self, uri: str, local_file_path: str | None) -> PrefetchedFile:
+    """Downloads one file, or reads it into memory without a local path.
+
+    A failure is reported in the result.
+    """
+    prefetched = PrefetchedFile(uri, local_file_path, _release=self._remove)
+    try:
+      backend = backends.get_backend(uri, self._storage_client)
+      if local_file_path is None:
+        prefetched.data = backend.read_bytes(uri)
+        prefetched.size = len(prefetched.data)
+      else:
+        backend.download_file(uri, local_file_path)
+        prefetched.size = os.path.getsize(local_file_path)
+    except transfer.TRANSFER_ERRORS as e:
+      logger.error("Failed to prefetch %s: %s", uri, e)
+      prefetched.error = e
+    with self._lock:
+      self._unreleased[id(prefetched)] = prefetched
+      self._unreleased_bytes += prefetched.size
+    return prefetched
+
+  def _remove(self, prefetched: PrefetchedFile) -> None:
+    """Removes a released file and frees its share of the budget."""
+    with self._lock:
+      if self._unreleased.pop(id(prefetched), None) is None:
+        return
+      self._unreleased_bytes -= prefetched.size
+    prefetched.data = None
+    if prefetched.destination is None:
+      return
+    with contextlib.suppress(FileNotFoundError):
+      os.remove(prefetched.destination)
+
+
+def prefetch_files(
+    uris: Iterable[str],
+    destination_dir: str | None = None,
+    file_names: Iterable[str] | None = None,
+    max_files: int | None = None,
+    max_bytes: int | None = None,
+    storage_client: storage.Client = None,
+) -> Prefetcher:
+  """Iterates over downloaded files, downloading the next ones meanwhile.
+
+  Use it as a context manager, and release each file once processed:
+
+    with storage.prefetch_files(uris) as prefetched:
+      for download in prefetched:
+        with download:
+          process(download.destination)
+
+  Args:
+    uris: The URIs of the files to download, consumed lazily.
+    destination_dir: (Optional) The directory to download the files into.
+      Defaults to a temporary directory.
+    file_names: (Optional) The name to give each downloaded file.
+    max_files: (Optional) The maximum number of files downloaded ahead.
+    max_bytes: (Optional) The disk budget of the downloaded, unreleased files.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    An iterator over a PrefetchedFile per URI, in order. A failed download
+    is reported in its error instead of stopping the iteration.
+  """
+  return Prefetcher(
+      uris,
+      destination_dir=destination_dir,
+      file_names=file_names,
+      max_files=max_files,
+      max_bytes=max_bytes,
+      storage_client=storage_client,
+  )
+
+
+def prefetch_bytes(
+    uris: Iterable[str],
+    max_files: int | None = None,
+    max_bytes: int | None = None,
+    storage_client: storage.Client = None,
+) -> Prefetcher:
+  """Iterates over files read into memory, reading the next ones meanwhile.
+
+  Nothing is written to disk, for stages that decode the files from memory.
+  Use it as a context manager, and release each file once processed:
+
+    with storage.prefetch_bytes(uris) as prefetched:
+      for download in prefetched:
+        with download:
+          process(download.data)
+
+  Args:
+    uris: The URIs of the files to read, consumed lazily.
+    max_files: (Optional) The maximum number of files read ahead.
+    max_bytes: (Optional) The memory budget of the read, unreleased files.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    An iterator over a PrefetchedFile per URI, in order. A failed read is
+    reported in its error instead of stopping the iteration.
+  """
+  return Prefetcher(
+      uris,
+      max_files=max_files,
+      max_bytes=max_bytes,
+      storage_client=storage_client,
+      in_memory=True,
+  )
@@ -0,0 +1,323 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Bulk transfers to, from and within storage.
+
+Files are transferred concurrently on a bounded pool of threads sharing one
+storage client, through the backend for the scheme of their URI. A failed
+file is reported in its result instead of aborting the rest of the batch.
+"""
+
+import collections
+import concurrent.futures
+import dataclasses
+import logging
+import os
+import sys
+from typing import Callable
+
+from google import resumable_media
+from google.api_core import exceptions as api_core_exceptions
+from google.cloud import storage
+
+from gen_v.storage import backends
+from gen_v.storage import gcs
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_MAX_WORKERS = 8
+_MEMORY_SOURCE = "<memory>"
+
+# The errors that fail a single file rather than the whole batch.
+TRANSFER_ERRORS = (
+    api_core_exceptions.GoogleAPICallError,
+    OSError,
+    resumable_media.InvalidResponse,
+    resumable_media.DataCorruption,
+)
+
+
+@dataclasses.dataclass
+class TransferResult:
+  """The outcome of transferring one file.
+
+  Attributes:
+    source: The GCS URI or local path the file was transferred from.
+    destination: The local path or GCS URI the file was transferred to.
+    error: The error that stopped the transfer, or None if it succeeded.
+  """
+
+  source: str
+  destination: str
+  error: Exception | None = None
+
+  @property
+  def succeeded(self) -> bool:
+    """Whether the file was transferred."""
+    return self.error is None
+
+
+ProgressCallback = Callable[[TransferResult, int, int], None]
+
+
+def _run_transfers(
+    transfer: Callable[[str, str], None],
+    pairs: list[tuple[str, str]],
+    max_workers: int,
+    progress_callback: ProgressCallback | None,
+) -> list[TransferResult]:
+  """Runs transfers concurrently, collecting a result per file.
+
+  Args:
+    transfer: Transfers one file from a source to a destination.
+    pairs: The (source, destination) of each file.
+    max_workers: The maximum number of files transferred at once.
+    progress_callback: (Optional) Called in the calling thread with each
+      result, the number of files done and the total, as files complete.
+
+  Returns:
+    The result for each file, in the order of the pairs.
+  """
+
+  def run_transfer(source: str, destination: str) -> TransferResult:
+    try:
+      transfer(source, destination)
+    except TRANSFER_ERRORS as e:
+      logger.error("Failed to transfer %s to %s: %s", source, destination, e)
+      return TransferResult(source, destination, e)
+    return TransferResult(source, destination)
+
+  results = [None] * len(pairs)
+  with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+    futures = {
+        executor.submit(run_transfer, source, destination): i
+        for i, (source, destination) in enumerate(pairs)
+    }
+    for completed, future in enumerate(
+        concurrent.futures.as_completed(futures), start=1
+    ):
+      result = future.result()
+      results[futures[future]] = result
+      if progress_callback:
+        progress_callback(result, completed, len(pairs))
+  return results
+
+
+def download_many(
+    uris: list[str],
+    destination_dir: str = "/content",
+    file_names: list[str] | None = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    progress_callback: ProgressCallback | None = None,
+    storage_client: storage.Client = None,
+    use_cache: bool = False,
+) -> list[TransferResult]:
+  """Downloads files concurrently.
+
+  Args:
+    uris: The URIs of the files to download.
+    destination_dir: (Optional) The directory to download the files into.
+    file_names: (Optional) The name to give each downloaded file. Defaults to
+      the file names in the URIs.
+    max_workers: (Optional) The maximum number of files downloaded at once.
+    progress_callback: (Optional) Called with each result, the number of
+      files done and the total, as downloads complete.
+    storage_client: The Google Cloud Storage client.
+    use_cache: (Optional) Whether to copy the files from the local blob cache,
+      downloading only those whose current generation isn't cached.
+
+  Returns:
+    The result for each URI, in order, with the local path as destination.
+  """
+
+  def download(uri: str, local_file_path: str) -> None:
+    backends.get_backend(uri, storage_client).download_file(
+        uri, local_file_path, use_cache=use_cache
+    )
+
+  if file_names is None:
+    file_names = [gcs.get_file_name_from_gcs_url(uri) for uri in uris]
+  pairs = [
+      (uri, os.path.join(destination_dir, file_name))
+      for uri, file_name in zip(uris, file_names, strict=True)
+  ]
+  return _run_transfers(download, pairs, max_workers, progress_callback)
+
+
+def upload_many(
+    pairs: list[tuple[str, str]],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    progress_callback: ProgressCallback | None = None,
+    remove_local_files: bool = False,
+    storage_client: storage.Client = None,
+) -> list[TransferResult]:
+  """Uploads local files concurrently.
+
+  Args:
+    pairs: The local path and destination URI of each file.
+    max_workers: (Optional) The maximum number of files uploaded at once.
+    progress_callback: (Optional) Called with each result, the number of
+      files done and the total, as uploads complete.
+    remove_local_files: (Optional) Whether to delete each local file once it
+      has been uploaded, as upload_file_to_gcs does.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    The result for each file, in order.
+  """
+
+  def upload(local_file_path: str, uri: str) -> None:
+    backends.get_backend(uri, storage_client).upload_file(local_file_path, uri)
+    if remove_local_files:
+      try:
+        os.remove(local_file_path)
+      except OSError as e:
+        logger.warning(
+            "Unable to remove uploaded file %s: %s", local_file_path, e
+        )
+
+  return _run_transfers(upload, pairs, max_workers, progress_callback)
+
+
+def upload_many_bytes(
+    contents: list[tuple[bytes, str]],
+    content_type: str | None = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    progress_callback: ProgressCallback | None = None,
+    storage_client: storage.Client = None,
+) -> list[TransferResult]:
+  """Uploads content from memory concurrently.
+
+  Args:
+    contents: The content and destination URI of each file.
+    content_type: (Optional) The content type of the files, e.g. 'image/png'.
+    max_workers: (Optional) The maximum number of files uploaded at once.
+    progress_callback: (Optional) Called with each result, the number of
+      files done and the total, as uploads complete.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    The result for each file, in order, with "<memory>" as the source.
+  """
+  data_by_uri = {uri: data for data, uri in contents}
+
+  def upload(_, uri: str) -> None:
+    backends.get_backend(uri, storage_client).write_bytes(
+        data_by_uri[uri], uri, content_type
+    )
+
+  pairs = [(_MEMORY_SOURCE, uri) for _, uri in contents]
+  return _run_transfers(upload, pairs, max_workers, progress_callback)
+
+
+def move_many(
+    moves: list[tuple[str, str]],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    storage_client: storage.Client = None,
+) -> list[TransferResult]:
+  """Moves files within their storage.
+
+  The files are copied concurrently, server-side for Cloud Storage, then the
+  copied sources are deleted, in batch requests for Cloud Storage.
+
+  Args:
+    moves: The source and destination URI of each file. Both must have the
+      same scheme.
+    max_workers: (Optional) The maximum number of files copied at once.
+    storage_client: The Google Cloud Storage client.
+
+  Returns:
+    The result for each file, in order. If a move failed, the source still
+    exists. If only the deletion of the source failed, the destination
+    exists as well.
+
+  Raises:
+    ValueError: If a file would be moved to another scheme.
+  """
+  check_moves(moves)
+
+  def copy(source_uri: str, destination_uri: str) -> None:
+    backends.get_backend(source_uri, storage_client).copy(
+        source_uri, destination_uri
+    )
+
+  results = _run_transfers(copy, moves, max_workers, None)
+  delete_copied_sources(results, storage_client)
+  return results
+
+
+def check_moves(moves: list[tuple[str, str]]) -> None:
+  """Raises a ValueError if a file would be moved to another scheme."""
+  for source_uri, destination_uri in moves:
+    if backends.get_scheme(source_uri) != backends.get_scheme(destination_uri):
+      raise ValueError(
+          f"Can't move {source_uri} to {destination_uri}, which is in"
+          " another storage."
+      )
+
+
+def delete_copied_sources(
+    results: list[TransferResult], storage_client: storage.Client = None
+) -> None:
+  """Deletes the sources of successful copies, in batches per backend.
+
+  Args:
+    results: The results of copying files. A copy whose source can't be
+      deleted is marked as failed.
+    storage_client: The Google Cloud Storage client.
+  """
+  copied_results = collections.defaultdict(list)
+  for result in results:
+    if result.succeeded:
+      copied_results[backends.get_scheme(result.source)].append(result)
+  for scheme_results in copied_results.values():
+    backend = backends.get_backend(scheme_results[0].source, storage_client)
+    errors = backend.delete_many([result.source for result in scheme_results])
+    for result, error in zip(scheme_results, errors):
+      if error is not None:
+        logger.error(
+            "Failed to delete %s after copying it: %s", result.source, error
+        )
+        result.error = error
+
+
+def download_files(
+    gcs_uris: list[str],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    use_cache: bool = False,
+) -> list[str]:
+  """Downloads files to the local file system.
+
+  Args:
+    gcs_uris: A list of URIs of the files to download.
+    max_workers: (Optional) The maximum number of files downloaded at once.
+    use_cache: (Optional) Whether to copy the files from the local blob cache.
+      Useful for assets used many times, such as intros, outros and audio.
+
+  Returns:
+    A list of local file paths where the files were saved.
+
+  Raises:
+    The error of the first file that could not be downloaded, once the other
+    downloads have finished.
+  """
+  results = download_many(
+      gcs_uris, max_workers=max_workers, use_cache=use_cache
+  )
+  for result in results:
+    if not result.succeeded:
+      raise result.error
+  return [result.destination for result in results]
@@ -14,6 +14,8 @@
 """Exposes core utils for the gen_v package."""
 from gen_v.utils.dates import get_current_week_year_str
 from gen_v.utils.image import hex_to_rgb
+from gen_v.utils.image import prepare_product_image_variants
+from gen_v.utils.image import prepare_product_images
 from gen_v.utils.image import process_and_resize_images
 from gen_v.utils.image import recolor_background_and_upload
 from gen_v.utils.image import rescale_image_height
@@ -21,6 +23,8 @@ from gen_v.utils.image import rescale_image_height
 __all__ = [
     'get_current_week_year_str',
     'hex_to_rgb',
+    'prepare_product_image_variants',
+    'prepare_product_images',
     'process_and_resize_images',
     'recolor_background_and_upload',
     'rescale_image_height',
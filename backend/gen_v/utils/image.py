@@ -14,84 +14,214 @@
 """Utilities for image manipulation.
 
 Helper functions for working with images using the Pillow library."""
+import contextlib
+import functools
+import io
 import logging
+import os
 import sys
+import tempfile
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Literal
+import numpy as np
 from PIL import Image
 from gen_v import models
 from gen_v import storage
+from gen_v.utils import image_cache
+from gen_v.utils import parallel
 
 
 logging.basicConfig(stream=sys.stdout)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+ImageSource = str | os.PathLike | bytes | BinaryIO | Image.Image
+ColorMetric = Literal['RGB', 'CIELAB']
+_COLOR_METRICS = ('RGB', 'CIELAB')
+# Images are cheaply reduced to no less than this multiple of the target size
+# before the final LANCZOS pass, the same default as Image.thumbnail.
+_REDUCING_GAP = 2.0
+# Working memory per pixel of a band being recolored: the RGBA copy, the
+# colour table indices and their temporaries, the mask and the result.
+_BYTES_PER_BAND_PIXEL = 24
+# Working memory per pixel of a band being reduced: the band copy, its
+# premultiplied-alpha conversion and the reduction accumulators.
+_BYTES_PER_REDUCE_PIXEL = 16
+# The premultiplied-alpha modes Pillow reduces and resamples images with alpha
+# in.
+_PREMULTIPLIED_MODES = {'LA': 'La', 'RGBA': 'RGBa'}
+_COLOR_TABLE_SIZE = 256**3
+_SRGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_D65_WHITE_POINT = np.array([0.95047, 1.0, 1.08883])
 
-def rescale_image_height(image_path: str, desired_height: int) -> Image:
+
+@contextlib.contextmanager
+def open_image(image_source: ImageSource) -> Iterator[Image.Image]:
+  """Opens an image from a path, bytes, a binary stream or a PIL Image.
+
+  Opening is lazy, so callers can still request draft decoding before the
+  pixels are loaded. Images opened here are closed on exit; an Image passed in
+  is left open, and unchanged, for its owner.
+
+  Args:
+    image_source: The path of the image file, its encoded bytes, a readable
+      binary stream, or an already-open PIL Image.
+
+  Yields:
+    The PIL Image.
+  """
+  if isinstance(image_source, Image.Image):
+    yield image_source
+    return
+  if isinstance(image_source, bytes):
+    image_source = io.BytesIO(image_source)
+  with Image.open(image_source) as image:
+    yield image
+
+
+def _resize_image(
+    image: Image.Image,
+    size: tuple[int, int],
+    draft: bool = False,
+    memory_budget_bytes: int | None = None,
+) -> Image.Image:
+  """Resizes an image with LANCZOS, decoding no more pixels than needed.
+
+  With draft, JPEG images are decoded at a reduced scale that is still at
+  least _REDUCING_GAP times the target size. Other images are first reduced
+  by integer factors down to that size. The final LANCZOS pass then only
+  resamples from there, not from the full source resolution.
+
+  Args:
+    image: The image to resize.
+    size: The (width, height) of the resized image.
+    draft: Whether the image may be draft-decoded. Drafting changes the
+      image, so only images opened by this module are drafted, and only if
+      they aren't loaded yet.
+    memory_budget_bytes: (Optional) The memory the reduction may use, see
+      reduce_image. The resized image is the same with or without it.
+
+  Returns:
+    The resized PIL Image in RGBA format.
+  """
+  if draft:
+    image.draft(
+        None, (int(size[0] * _REDUCING_GAP), int(size[1] * _REDUCING_GAP))
+    )
+  if image.mode in ('1', 'P'):
+    # Pillow resamples these with NEAREST, without reducing first.
+    return image.resize(size, Image.Resampling.LANCZOS).convert('RGBA')
+  # Reduces by the integer factors Image.resize would with reducing_gap. It
+  # skips the reduction of images with alpha, which are reduced here too, so
+  # every image is reduced the same way whether it is done in bands or not.
+  width, height = image.size
+  factor_x = int(width / size[0] / _REDUCING_GAP) or 1
+  factor_y = int(height / size[1] / _REDUCING_GAP) or 1
+  resized_image = _reduce_premultiplied(
+      image, (factor_x, factor_y), memory_budget_bytes
+  ).resize(
+      size,
+      Image.Resampling.LANCZOS,
+      box=(0, 0, width / factor_x, height / factor_y),
+  )
+  if resized_image.mode != image.mode:
+    resized_image = resized_image.convert(image.mode)
+  return resized_image.convert('RGBA')
+
+
+def rescale_image_height(
+    image_source: ImageSource, desired_height: int
+) -> Image:
   """Rescales an image to a desired height, maintaining the aspect ratio.
 
   Args:
-    image_path: The path to the image file.
+    image_source: The path to the image file, its bytes, a binary stream or a
+      PIL Image.
     desired_height: The desired height of the resized image.
 
   Returns:
     A PIL Image object representing the resized image in RGBA format.
   """
-  image = Image.open(image_path)
-  scale_factor = desired_height / image.height
-  desired_width = int(image.width * scale_factor)
-  image = image.resize(
-      (desired_width, desired_height), Image.Resampling.LANCZOS
-  )
-  return image.convert('RGBA')
+  with open_image(image_source) as image:
+    scale_factor = desired_height / image.height
+    desired_width = int(image.width * scale_factor)
+    return _resize_image(
+        image,
+        (desired_width, desired_height),
+        draft=image is not image_source,
+    )
 
 
-def rescale_image_width(image_path: str, desired_width: int) -> Image:
+def rescale_image_width(image_source: ImageSource, desired_width: int) -> Image:
   """Rescales an image to a desired width, maintaining the aspect ratio.
 
   Args:
-    image_path: The path to the image file.
+    image_source: The path to the image file, its bytes, a binary stream or a
+      PIL Image.
     desired_width: The desired width of the resized image.
 
   Returns:
     A PIL Image object representing the resized image in RGBA format.
   """
-  image = Image.open(image_path)
-  aspect_ratio = desired_width / image.width
-  desired_height = int(image.height * aspect_ratio)
-  image = image.resize(
-      (desired_width, desired_height), Image.Resampling.LANCZOS
-  )
-  return image.convert('RGBA')
+  with open_image(image_source) as image:
+    aspect_ratio = desired_width / image.width
+    desired_height = int(image.height * aspect_ratio)
+    return _resize_image(
+        image,
+        (desired_width, desired_height),
+        draft=image is not image_source,
+    )
 
 
 def rescale_image_to_fit(
-    image_path: str, desired_width: int, desired_height: int
-):
+    image_source: ImageSource,
+    desired_width: int,
+    desired_height: int,
+    memory_budget_bytes: int | None = None,
+) -> Image:
   """Rescales an image to fit within desired dimensions, keeps aspect ratio.
 
   Chooses between rescaling by height or width to ensure the image fits
-  within the given dimensions without distortion.
+  within the given dimensions without distortion. The image is decoded once.
 
   Args:
-    image_path: Path to the image file.
+    image_source: The path to the image file, its bytes, a binary stream or a
+      PIL Image.
     desired_width: The desired width of the resized image.
     desired_height: The desired height of the resized image.
+    memory_budget_bytes: (Optional) The memory reducing the image may use,
+      see reduce_image. The resized image is the same with or without it.
 
   Returns:
-    A PIL Image object representing the resized image.
+    A PIL Image object representing the resized image in RGBA format.
   """
-  image = Image.open(image_path)
-  original_width, original_height = image.size
+  with open_image(image_source) as image:
+    original_width, original_height = image.size
 
-  image_aspect_ratio = original_width / original_height
-  desired_aspect_ratio = desired_width / desired_height
+    image_aspect_ratio = original_width / original_height
+    desired_aspect_ratio = desired_width / desired_height
 
-  if image_aspect_ratio > desired_aspect_ratio:
-    # Image is wider than desired, rescale by width
-    return rescale_image_width(image_path, desired_width)
-  else:
-    # Image is taller than desired, rescale by height
-    return rescale_image_height(image_path, desired_height)
+    if image_aspect_ratio > desired_aspect_ratio:
+      # Image is wider than desired, rescale by width
+      size = (
+          desired_width,
+          int(original_height * (desired_width / original_width)),
+      )
+    else:
+      # Image is taller than desired, rescale by height
+      size = (
+          int(original_width * (desired_height / original_height)),
+          desired_height,
+      )
+    return _resize_image(
+        image,
+        size,
+        draft=image is not image_source,
+        memory_budget_bytes=memory_budget_bytes,
+    )
 
 
 def hex_to_rgb(hex_color_string: str) -> tuple[int, int, int] | None:
@@ -124,6 +254,47 @@ def hex_to_rgb(hex_color_string: str) -> tuple[int, int, int] | None:
     return red, green, blue
 
 
+def place_image_on_background(
+    foreground_image: ImageSource,
+    background_width: int,
+    background_height: int,
+    background_color: models.RGBColor,
+    memory_budget_bytes: int | None = None,
+) -> Image.Image:
+  """Place an in-memory image, rescaled to fit, onto a solid background.
+
+  Args:
+    foreground_image: The path to the foreground image file, its bytes, a
+      binary stream or a PIL Image. Images opened from a path, bytes or a
+      stream only decode as many pixels as needed for the rescaled size.
+    background_width: The desired width of the background image.
+    background_height: The desired height of the background image.
+    background_color: The RGB color of the background image.
+    memory_budget_bytes: (Optional) The memory reducing the foreground image
+      may use, see reduce_image. The result is the same with or without it.
+
+  Returns:
+    A new PIL Image in RGB format with the foreground centred on it.
+  """
+  rescaled_image = rescale_image_to_fit(
+      foreground_image,
+      background_width,
+      background_height,
+      memory_budget_bytes=memory_budget_bytes,
+  )
+
+  background_image = Image.new(
+      'RGB', (background_width, background_height), background_color.to_tuple()
+  )
+
+  # Calculate offset to centre the image.
+  x_offset = (background_width - rescaled_image.width) // 2
+  y_offset = (background_height - rescaled_image.height) // 2
+
+  background_image.paste(rescaled_image, (x_offset, y_offset), rescaled_image)
+  return background_image
+
+
 def place_rescaled_image_on_background(
     foreground_image_path: str,
     background_width: int,
@@ -146,22 +317,357 @@ def place_rescaled_image_on_background(
   Returns:
     A PIL Image object representing the resulting image.
   """
-  rescaled_image = rescale_image_to_fit(
-      foreground_image_path, background_width, background_height
+  background_image = place_image_on_background(
+      foreground_image_path,
+      background_width,
+      background_height,
+      background_color,
   )
 
-  background_image = Image.new(
-      'RGB', (background_width, background_height), background_color.to_tuple()
+  background_image.save(output_path)
+  return background_image
+
+
+def encode_image(image: Image.Image, file_name: str) -> tuple[bytes, str]:
+  """Encodes an image in memory in the format given by a file name.
+
+  Args:
+    image: The image to encode.
+    file_name: The name of the file the image is for, whose extension picks
+      the format. Unknown extensions are encoded as PNG.
+
+  Returns:
+    The encoded image and its content type.
+  """
+  extension = os.path.splitext(file_name)[1].lower()
+  image_format = Image.registered_extensions().get(extension, 'PNG')
+  buffer = io.BytesIO()
+  image.save(buffer, format=image_format)
+  return buffer.getvalue(), Image.MIME.get(image_format, 'image/png')
+
+
+def _raise_first_upload_error(results: list[storage.TransferResult]) -> None:
+  """Raises the error of the first failed upload, if any."""
+  for result in results:
+    if not result.succeeded:
+      raise result.error
+
+
+def _srgb_to_linear(srgb: np.ndarray) -> np.ndarray:
+  """Converts sRGB values (0-255) to linear RGB values (0-1)."""
+  srgb = srgb / 255.0
+  return np.where(
+      srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4
   )
 
-  # Calculate offset to centre the image.
-  x_offset = (background_width - rescaled_image.width) // 2
-  y_offset = (background_height - rescaled_image.height) // 2
 
-  background_image.paste(rescaled_image, (x_offset, y_offset), rescaled_image)
+def _xyz_to_lab(xyz: np.ndarray) -> np.ndarray:
+  """Converts white-point normalised CIE XYZ values to CIELAB.
+
+  Args:
+    xyz: An array of shape (..., 3) with X/Xn, Y/Yn and Z/Zn values.
+
+  Returns:
+    An array of the same shape with the L*, a* and b* values.
+  """
+  epsilon = (6 / 29) ** 3
+  f = np.where(xyz > epsilon, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+  return np.stack(
+      [
+          116 * f[..., 1] - 16,
+          500 * (f[..., 0] - f[..., 1]),
+          200 * (f[..., 1] - f[..., 2]),
+      ],
+      axis=-1,
+  )
+
+
+def _srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+  """Converts sRGB values (0-255) of shape (..., 3) to CIELAB under D65."""
+  return _xyz_to_lab(_srgb_to_linear(rgb) @ _SRGB_TO_XYZ.T / _D65_WHITE_POINT)
+
+
+def build_color_match_table(
+    target_color: models.RGBColor,
+    threshold: float,
+    color_metric: ColorMetric = 'RGB',
+) -> np.ndarray:
+  """Builds a bit-packed table of the colours close to the target colour.
+
+  Bit `r << 16 | g << 8 | b` of the table (little-endian bit order) is set when
+  the colour (r, g, b) is closer than `threshold` to the target colour, so the
+  table covers all 256^3 colours in 2 MiB.
+
+  Args:
+    target_color: The colour to compare against.
+    threshold: The colour distance below which a colour is a match.
+    color_metric: 'RGB' for the Euclidean distance in RGB space, or 'CIELAB'
+      for the CIE76 colour difference (Delta E) in CIELAB space.
+
+  Returns:
+    A uint8 array of 256^3 / 8 bytes.
+
+  Raises:
+    ValueError: If the colour metric is not supported.
+  """
+  if color_metric not in _COLOR_METRICS:
+    raise ValueError(f'Color metric {color_metric} not supported.')
+  if threshold <= 0:
+    return np.zeros(_COLOR_TABLE_SIZE // 8, dtype=np.uint8)
+  if color_metric == 'RGB':
+    channel = np.arange(256, dtype=np.int32)
+    r_sq, g_sq, b_sq = (
+        (channel - value) ** 2 for value in target_color.to_tuple()
+    )
+    distance_sq = (
+        r_sq[:, None, None] + g_sq[None, :, None] + b_sq[None, None, :]
+    )
+    return np.packbits(distance_sq < threshold * threshold, bitorder='little')
+
+  target_lab = _srgb_to_lab(np.array(target_color.to_tuple(), dtype=float))
+  # XYZ is linear in the linearised channels, so each channel's contribution
+  # is tabulated once and the cube is built from broadcast sums.
+  linear = _srgb_to_linear(np.arange(256, dtype=float))
+  red_xyz, green_xyz, blue_xyz = (
+      linear[:, None] * _SRGB_TO_XYZ[:, channel] / _D65_WHITE_POINT
+      for channel in range(3)
+  )
+  matches = np.empty((256, 256, 256), dtype=bool)
+  # Convert a few red planes at a time to keep the float buffers small.
+  planes_per_chunk = 16
+  for red_start in range(0, 256, planes_per_chunk):
+    red_end = red_start + planes_per_chunk
+    xyz = (
+        red_xyz[red_start:red_end, None, None]
+        + green_xyz[None, :, None]
+        + blue_xyz[None, None, :]
+    )
+    diff = _xyz_to_lab(xyz) - target_lab
+    matches[red_start:red_end] = (
+        np.einsum('...i,...i->...', diff, diff) < threshold * threshold
+    )
+  return np.packbits(matches, bitorder='little')
+
+
+@functools.lru_cache(maxsize=16)
+def _get_color_match_table(
+    target_rgb: tuple[int, int, int],
+    threshold: float,
+    color_metric: ColorMetric,
+    cache_dir: str | None,
+) -> np.ndarray:
+  """Cached implementation of get_color_match_table keyed on hashable args."""
+  target_color = models.RGBColor.from_tuple(target_rgb)
+  if cache_dir is None:
+    return build_color_match_table(target_color, threshold, color_metric)
+
+  table_path = os.path.join(
+      cache_dir,
+      f'color-match-{color_metric.lower()}-{target_color}-{threshold}.npy',
+  )
+  if not os.path.exists(table_path):
+    table = build_color_match_table(target_color, threshold, color_metric)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so that concurrent readers never see a
+    # partially written table.
+    with tempfile.NamedTemporaryFile(
+        dir=cache_dir, suffix='.npy', delete=False
+    ) as tmp_file:
+      np.save(tmp_file, table)
+    os.replace(tmp_file.name, table_path)
+    logger.info('Saved color match table to %s', table_path)
+  return np.load(table_path, mmap_mode='r')
 
-  background_image.save(output_path)
-  return background_image
+
+def get_color_match_table(
+    target_color: models.RGBColor,
+    threshold: float,
+    color_metric: ColorMetric = 'RGB',
+    cache_dir: str | None = None,
+) -> np.ndarray:
+  """Returns the color match table, building it only once per process.
+
+  Args:
+    target_color: The colour to compare against.
+    threshold: The colour distance below which a colour is a match.
+    color_metric: 'RGB' or 'CIELAB', see build_color_match_table.
+    cache_dir: (Optional) A directory to store the table in. When set, the
+      table is saved there once and memory-mapped, so that other processes
+      sharing the directory reuse it instead of building their own.
+
+  Returns:
+    The bit-packed table, see build_color_match_table.
+  """
+  return _get_color_match_table(
+      target_color.to_tuple(), threshold, color_metric, cache_dir
+  )
+
+
+def get_color_match_mask(
+    pixels: np.ndarray,
+    target_color: models.RGBColor,
+    threshold: float,
+    color_metric: ColorMetric = 'RGB',
+    cache_dir: str | None = None,
+) -> np.ndarray:
+  """Finds the pixels whose colour is close to the target colour.
+
+  Each pixel is looked up in the cached color match table, so the cost per
+  pixel does not depend on the colour metric. With the 'RGB' metric the result
+  matches `models.RGBColor.distance_to(...) < threshold`.
+
+  Args:
+    pixels: An array of shape (height, width, channels) with at least the RGB
+      channels. Any extra channels (e.g. alpha) are ignored.
+    target_color: The colour to compare against.
+    threshold: The colour distance below which a pixel is a match.
+    color_metric: 'RGB' or 'CIELAB', see build_color_match_table.
+    cache_dir: (Optional) A directory to share the table between processes.
+
+  Returns:
+    A boolean array of shape (height, width), True where the pixel matches.
+  """
+  table = get_color_match_table(
+      target_color, threshold, color_metric, cache_dir
+  )
+  rgb = pixels[..., :3]
+  index = (
+      (rgb[..., 0].astype(np.uint32) << 16)
+      | (rgb[..., 1].astype(np.uint32) << 8)
+      | rgb[..., 2]
+  )
+  return ((table[index >> 3] >> (index & 7).astype(np.uint8)) & 1).astype(bool)
+
+
+def get_band_height(
+    width: int,
+    height: int,
+    memory_budget_bytes: int | None,
+    bytes_per_pixel: int = _BYTES_PER_BAND_PIXEL,
+) -> int:
+  """Returns the number of image rows to process at once within a budget.
+
+  Args:
+    width: The width of the image in pixels.
+    height: The height of the image in pixels.
+    memory_budget_bytes: The memory the per-band working buffers may use, or
+      None to process the whole image at once.
+    bytes_per_pixel: (Optional) The working memory per pixel of a band.
+      Defaults to that of recoloring.
+
+  Returns:
+    The band height, between 1 and the image height.
+  """
+  if memory_budget_bytes is None:
+    return height
+  band_height = memory_budget_bytes // (bytes_per_pixel * width)
+  return max(1, min(height, band_height))
+
+
+def reduce_image(
+    image: Image.Image,
+    factor: int | tuple[int, int],
+    memory_budget_bytes: int | None = None,
+) -> Image.Image:
+  """Reduces an image by integer factors, a band of rows at a time.
+
+  Image.reduce first converts images with an alpha channel to premultiplied
+  alpha, a copy as large as the image. Reducing bands keeps that copy and the
+  reduction buffers within the memory budget. The band heights are multiples
+  of the vertical factor, so the output does not depend on them.
+
+  Args:
+    image: The image to reduce. It is not modified.
+    factor: The factor to divide the width and height by, or a (width,
+      height) pair of factors.
+    memory_budget_bytes: (Optional) The memory the working buffers may use,
+      on top of the input and output images. If not set, the whole image is
+      reduced at once.
+
+  Returns:
+    The reduced PIL Image, in the mode of the input image.
+  """
+  if isinstance(factor, int):
+    factor = (factor, factor)
+  if factor[0] <= 1 and factor[1] <= 1:
+    return image
+  return _reduce_premultiplied(image, factor, memory_budget_bytes).convert(
+      image.mode
+  )
+
+
+def _reduce_premultiplied(
+    image: Image.Image,
+    factor: tuple[int, int],
+    memory_budget_bytes: int | None,
+) -> Image.Image:
+  """Reduces an image in bands, see reduce_image.
+
+  LA and RGBA images are returned with premultiplied alpha, in La and RGBa
+  mode, as Image.resize keeps them between its reduction and resampling.
+  """
+  mode = _PREMULTIPLIED_MODES.get(image.mode, image.mode)
+  if factor == (1, 1):
+    return image.convert(mode)
+  factor_x, factor_y = factor
+  width, height = image.size
+  band_height = get_band_height(
+      width, height, memory_budget_bytes, _BYTES_PER_REDUCE_PIXEL
+  )
+  band_height = max(factor_y, band_height - band_height % factor_y)
+  reduced_image = Image.new(
+      mode, (-(-width // factor_x), -(-height // factor_y))
+  )
+  for top in range(0, height, band_height):
+    band = image.crop((0, top, width, min(top + band_height, height)))
+    reduced_image.paste(band.convert(mode).reduce(factor), (0, top // factor_y))
+  return reduced_image
+
+
+def recolor_image_background(
+    image: Image.Image,
+    target_color: models.RGBColor,
+    replacement_color: models.RGBColor,
+    threshold: int = 25,
+    color_metric: ColorMetric = 'RGB',
+    color_table_cache_dir: str | None = None,
+    memory_budget_bytes: int | None = None,
+) -> Image.Image:
+  """Replaces the target color in an in-memory image with the replacement color.
+
+  The image is processed in horizontal bands, so the working buffers stay
+  within the memory budget however large the image is. The output does not
+  depend on the band height.
+
+  Args:
+    image: The image to recolor. It is not modified.
+    target_color: The color to be replaced.
+    replacement_color: The new color to use.
+    threshold: The color distance threshold for edge detection.
+    color_metric: How the color distance is measured, 'RGB' or 'CIELAB'.
+    color_table_cache_dir: (Optional) A directory to share the color match
+      table between processes.
+    memory_budget_bytes: (Optional) The memory the working buffers may use,
+      on top of the input and output images. If not set, the whole image is
+      processed at once.
+
+  Returns:
+    A new PIL Image in RGBA format with the matching pixels replaced.
+  """
+  recolored_image = image.convert('RGBA')
+  width, height = recolored_image.size
+  band_height = get_band_height(width, height, memory_budget_bytes)
+  replacement_rgba = (*replacement_color.to_tuple(), 255)
+  for top in range(0, height, band_height):
+    band_box = (0, top, width, min(top + band_height, height))
+    pixels = np.array(recolored_image.crop(band_box))
+    mask = get_color_match_mask(
+        pixels, target_color, threshold, color_metric, color_table_cache_dir
+    )
+    if mask.any():
+      pixels[mask] = replacement_rgba
+      recolored_image.paste(Image.fromarray(pixels, 'RGBA'), band_box[:2])
+  return recolored_image
 
 
 def replace_background_color(
@@ -170,6 +676,7 @@ def replace_background_color(
     replacement_color: models.RGBColor,
     recolored_image_local_path: str,
     threshold: int = 25,
+    memory_budget_bytes: int | None = None,
 ):
   """Replaces the target color in an image with the replacement color.
 
@@ -179,32 +686,93 @@ def replace_background_color(
     replacement_color: The new color to use.
     recolored_image_local_path: Path to save the recolored image.
     threshold: The color distance threshold for edge detection.
+    memory_budget_bytes: (Optional) The memory the working buffers may use,
+      see recolor_image_background.
 
   Raises:
     ValueError: If a problem occurs when saving the output.
   """
   with Image.open(image_path) as image:
-    image = image.convert('RGBA')
-    image_data = image.load()
-    width, height = image.size
-    replacement_rgba = (
-        replacement_color.r,
-        replacement_color.g,
-        replacement_color.b,
-        255,
+    recolored_image = recolor_image_background(
+        image,
+        target_color,
+        replacement_color,
+        threshold,
+        memory_budget_bytes=memory_budget_bytes,
     )
-    for x in range(width):
-      for y in range(height):
-        current_pixel_rgba = image_data[x, y]
-        current_color = models.RGBColor.from_tuple(current_pixel_rgba[:3])
-        if current_color.distance_to(target_color) < threshold:
-          image_data[x, y] = replacement_rgba
-    try:
-      image.save(recolored_image_local_path)
-    except (ValueError, OSError) as save_err:
-      raise ValueError(
-          f'Failed to save image to {recolored_image_local_path}: {save_err}'
-      ) from save_err
+  try:
+    recolored_image.save(recolored_image_local_path)
+  except (ValueError, OSError) as save_err:
+    raise ValueError(
+        f'Failed to save image to {recolored_image_local_path}: {save_err}'
+    ) from save_err
+
+
+def _map_images(
+    func: Callable[..., Any],
+    image_uris: Iterable[str],
+    max_workers: int = 1,
+) -> list[Any]:
+  """Applies func to each image URI, in order.
+
+  Processed sequentially, the next images are read into memory while one is
+  processed and func receives the content as image_bytes, without going
+  through the disk. With several workers, each worker downloads its own
+  images, which already overlaps the transfers with the processing.
+
+  Args:
+    func: The function to apply to each URI. It must be picklable.
+    image_uris: The URIs of the images, consumed lazily.
+    max_workers: The number of worker processes.
+
+  Returns:
+    The results of func for each image.
+
+  Raises:
+    The error of the first image that could not be downloaded.
+  """
+  if max_workers > 1:
+    return parallel.process_map(func, image_uris, max_workers=max_workers)
+  results = []
+  with storage.prefetch_bytes(image_uris) as prefetched:
+    for download in prefetched:
+      with download:
+        if not download.succeeded:
+          raise download.error
+        results.append(func(download.source, image_bytes=download.data))
+  return results
+
+
+def _resize_and_upload_image(
+    img_uri: str,
+    width: int,
+    height: int,
+    color: models.RGBColor,
+    output_uri: str,
+    image_bytes: bytes | None = None,
+) -> dict:
+  """Resizes and uploads one image for process_and_resize_images.
+
+  The image is decoded from image_bytes if it was already downloaded,
+  otherwise it is downloaded from img_uri.
+  """
+  image_file_name = storage.get_file_name_from_gcs_url(img_uri)
+  img_file_name_no_extension = image_file_name.split('.')[0]
+  resized_image_file_name = (
+      f'{img_file_name_no_extension}-resized-{width}_{height}.png'
+  )
+  resized_image = place_image_on_background(
+      image_bytes or storage.download_bytes(img_uri), width, height, color
+  )
+  image_bytes, content_type = encode_image(
+      resized_image, resized_image_file_name
+  )
+  resized_image_uri = f'{output_uri}/{resized_image_file_name}'
+  storage.upload_bytes(image_bytes, resized_image_uri, content_type)
+  return {
+      'title': image_file_name,
+      'resized_image_uri': resized_image_uri,
+  }
 
 
 def process_and_resize_images(
@@ -213,6 +781,7 @@ def process_and_resize_images(
     height: int,
     color: models.RGBColor,
     output_uri: str,
+    max_workers: int = 1,
 ) -> list[dict]:
   """Pull images from GCS resize them and upload to a different GCS folder.
 
@@ -223,35 +792,54 @@ def process_and_resize_images(
     height: The desired height of the resized images.
     color: The background color to use when resizing images.
     output_uri: The GCS URI of the folder where resized images will be uploaded.
+    max_workers: The number of processes to spread the images over. With 1
+      (the default) the images are processed sequentially.
 
 
   Returns:
     A list of dictionaries, with processed images (title and resized image URI).
   """
-  images_uris = storage.retrieve_all_files_from_gcs_folder(images_uri)
-  logger.info('Found %d images', len(images_uris))
-  selected_products = []
-  for img_uri in images_uris:
-    image_file_name = storage.get_file_name_from_gcs_url(img_uri)
-    input_image_local_file_path = storage.download_file_locally(img_uri)
-    img_file_name_no_extension = image_file_name.split('.')[0]
-    resized_image_local_path = (
-        f'{img_file_name_no_extension}-resized-{width}_{height}.png'
-    )
-    place_rescaled_image_on_background(
-        input_image_local_file_path,
-        width,
-        height,
-        color,
-        resized_image_local_path,
+  # Images are processed as they are listed, instead of after the listing.
+  products = _map_images(
+      functools.partial(
+          _resize_and_upload_image,
+          width=width,
+          height=height,
+          color=color,
+          output_uri=output_uri,
+      ),
+      storage.iter_files_in_gcs_folder(images_uri),
+      max_workers=max_workers,
+  )
+  logger.info('Processed %d images', len(products))
+  return products
+
+
+def _recolor_and_upload_image(
+    resized_image_uri: str,
+    output_uri: str,
+    target_color: models.RGBColor,
+    background_color: models.RGBColor,
+) -> str:
+  """Downloads, recolors and uploads one image, returning the new URI."""
+  file_name = storage.get_file_name_from_gcs_url(resized_image_uri)
+  file_name_without_extension, file_extension = file_name.split('.', 1)
+  recolored_image_file_name = (
+      f'{file_name_without_extension}-recolored-'
+      f'{background_color}.{file_extension}'
+  )
+  with open_image(storage.download_bytes(resized_image_uri)) as resized_image:
+    recolored_image = recolor_image_background(
+        resized_image, target_color, background_color
     )
-    resized_image_uri = f'{output_uri}/{resized_image_local_path}'
-    storage.upload_file_to_gcs(resized_image_local_path, resized_image_uri)
-    selected_products.append({
-        'title': image_file_name,
-        'resized_image_uri': resized_image_uri,
-    })
-  return selected_products
+  image_bytes, content_type = encode_image(
+      recolored_image, recolored_image_file_name
+  )
+  recolored_image_uri = (
+      f'{storage.to_uri(output_uri)}/{recolored_image_file_name}'
+  )
+  storage.upload_bytes(image_bytes, recolored_image_uri, content_type)
+  return recolored_image_uri
 
 
 def recolor_background_and_upload(
@@ -259,6 +847,7 @@ def recolor_background_and_upload(
     output_uri: str,
     target_color: models.RGBColor,
     background_color: models.RGBColor,
+    max_workers: int = 1,
 ) -> None:
   """Recolors the background of images, uploads them to GCS.
 
@@ -268,23 +857,359 @@ def recolor_background_and_upload(
       output_uri: The gcs path to store recolored images.
       target_color: The color to be replaced
       background_color: The background color to be used for the new image.
+      max_workers: The number of processes to spread the images over. With 1
+        (the default) the images are processed sequentially.
   """
-  for product in selected_products:
-    resized_image_uri = product['resized_image_uri']
-
-    local_resized_image_path = storage.download_file_locally(resized_image_uri)
-    file_name = storage.get_file_name_from_gcs_url(resized_image_uri)
-    file_name_without_extension, file_extension = file_name.split('.', 1)
-    recolored_image_local_path = (
-        f'{file_name_without_extension}-recolored-'
-        f'{background_color}.{file_extension}'
+  recolored_image_uris = parallel.process_map(
+      functools.partial(
+          _recolor_and_upload_image,
+          output_uri=output_uri,
+          target_color=target_color,
+          background_color=background_color,
+      ),
+      [product['resized_image_uri'] for product in selected_products],
+      max_workers=max_workers,
+  )
+  for product, recolored_image_uri in zip(
+      selected_products, recolored_image_uris
+  ):
+    product['recolored_image_uri'] = recolored_image_uri
+
+
+def _prepare_product_image_variants(
+    image_uri: str,
+    sizes: list[tuple[int, int]],
+    original_background_color: models.RGBColor,
+    background_color: models.RGBColor,
+    output_uri: str,
+    threshold: int = 25,
+    color_metric: ColorMetric = 'RGB',
+    color_table_cache_dir: str | None = None,
+    memory_budget_bytes: int | None = None,
+    image_bytes: bytes | None = None,
+) -> list[dict]:
+  """Resizes, places and recolors one product image from a single decode.
+
+  Args:
+    image_uri: The GCS URI of the source image.
+    sizes: The (width, height) of each prepared variant of the image.
+    original_background_color: The colour the image is placed on, which is
+      then replaced.
+    background_color: The replacement background colour.
+    output_uri: The folder for the outputs, as a GCS path without the gs://
+      prefix or as a URI.
+    threshold: The color distance threshold for edge detection.
+    color_metric: How the color distance is measured, 'RGB' or 'CIELAB'.
+    color_table_cache_dir: (Optional) A directory to share the color match
+      table between processes.
+    memory_budget_bytes: (Optional) The memory the reducing and recoloring
+      working buffers may use, see reduce_image and recolor_image_background.
+      The decoded source image itself is not bounded by it, except for JPEGs,
+      which are decoded at a reduced scale.
+    image_bytes: (Optional) The content of the source image, if it was
+      already downloaded.
+
+  Returns:
+    For each size, a dictionary with the title, resized image URI and
+    recolored image URI.
+  """
+  image_file_name = storage.get_file_name_from_gcs_url(image_uri)
+  img_file_name_no_extension = image_file_name.split('.')[0]
+
+  with open_image(
+      image_bytes or storage.download_bytes(image_uri)
+  ) as source_image:
+    # Decode once, at a scale large enough for every variant.
+    decode_size = (
+        int(max(width for width, _ in sizes) * _REDUCING_GAP),
+        int(max(height for _, height in sizes) * _REDUCING_GAP),
     )
-    replace_background_color(
-        local_resized_image_path,
-        target_color,
+    source_image.draft(None, decode_size)
+    source_image.load()
+    # Only JPEGs are decoded at a reduced scale. Other images are reduced in
+    # bands for each variant, instead of through full-size copies.
+    resized_images = [
+        place_image_on_background(
+            source_image,
+            width,
+            height,
+            original_background_color,
+            memory_budget_bytes=memory_budget_bytes,
+        )
+        for width, height in sizes
+    ]
+
+  products = []
+  uploads = []
+  for (width, height), resized_image in zip(sizes, resized_images):
+    recolored_image = recolor_image_background(
+        resized_image,
+        original_background_color,
         background_color,
-        recolored_image_local_path,
+        threshold=threshold,
+        color_metric=color_metric,
+        color_table_cache_dir=color_table_cache_dir,
+        memory_budget_bytes=memory_budget_bytes,
     )
-    recolored_image_uri = f'gs://{output_uri}/{recolored_image_local_path}'
-    storage.upload_file_to_gcs(recolored_image_local_path, recolored_image_uri)
-    product['recolored_image_uri'] = recolored_image_uri
+    resized_image_file_name = (
+        f'{img_file_name_no_extension}-resized-{width}_{height}.png'
+    )
+    recolored_image_file_name = (
+        f'{img_file_name_no_extension}-resized-{width}_{height}-recolored-'
+        f'{background_color}.png'
+    )
+    resized_image_uri = f'{output_uri}/{resized_image_file_name}'
+    recolored_image_uri = (
+        f'{storage.to_uri(output_uri)}/{recolored_image_file_name}'
+    )
+    # The variants are small, so they are uploaded straight from memory.
+    uploads.append((
+        encode_image(resized_image, resized_image_file_name)[0],
+        resized_image_uri,
+    ))
+    uploads.append((
+        encode_image(recolored_image, recolored_image_file_name)[0],
+        recolored_image_uri,
+    ))
+    products.append({
+        'title': image_file_name,
+        'resized_image_uri': resized_image_uri,
+        'recolored_image_uri': recolored_image_uri,
+    })
+  _raise_first_upload_error(
+      storage.upload_many_bytes(uploads, content_type='image/png')
+  )
+  return products
+
+
+def _drop_missing_outputs(
+    variants: list[list[dict | None]], output_uri: str
+) -> list[list[dict | None]]:
+  """Drops the cached variants of images whose outputs no longer exist.
+
+  Every output is in the output folder, so they are all checked with one
+  listing of the folder, instead of a request per output.
+
+  Args:
+    variants: The cached variants of each image, None where not cached.
+    output_uri: The folder the outputs were prepared into.
+
+  Returns:
+    The variants, with those of images whose outputs were deleted replaced
+    by None, so the images are prepared again.
+  """
+  if not any(all(image_variants) for image_variants in variants):
+    return variants
+  existing_uris = set(
+      storage.iter_files_in_gcs_folder(
+          f'{storage.to_uri(output_uri)}/', recursive=False
+      )
+  )
+
+  def outputs_exist(product: dict) -> bool:
+    return all(
+        storage.to_uri(product[key]) in existing_uris
+        for key in ('resized_image_uri', 'recolored_image_uri')
+    )
+
+  checked_variants = []
+  missing_count = 0
+  for image_variants in variants:
+    if all(image_variants) and not all(map(outputs_exist, image_variants)):
+      image_variants = [None] * len(image_variants)
+      missing_count += 1
+    checked_variants.append(image_variants)
+  if missing_count:
+    logger.info('Outputs of %d cached images are missing', missing_count)
+  return checked_variants
+
+
+def prepare_product_image_variants(
+    images_uri: str,
+    sizes: list[tuple[int, int]],
+    original_background_color: models.RGBColor,
+    background_color: models.RGBColor,
+    output_uri: str,
+    max_workers: int = 1,
+    threshold: int = 25,
+    color_metric: ColorMetric = 'RGB',
+    color_table_cache_dir: str | None = None,
+    cache: image_cache.PreparedImageCache | None = None,
+    memory_budget_bytes: int | None = None,
+) -> dict[tuple[int, int], list[dict]]:
+  """Prepares several sizes of every product image from one decode each.
+
+  Useful to produce e.g. landscape (1280x720), portrait (720x1280) and square
+  (1080x1080) images in one pass, so the cost per source image stays flat as
+  aspect ratios are added.
+
+  Args:
+    images_uri: The GCS URI of the folder containing the input images.
+    sizes: The (width, height) of each variant to prepare.
+    original_background_color: The background color used when resizing, which
+      is then replaced.
+    background_color: The background color to be used for the new image.
+    output_uri: The folder to store the resized and recolored images in, as
+      a GCS path without the gs:// prefix or as a URI.
+    max_workers: The number of processes to spread the images over. At most
+      twice that many images are in flight at once. With 1 (the default) the
+      images are processed sequentially.
+    threshold: The color distance threshold for edge detection.
+    color_metric: How the color distance is measured, 'RGB' or 'CIELAB'.
+    color_table_cache_dir: (Optional) A directory to share the color match
+      table between the worker processes.
+    cache: (Optional) A cache of previously prepared images. Images whose
+      content, preparation parameters and output folder match an entry for
+      every size reuse those outputs, as long as they still exist, instead of
+      being prepared again.
+    memory_budget_bytes: (Optional) The memory each worker's reducing and
+      recoloring buffers may use. Large images are then reduced and recolored
+      in bands. The decoded source images are not bounded by it, except for
+      JPEGs, which are decoded at a reduced scale.
+
+  Returns:
+    A dictionary mapping each size to a list of dictionaries with the
+    processed images (title, resized image URI and recolored image URI), in
+    the order of the source images.
+  """
+  prepare_image = functools.partial(
+      _prepare_product_image_variants,
+      sizes=sizes,
+      original_background_color=original_background_color,
+      background_color=background_color,
+      output_uri=output_uri,
+      threshold=threshold,
+      color_metric=color_metric,
+      color_table_cache_dir=color_table_cache_dir,
+      memory_budget_bytes=memory_budget_bytes,
+  )
+  if cache is None:
+    # Images are prepared as they are listed, instead of after the listing.
+    variants = _map_images(
+        prepare_image,
+        storage.iter_files_in_gcs_folder(images_uri),
+        max_workers=max_workers,
+    )
+    logger.info('Prepared %d images', len(variants))
+    return {
+        size: [image_variants[i] for image_variants in variants]
+        for i, size in enumerate(sizes)
+    }
+
+  # The listing returns the fingerprints, instead of a request per image.
+  images = list(storage.iter_file_fingerprints_in_gcs_folder(images_uri))
+  images_uris = [img_uri for img_uri, _ in images]
+  logger.info('Found %d images', len(images_uris))
+  cache_keys = [
+      [
+          image_cache.make_cache_key(
+              source_fingerprint,
+              width=width,
+              height=height,
+              original_background_color=original_background_color,
+              background_color=background_color,
+              threshold=threshold,
+              color_metric=color_metric,
+              output_uri=output_uri,
+          )
+          for width, height in sizes
+      ]
+      for _, source_fingerprint in images
+  ]
+  variants = _drop_missing_outputs(
+      [[cache.get(key) for key in keys] for keys in cache_keys], output_uri
+  )
+  missing_indices = [
+      i for i, image_variants in enumerate(variants) if not all(image_variants)
+  ]
+  logger.info(
+      'Reusing %d prepared images, preparing %d',
+      len(images_uris) - len(missing_indices),
+      len(missing_indices),
+  )
+  prepared_variants = _map_images(
+      prepare_image,
+      [images_uris[i] for i in missing_indices],
+      max_workers=max_workers,
+  )
+  for i, image_variants in zip(missing_indices, prepared_variants):
+    for key, product in zip(cache_keys[i], image_variants):
+      cache.put(key, product)
+    variants[i] = image_variants
+  cache.save()
+  # Identical content may be cached under another file name.
+  return {
+      size: [
+          {
+              **image_variants[i],
+              'title': storage.get_file_name_from_gcs_url(img_uri),
+          }
+          for img_uri, image_variants in zip(images_uris, variants)
+      ]
+      for i, size in enumerate(sizes)
+  }
+
+
+def prepare_product_images(
+    images_uri: str,
+    width: int,
+    height: int,
+    original_background_color: models.RGBColor,
+    background_color: models.RGBColor,
+    output_uri: str,
+    max_workers: int = 1,
+    threshold: int = 25,
+    color_metric: ColorMetric = 'RGB',
+    color_table_cache_dir: str | None = None,
+    cache: image_cache.PreparedImageCache | None = None,
+    memory_budget_bytes: int | None = None,
+) -> list[dict]:
+  """Resizes and recolors product images in a single pass per image.
+
+  Equivalent to process_and_resize_images followed by
+  recolor_background_and_upload, but every source image is downloaded and
+  decoded once, and the recolored image is produced from the in-memory resized
+  image instead of being downloaded again from GCS.
+
+  Args:
+    images_uri: The GCS URI of the folder containing the input images.
+    width: The desired width of the resized images.
+    height: The desired height of the resized images.
+    original_background_color: The background color used when resizing, which
+      is then replaced.
+    background_color: The background color to be used for the new image.
+    output_uri: The folder to store the resized and recolored images in, as
+      a GCS path without the gs:// prefix or as a URI.
+    max_workers: The number of processes to spread the images over. At most
+      twice that many images are in flight at once. With 1 (the default) the
+      images are processed sequentially.
+    threshold: The color distance threshold for edge detection.
+    color_metric: How the color distance is measured, 'RGB' or 'CIELAB'.
+    color_table_cache_dir: (Optional) A directory to share the color match
+      table between the worker processes.
+    cache: (Optional) A cache of previously prepared images. Images whose
+      content, preparation parameters and output folder match an entry reuse
+      its outputs, as long as they still exist, instead of being prepared
+      again.
+    memory_budget_bytes: (Optional) The memory each worker's reducing and
+      recoloring buffers may use. Large images are then reduced and recolored
+      in bands. The decoded source images are not bounded by it, except for
+      JPEGs, which are decoded at a reduced scale.
+
+  Returns:
+    A list of dictionaries, with processed images (title, resized image URI and
+    recolored image URI).
+  """
+  return prepare_product_image_variants(
+      images_uri,
+      [(width, height)],
+      original_background_color,
+      background_color,
+      output_uri,
+      max_workers=max_workers,
+      threshold=threshold,
+      color_metric=color_metric,
+      color_table_cache_dir=color_table_cache_dir,
+      cache=cache,
+      memory_budget_bytes=memory_budget_bytes,
+  )[(width, height)]
@@ -0,0 +1,187 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Content-addressed cache of prepared product images.
+
+Entries map a hash of the source image content and the preparation parameters
+to the GCS URIs of the images prepared from it, so unchanged images can be
+reused across runs instead of being resized and recolored again.
+
+The index and manifest storage is shared by other content-addressed caches,
+such as the cache of Gemini prompts, through ManifestCache.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+from google.api_core import exceptions as api_core_exceptions
+
+from gen_v import storage
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_MAX_MANIFEST_WRITE_ATTEMPTS = 5
+
+
+def make_cache_key(source_fingerprint: str, **params) -> str:
+  """Builds a cache key from a source fingerprint and parameters.
+
+  Args:
+    source_fingerprint: A string identifying the source image content, see
+      storage.get_blob_fingerprint.
+    **params: The JSON-serialisable parameters the output depends on.
+
+  Returns:
+    A hex SHA-256 digest identifying the prepared output.
+  """
+  payload = json.dumps(
+      {'source': source_fingerprint, 'params': params},
+      sort_keys=True,
+      default=str,
+  )
+  return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ManifestCache:
+  """A cache index stored locally and/or on GCS.
+
+  The local index is a JSON file for a single machine. The manifest is a JSON
+  blob that several workers share: on save, new entries are merged into the
+  latest manifest and written with a generation precondition, so concurrent
+  writers don't lose each other's entries. Lookups and additions are safe
+  from several threads.
+
+  Attributes:
+    hits: The number of lookups that found an entry.
+    misses: The number of lookups that didn't.
+  """
+
+  name = 'Cache'
+
+  def __init__(
+      self,
+      index_path: str | None = None,
+      manifest_uri: str | None = None,
+  ):
+    """Initialises the cache, loading any existing entries.
+
+    Args:
+      index_path: (Optional) Path of the local JSON index file.
+      manifest_uri: (Optional) GCS URI of the shared JSON manifest.
+    """
+    self._index_path = index_path
+    self._manifest_uri = manifest_uri
+    self._entries = {}
+    self._new_entries = {}
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    if index_path and os.path.exists(index_path):
+      with open(index_path, 'r', encoding='utf-8') as f:
+        self._entries.update(json.load(f))
+    if manifest_uri:
+      self._entries.update(self._read_manifest()[0])
+
+  @property
+  def hit_rate(self) -> float:
+    """The share of the lookups that found an entry, 0 before any lookup."""
+    lookups = self.hits + self.misses
+    return self.hits / lookups if lookups else 0.0
+
+  def get(self, key: str) -> dict | None:
+    """Returns the entry for a key, or None if it isn't cached."""
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+    return entry
+
+  def put(self, key: str, entry: dict) -> None:
+    """Adds or replaces the entry for a key. Call save() to persist it."""
+    with self._lock:
+      self._entries[key] = entry
+      self._new_entries[key] = entry
+
+  def save(self) -> None:
+    """Persists new entries to the local index and the shared manifest."""
+    logger.info(
+        '%s: %d hits, %d misses (%.0f%% hit rate)',
+        self.name,
+        self.hits,
+        self.misses,
+        self.hit_rate * 100,
+    )
+    with self._lock:
+      self._save()
+
+  def _save(self) -> None:
+    """Persists new entries. Needs the lock held."""
+    if not self._new_entries:
+      return
+    if self._manifest_uri:
+      self._write_manifest()
+    if self._index_path:
+      index_dir = os.path.dirname(os.path.abspath(self._index_path))
+      os.makedirs(index_dir, exist_ok=True)
+      with tempfile.NamedTemporaryFile(
+          'w', dir=index_dir, suffix='.json', delete=False, encoding='utf-8'
+      ) as tmp_file:
+        json.dump(self._entries, tmp_file)
+      os.replace(tmp_file.name, self._index_path)
+    self._new_entries = {}
+
+  def _read_manifest(self) -> tuple[dict, int]:
+    """Returns the manifest entries and generation (0 if it doesn't exist)."""
+    blob = storage.get_blob(self._manifest_uri)
+    try:
+      data = blob.download_as_bytes()
+    except api_core_exceptions.NotFound:
+      return {}, 0
+    return json.loads(data), blob.generation
+
+  def _write_manifest(self) -> None:
+    """Merges the new entries into the manifest, retrying on conflicts."""
+    for _ in range(_MAX_MANIFEST_WRITE_ATTEMPTS):
+      entries, generation = self._read_manifest()
+      entries.update(self._new_entries)
+      try:
+        storage.get_blob(self._manifest_uri).upload_from_string(
+            json.dumps(entries),
+            content_type='application/json',
+            if_generation_match=generation,
+        )
+      except api_core_exceptions.PreconditionFailed:
+        logger.info('Manifest changed while saving, merging again.')
+        continue
+      self._entries.update(entries)
+      return
+    logger.warning(
+        'Could not update the manifest %s after %d attempts.',
+        self._manifest_uri,
+        _MAX_MANIFEST_WRITE_ATTEMPTS,
+    )
+
+
+class PreparedImageCache(ManifestCache):
+  """A cache index of prepared images, stored locally and/or on GCS."""
+
+  name = 'Prepared image cache'
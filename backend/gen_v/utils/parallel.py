@@ -0,0 +1,79 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Helpers for running work items in parallel."""
+import collections
+import concurrent.futures
+from typing import Any, Callable, Iterable, Iterator
+
+
+def map_in_order(
+    executor: concurrent.futures.Executor,
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_in_flight: int,
+) -> Iterator[Any]:
+  """Applies a function to items on an executor, yielding results in order.
+
+  Unlike Executor.map, items are only submitted while fewer than
+  `max_in_flight` are pending, so a long (or lazy) input never queues all of
+  its work, and its inputs and results, at once.
+
+  Args:
+    executor: The executor to run the work on.
+    func: The function to apply. It must be picklable for process pools.
+    items: The inputs to apply the function to.
+    max_in_flight: The maximum number of submitted but not yet yielded items.
+
+  Yields:
+    The result of func for each item, in the order of the input.
+
+  Raises:
+    ValueError: If max_in_flight is less than 1.
+  """
+  if max_in_flight < 1:
+    raise ValueError(f'max_in_flight must be at least 1, got {max_in_flight}')
+  pending = collections.deque()
+  for item in items:
+    if len(pending) >= max_in_flight:
+      yield pending.popleft().result()
+    pending.append(executor.submit(func, item))
+  while pending:
+    yield pending.popleft().result()
+
+
+def process_map(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int = 1,
+    max_in_flight: int | None = None,
+) -> list[Any]:
+  """Applies a CPU-bound function to items using a pool of processes.
+
+  Args:
+    func: The function to apply. It must be picklable.
+    items: The inputs to apply the function to.
+    max_workers: The number of worker processes. With 1 (the default) the
+      items are processed sequentially in the current process.
+    max_in_flight: The maximum number of items being processed or waiting to
+      be collected at once. Defaults to twice the number of workers.
+
+  Returns:
+    The results of func for each item, in the order of the input.
+  """
+  if max_workers <= 1:
+    return [func(item) for item in items]
+  with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+    return list(
+        map_in_order(executor, func, items, max_in_flight or 2 * max_workers)
+    )
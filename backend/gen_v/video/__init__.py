@@ -13,6 +13,12 @@
 # limitations under the License.
 """Exposes core functions for the video package."""
 
+from gen_v.video.clients import GoogleApiClient
+from gen_v.video.clients import configure_api_client
+from gen_v.video.clients import get_api_client
+from gen_v.video.clients import get_genai_client
+from gen_v.video.clients import reset_api_client
+from gen_v.video.clients import reset_genai_clients
 from gen_v.video.editing import add_text_clips_to_video
 from gen_v.video.editing import display_image
 from gen_v.video.editing import load_text_clips
@@ -38,9 +44,26 @@ from gen_v.video.generation import get_gemini_generated_video_prompt
 from gen_v.video.generation import image_to_video
 from gen_v.video.generation import send_request_to_google_api
 from gen_v.video.generation import generate_videos
+from gen_v.video.generation import get_operation_poller
+from gen_v.video.generation import start_image_to_video
+from gen_v.video.operations import OperationPoller
+from gen_v.video.prompt_cache import PromptCache
+from gen_v.video.prompt_cache import make_prompt_cache_key
+from gen_v.video.ratelimit import RateLimiter
+from gen_v.video.ratelimit import call_with_retries
+from gen_v.video.ratelimit import configure_rate_limit
+from gen_v.video.ratelimit import configure_retries
+from gen_v.video.ratelimit import get_rate_limiter
+from gen_v.video.ratelimit import reset_rate_limits
 
 
 __all__ = [
+    'GoogleApiClient',
+    'configure_api_client',
+    'get_api_client',
+    'get_genai_client',
+    'reset_api_client',
+    'reset_genai_clients',
     'add_text_clips_to_video',
     'display_image',
     'load_text_clips',
@@ -66,4 +89,15 @@ __all__ = [
     'image_to_video',
     'send_request_to_google_api',
     'generate_videos',
+    'get_operation_poller',
+    'start_image_to_video',
+    'OperationPoller',
+    'PromptCache',
+    'make_prompt_cache_key',
+    'RateLimiter',
+    'call_with_retries',
+    'configure_rate_limit',
+    'configure_retries',
+    'get_rate_limiter',
+    'reset_rate_limits',
 ]
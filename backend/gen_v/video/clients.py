@@ -0,0 +1,230 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""The clients shared by the calls to Google APIs.
+
+Looking up the default credentials and opening a new connection for every
+request costs a credential lookup and a TLS handshake per prediction, per
+poll and per Gemini prompt. The clients shared by each process instead keep
+pools of warm connections, and cache their access tokens until shortly
+before they expire.
+"""
+
+import datetime
+import logging
+import os
+import sys
+import threading
+from typing import Any
+
+from google import genai
+import google.auth
+from google.auth import credentials as google_credentials
+from google.auth.transport import requests as google_requests
+import requests
+from requests import adapters
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_CONNECTION_POOL_SIZE = 32
+# The token is refreshed this long before it expires, so a request sent with
+# it doesn't fail on the way.
+_TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+_SCOPES = ("https://www.googleapis.com/auth/cloud-platform",)
+
+
+class GoogleApiClient:
+  """Sends authenticated JSON requests to Google APIs over pooled connections.
+
+  It is safe to use from several threads. The credentials are looked up on
+  the first request that needs a token.
+  """
+
+  def __init__(
+      self,
+      connection_pool_size: int = DEFAULT_CONNECTION_POOL_SIZE,
+      credentials: google_credentials.Credentials | None = None,
+  ):
+    """Initialises the client.
+
+    Args:
+      connection_pool_size: The maximum number of connections kept open to
+        each host. Should be at least the number of threads sending requests.
+      credentials: (Optional) The credentials to authenticate with. Defaults
+        to the application default credentials.
+    """
+    self._session = requests.Session()
+    adapter = adapters.HTTPAdapter(
+        pool_connections=connection_pool_size,
+        pool_maxsize=connection_pool_size,
+    )
+    self._session.mount("https://", adapter)
+    self._credentials = credentials
+    self._credentials_lock = threading.Lock()
+
+  def get_access_token(self) -> str:
+    """Returns an access token, refreshing it if it is about to expire."""
+    with self._credentials_lock:
+      if self._credentials is None:
+        self._credentials, _ = google.auth.default(scopes=_SCOPES)
+      if not self._credentials.valid or _expires_soon(self._credentials):
+        self._credentials.refresh(
+            google_requests.Request(session=self._session)
+        )
+      return self._credentials.token
+
+  def post(
+      self,
+      api_endpoint: str,
+      data: dict[str, Any] | None = None,
+      access_token: str | None = None,
+      timeout: int = 60,
+  ) -> dict[str, Any]:
+    """Sends a JSON request and returns the JSON response.
+
+    Args:
+      api_endpoint: The URL of the Google API endpoint.
+      data: (Optional) Dictionary of data to send in the request body.
+      access_token: (Optional) The access token to use. Defaults to the
+        cached token of the client.
+      timeout: The number of seconds before giving up the request.
+
+    Returns:
+      The response from the Google API.
+
+    Raises:
+      requests.exceptions.HTTPError: If the API request fails (non-2xx status
+      code).
+    """
+    if access_token is None:
+      access_token = self.get_access_token()
+    response = self._session.post(
+        api_endpoint,
+        headers={
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+        },
+        json=data,
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.json()
+
+  def close(self) -> None:
+    """Closes the pooled connections."""
+    self._session.close()
+
+
+def _expires_soon(credentials: google_credentials.Credentials) -> bool:
+  """Whether the token of the credentials expires within the margin."""
+  if credentials.expiry is None:
+    return False
+  # google-auth keeps expiry times as naive UTC datetimes.
+  now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+  return credentials.expiry - _TOKEN_REFRESH_MARGIN <= now
+
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_connection_pool_size = DEFAULT_CONNECTION_POOL_SIZE
+
+
+def get_api_client() -> GoogleApiClient:
+  """Returns the Google API client shared by the current process.
+
+  The client is created on first use. A process forked from one that
+  already had a client creates its own, as connections can't be shared
+  across processes.
+
+  Returns:
+    The shared Google API client.
+  """
+  global _client, _client_pid
+  with _lock:
+    if _client is None or _client_pid != os.getpid():
+      _client = GoogleApiClient(_connection_pool_size)
+      _client_pid = os.getpid()
+      logger.info(
+          "Created Google API client with %d pooled connections.",
+          _connection_pool_size,
+      )
+    return _client
+
+
+def configure_api_client(
+    connection_pool_size: int = DEFAULT_CONNECTION_POOL_SIZE,
+) -> None:
+  """Sets how the shared Google API client is created.
+
+  If the pool size changes, the shared client is created again on next use.
+
+  Args:
+    connection_pool_size: The maximum number of connections kept open to
+      each host.
+
+  Raises:
+    ValueError: If connection_pool_size is less than 1.
+  """
+  global _client, _connection_pool_size
+  if connection_pool_size < 1:
+    raise ValueError(
+        f"connection_pool_size must be at least 1, got {connection_pool_size}"
+    )
+  with _lock:
+    if connection_pool_size != _connection_pool_size:
+      _connection_pool_size = connection_pool_size
+      _client = None
+
+
+def reset_api_client() -> None:
+  """Discards the shared Google API client, so the next use creates one."""
+  global _client
+  with _lock:
+    _client = None
+
+
+_genai_clients_lock = threading.Lock()
+_genai_clients = {}
+
+
+def get_genai_client(project_id: str, location: str) -> genai.Client:
+  """Returns the Gen AI client shared by the current process for a location.
+
+  The client is created on first use for a project and location, and is safe
+  to share between threads. A forked process creates its own clients.
+
+  Args:
+    project_id: The Google Cloud project to use with Vertex AI.
+    location: The Google Cloud location to use with Vertex AI.
+
+  Returns:
+    The shared Vertex AI Gen AI client.
+  """
+  key = (project_id, location, os.getpid())
+  with _genai_clients_lock:
+    if key not in _genai_clients:
+      _genai_clients[key] = genai.Client(
+          vertexai=True, project=project_id, location=location
+      )
+      logger.info("Created Gen AI client for %s in %s.", project_id, location)
+    return _genai_clients[key]
+
+
+def reset_genai_clients() -> None:
+  """Discards the shared Gen AI clients, so the next use creates new ones."""
+  with _genai_clients_lock:
+    _genai_clients.clear()
@@ -17,18 +17,27 @@ This module provides utilities for manipulating video clips after generation.
 """
 import concurrent.futures
 import contextlib
+import logging
 import os
+import sys
+import threading
 from typing import Any, Callable
 
+from gen_v import config
 from gen_v import models
 from gen_v import storage as gcs
-from gen_v import utils
-from google.api_core import exceptions as api_core_exceptions
+from gen_v.utils import parallel
+from gen_v.video import overlays
 import mediapy
 import moviepy as mp
 from PIL import Image
 
 
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
 def display_image(
     image_path: str,
     display_function: Callable[[Any], None] | None = None,
@@ -64,6 +73,8 @@ def overlay_image_on_video(
     input_video: models.VideoInput,
     images: list[models.ImageInput],
     output_video_path: models.VideoInput,
+    overlay_cache: overlays.OverlayAssetCache | None = None,
+    overlay_fingerprints: dict[str, str] | None = None,
 ) -> mp.VideoFileClip:
   """Overlays images on a video.
 
@@ -71,11 +82,17 @@ def overlay_image_on_video(
       input_video: A VideoInput object with the input video.
       images: A list of ImageInput objects with the images to overlay.
       output_video_path: A VideoInput object with the output video path.
+      overlay_cache: (Optional) The cache of prepared overlay images. Defaults
+        to the cache shared by the current process.
+      overlay_fingerprints: (Optional) The fingerprint of each image, by URI,
+        if already known. Others are fetched.
 
   Returns:
       The modified video clip if successful, or None if an error occurred.
   """
   print("Started overlay_image_on_video...")
+  overlay_cache = overlay_cache or overlays.get_default_overlay_cache()
+  overlay_fingerprints = overlay_fingerprints or {}
 
   # gcs_filename = gcs.get_file_name_from_gcs_url(input_video.path)
   local_video_path = input_video.path
@@ -85,35 +102,17 @@ def overlay_image_on_video(
   video_file_name = gcs.get_file_name_from_gcs_url(output_video_path.path)
   local_output_video_path = f"/content/overlay_output_{video_file_name}"
 
-  for img in images:
-    overlay_file_name = gcs.get_file_name_from_gcs_url(img.path)
-    no_extension_video_file_name = video_file_name.split(".")[0]
-
-    image_file_name = f"{no_extension_video_file_name}_{overlay_file_name}"
-    local_img_path = gcs.download_file_locally(img.path, image_file_name)
-
-    image_file = Image.open(local_img_path)
-    image_file = image_file.convert("RGBA")
-    local_img_path_png = local_img_path.replace(".jpg", ".png")
-    image_file.save(local_img_path_png)
-
-    if img.height > 0:
-      resized_img_path = local_img_path_png.replace(".png", "_resized.png")
-      rescaled_img = utils.rescale_image_height(local_img_path_png, img.height)
-      rescaled_img.save(resized_img_path)
-      local_img_path_png = resized_img_path
-    img_clip = (
-        mp.ImageClip(local_img_path_png)
-        .with_duration(img.duration)
-        .with_position(img.position)
-    )
-    img_clip = img_clip.with_effects(
-        [mp.vfx.CrossFadeIn(fade_duration)]
-    ).with_effects([mp.vfx.CrossFadeOut(fade_duration)])
-
-    final_clip = mp.CompositeVideoClip(
-        [final_clip, img_clip.with_start(img.start)]
-    )
+  placements = [
+      overlays.OverlayPlacement(
+          overlay=overlay_cache.get(img, overlay_fingerprints.get(img.path)),
+          start=img.start,
+          duration=img.duration,
+          position=img.position,
+          fade_duration=fade_duration,
+      )
+      for img in images
+  ]
+  final_clip = overlays.composite_overlays(final_clip, placements)
 
   # Write the output video
   final_clip.write_videofile(
@@ -173,7 +172,7 @@ def add_text_clips_to_video(
   local_output_video_path = f"/content/output_{input_file_name}"
 
   for text in text_inputs:
-    local_font_path = gcs.download_file_locally(text.font)
+    local_font_path = gcs.download_file_locally(text.font, use_cache=True)
     text.font = local_font_path
 
   with load_text_clips(local_video_path, text_inputs) as clips:
@@ -190,74 +189,126 @@ def process_videos_with_overlays_and_text(
     overlay_text: models.TextInput,
     overlays_uri: str,
     final_uri: str,
+    max_workers: int = 4,
+    settings: config.AppSettings | None = None,
 ) -> None:
   """Processes videos by adding image and text overlays and uploading to gcs.
 
+  The next videos are downloaded while the current ones are processed, within
+  the prefetch disk budget, and each download is removed once processed. A
+  video that fails, including because an overlay is missing, is logged and
+  skipped.
+
   Args:
       videos: A list of video dictionaries with GCS URI and local file path.
       images: A list of `ImageInput` image overlays to be added to the videos.
       overlay_text: A `TextInput` object, defining the text overlay.
       overlays_uri: The GCS URI where intermediate overlays will be stored.
       final_uri: The GCS URI where final videos with overlays will be stored.
+      max_workers: (Optional) The number of videos processed at once.
+      settings: (Optional) The settings to configure storage with, including
+                the blob cache the logos and fonts are fetched through.
 
   Returns:
       None.
   """
-  print("Starting process_videos_with_overlays_and_text...")
-  print(f"Intermediate GCS URI: {overlays_uri}")
-  print(f"Final GCS URI: {final_uri}")
-
-  def process_video(video: dict[str, str]):
+  if settings is not None:
+    config.configure_storage(settings)
+  logger.info("Starting process_videos_with_overlays_and_text...")
+  logger.info("Intermediate GCS URI: %s", overlays_uri)
+  logger.info("Final GCS URI: %s", final_uri)
+  # The overlays are the same for every video, so they are fingerprinted once,
+  # by the first video that uses them.
+  overlay_fingerprints = {}
+  overlay_fingerprints_lock = threading.Lock()
+
+  def get_overlay_fingerprints() -> dict[str, str]:
+    """Returns the fingerprints of the overlays, fetching the missing ones."""
+    with overlay_fingerprints_lock:
+      for image in images:
+        if image.path not in overlay_fingerprints:
+          overlay_fingerprints[image.path] = gcs.get_blob_fingerprint(
+              image.path
+          )
+      return dict(overlay_fingerprints)
+
+  def process_video(video: dict[str, str], download: gcs.PrefetchedFile):
     """Processes a single video by adding overlays and text.
 
     Args:
       video: A dictionary representing a video
+      download: The download of the video, removed once processed.
     """
-    print(f"Processing video: {video}")
-
-    try:
-      file_name = video.get("local_file_name")
-      gcs_uri = video.get("gcs_uri")
-
-      print(f"Downloading video {file_name} from: {gcs_uri}")
-      local_video_file_path = gcs.download_file_locally(gcs_uri, file_name)
-      print(f"Downloaded video {file_name} to: {local_video_file_path}")
-
-      local_video_file = models.VideoInput(path=local_video_file_path)
+    logger.info("Processing video: %s", video)
+    file_name = video.get("local_file_name")
+    with download:
+      if not download.succeeded:
+        logger.error(
+            "Error downloading video: %s: %s", file_name, download.error
+        )
+        return
 
-      gcs_image_overlay_video_path = f"{overlays_uri}/{file_name}"
-      image_overlay_video = models.VideoInput(
-          path=f"gs://{gcs_image_overlay_video_path}"
-      )
+      try:
+        local_video_file = models.VideoInput(path=download.destination)
 
-      uploaded_overlay_uri = overlay_image_on_video(
-          local_video_file, images, image_overlay_video
-      )
-      print(
-          f"Image overlay video for '{file_name}' uploaded to:"
-          f" {uploaded_overlay_uri}"
-      )
+        gcs_image_overlay_video_path = f"{overlays_uri}/{file_name}"
+        image_overlay_video = models.VideoInput(
+            path=gcs.to_uri(gcs_image_overlay_video_path)
+        )
 
-      promo_text = models.TextInput(
-          text=video.get("promo_text"),
-          font=overlay_text.font,
-          font_size=overlay_text.font_size,
-          start_time=overlay_text.start_time,
-          duration=overlay_text.duration,
-          color=overlay_text.color,
-          position=overlay_text.position,
-      )
+        uploaded_overlay_uri = overlay_image_on_video(
+            local_video_file,
+            images,
+            image_overlay_video,
+            overlay_fingerprints=get_overlay_fingerprints(),
+        )
+        logger.info(
+            "Image overlay video for '%s' uploaded to: %s",
+            file_name,
+            uploaded_overlay_uri,
+        )
 
-      # Define the GCS path for the final video with text overlay.
-      final_video_gcs_path = f"{final_uri}/{file_name}"
-      final_video = models.VideoInput(path=final_video_gcs_path)
+        promo_text = models.TextInput(
+            text=video.get("promo_text"),
+            font=overlay_text.font,
+            font_size=overlay_text.font_size,
+            start_time=overlay_text.start_time,
+            duration=overlay_text.duration,
+            color=overlay_text.color,
+            position=overlay_text.position,
+        )
 
-      add_text_clips_to_video(image_overlay_video, [promo_text], final_video)
-    except api_core_exceptions.GoogleAPICallError as e:
-      print(f"Error processing video: {file_name}: {e}")
+        # Define the GCS path for the final video with text overlay.
+        final_video_gcs_path = f"{final_uri}/{file_name}"
+        final_video = models.VideoInput(path=final_video_gcs_path)
+
+        add_text_clips_to_video(image_overlay_video, [promo_text], final_video)
+      # A video that fails is reported and skipped, so the batch goes on.
+      except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Error processing video: %s", file_name)
+
+  logger.info("Processing %d videos...", len(videos))
+  with (
+      gcs.prefetch_files(
+          [video.get("gcs_uri") for video in videos],
+          file_names=[video.get("local_file_name") for video in videos],
+      ) as downloads,
+      concurrent.futures.ThreadPoolExecutor(max_workers) as executor,
+  ):
+    for _ in parallel.map_in_order(
+        executor,
+        lambda item: process_video(*item),
+        zip(videos, downloads),
+        max_workers,
+    ):
+      pass
 
-  with concurrent.futures.ThreadPoolExecutor() as executor:
-    executor.map(process_video, videos)
+  overlay_cache = overlays.get_default_overlay_cache()
+  logger.info(
+      "Overlay cache: %d hits, %d misses",
+      overlay_cache.hits,
+      overlay_cache.misses,
+  )
 
 
 def trim_clips(
@@ -22,11 +22,9 @@ from datetime import date
 import functools
 import logging
 import sys
-import time
+import threading
 
 from google import genai
-import google.auth
-from google.auth.transport import requests as google_requests
 from google.cloud import storage as gcp_storage
 from google.genai import types
 import requests
@@ -35,19 +33,27 @@ from gen_v import config
 from gen_v import models
 from gen_v import storage
 from gen_v import utils
+from gen_v.utils import image_cache
+from gen_v.video import clients
+from gen_v.video import operations
+from gen_v.video import prompt_cache as prompt_cache_lib
+from gen_v.video import ratelimit
 
 
 logging.basicConfig(stream=sys.stdout)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+_GEMINI_MEDIA_RESOLUTION = types.MediaResolution.MEDIA_RESOLUTION_LOW
+
 
 def get_access_token() -> str:
-  """Retrieves the access token for the currently active account."""
-  creds, _ = google.auth.default()
-  if not creds.valid:
-    creds.refresh(google_requests.Request())
-  return creds.token
+  """Retrieves the access token for the currently active account.
+
+  The token is cached by the shared Google API client until shortly before it
+  expires.
+  """
+  return clients.get_api_client().get_access_token()
 
 
 def send_request_to_google_api(
@@ -58,6 +64,8 @@ def send_request_to_google_api(
 ) -> dict[str, any]:
   """Sends an HTTP request to a Google API endpoint.
 
+  The request reuses the pooled connections of the shared Google API client.
+
   Args:
     api_endpoint: The URL of the Google API endpoint.
     data: (Optional) Dictionary of data to send in the request body.
@@ -73,19 +81,9 @@ def send_request_to_google_api(
     requests.exceptions.HTTPError: If the API request fails (non-2xx status
     code).
   """
-  if access_token is None:
-    access_token = get_access_token()
-
-  headers = {
-      'Authorization': f'Bearer {access_token}',
-      'Content-Type': 'application/json',
-  }
-
-  response = requests.post(
-      api_endpoint, headers=headers, json=data, timeout=timeout
+  return clients.get_api_client().post(
+      api_endpoint, data, access_token=access_token, timeout=timeout
   )
-  response.raise_for_status()
-  return response.json()
 
 
 def get_gemini_generated_video_prompt(
@@ -93,6 +91,7 @@ def get_gemini_generated_video_prompt(
     project_id: str = None,
     location: str = None,
     client: genai.Client | None = None,
+    prompt_cache: prompt_cache_lib.PromptCache | None = None,
 ) -> str | None:
   """Uses Gemini to analyse an image and generate a video prompt.
 
@@ -101,8 +100,12 @@ def get_gemini_generated_video_prompt(
       text, and model name.
     project_id: The project ID to use in the client.
     location: The Google Cloud location to use in the client.
-    client: For dependency injection, provide a client to use. If not used, one
-      will be created using the project_id and location.
+    client: For dependency injection, provide a client to use. If not used,
+      the client shared by the process for the project_id and location is
+      used, see clients.get_genai_client.
+    prompt_cache: (Optional) A cache of the prompts generated before. A prompt
+      cached for the same image content, prompt text, model and media
+      resolution is returned without calling Gemini.
 
   Returns:
       The generated video prompt as a string, or None if there was an error.
@@ -110,12 +113,22 @@ def get_gemini_generated_video_prompt(
   Raises:
     ValueError if client is None and a project_id and location aren't provided.
   """
+  cache_key = None
+  if prompt_cache is not None:
+    cache_key = prompt_cache_lib.make_prompt_cache_key(
+        request_data, _GEMINI_MEDIA_RESOLUTION.value
+    )
+    cached_prompt = prompt_cache.get_prompt(cache_key)
+    if cached_prompt is not None:
+      logger.info('Reusing the cached prompt: %s', cached_prompt)
+      return cached_prompt
+
   if client is None:
     if not project_id or not location:
       raise ValueError(
           'project_id and location must be provided if client is None'
       )
-    client = genai.Client(vertexai=True, project=project_id, location=location)
+    client = clients.get_genai_client(project_id, location)
 
   contents = [request_data.prompt_text]
   if request_data.image_bytes and request_data.mime_type:
@@ -127,23 +140,88 @@ def get_gemini_generated_video_prompt(
   else:
     logger.warning('No image found, sending only the prompt.')
 
-  response = client.models.generate_content(
-      model=request_data.model_name,
-      contents=contents,
-      config=types.GenerateContentConfig(
-          media_resolution=types.MediaResolution.MEDIA_RESOLUTION_LOW,
+  response = ratelimit.call_with_retries(
+      ratelimit.GEMINI,
+      lambda: client.models.generate_content(
+          model=request_data.model_name,
+          contents=contents,
+          config=types.GenerateContentConfig(
+              media_resolution=_GEMINI_MEDIA_RESOLUTION,
+          ),
       ),
   )
   logger.info('The response is: %s', response.text)
+  if cache_key is not None and response.text:
+    prompt_cache.put_prompt(cache_key, response.text)
   return response.text
 
 
+def _fetch_operation_status(
+    lro_name: str, settings: config.AppSettings
+) -> dict[str, any]:
+  """Returns the current state of a long-running operation.
+
+  A rejected poll holds back the polling budget, and is retried by the poller.
+  """
+  return ratelimit.call_with_retries(
+      ratelimit.POLLING,
+      lambda: send_request_to_google_api(
+          settings.fetch_endpoint, {'operationName': lro_name}
+      ),
+      max_retries=0,
+  )
+
+
+_pollers_lock = threading.Lock()
+_pollers = {}
+
+
+def get_operation_poller(
+    settings: config.AppSettings,
+) -> operations.OperationPoller:
+  """Returns the poller shared by the operations of the configured model.
+
+  Args:
+    settings: An instance of AppSettings containing configuration, including
+      the derived fetch_endpoint and the polling intervals.
+
+  Returns:
+    The poller of the operations of the fetch endpoint.
+  """
+  key = (
+      settings.fetch_endpoint,
+      settings.veo_poll_initial_interval_seconds,
+      settings.veo_poll_max_interval_seconds,
+      settings.veo_poll_timeout_seconds,
+  )
+  with _pollers_lock:
+    if key not in _pollers:
+      _pollers[key] = operations.OperationPoller(
+          functools.partial(_fetch_operation_status, settings=settings),
+          initial_interval=settings.veo_poll_initial_interval_seconds,
+          max_interval=settings.veo_poll_max_interval_seconds,
+          timeout=settings.veo_poll_timeout_seconds,
+      )
+    return _pollers[key]
+
+
+def _get_operation_result(
+    lro_name: str, future: concurrent.futures.Future
+) -> dict[str, any] | None:
+  """Waits for a polled operation, returning None if it timed out."""
+  try:
+    return future.result()
+  except TimeoutError as e:
+    logger.error('Gave up on operation %s: %s', lro_name, e)
+    return None
+
+
 def fetch_operation(lro_name: str, settings: config.AppSettings) -> str | None:
   """Fetches the status of a long-running operation.
 
-  Makes regular pings to the API endpoint to determine the status of the job. It
-  usually takes about 2 mins to generate a request. This function will give up
-  after 30 loops (5 mins).
+  The operation is polled by the poller shared with the other operations,
+  often at first and then less frequently. Generation usually takes about
+  2 minutes. The poller gives up after veo_poll_timeout_seconds.
 
   Args:
     lro_name: The name of the long-running operation.
@@ -151,23 +229,53 @@ def fetch_operation(lro_name: str, settings: config.AppSettings) -> str | None:
       the derived fetch_endpoint.
 
   Returns:
-    The response from the API containing the operation status.
-
+    The response from the API containing the operation status, or None if
+    the operation didn't complete in time.
   """
-  request = {'operationName': lro_name}
-  # The generation usually takes 2 minutes. Loop 30 times, around 5 minutes.
-  max_attempts = 30
-  attempt_interval = 10
+  return _get_operation_result(
+      lro_name, get_operation_poller(settings).submit(lro_name)
+  )
 
-  for _ in range(max_attempts):
-    try:
-      resp = send_request_to_google_api(settings.fetch_endpoint, request)
-      if 'done' in resp and resp['done']:
-        return resp
-    except requests.exceptions.HTTPError as e:
-      logger.error('Error while fetching operation: %s', e)
 
-    time.sleep(attempt_interval)
+def _request_prediction(
+    request_payload: dict[str, any], settings: config.AppSettings
+) -> dict[str, any]:
+  """Sends a Veo request within the prediction budget, see ratelimit."""
+  return ratelimit.call_with_retries(
+      ratelimit.PREDICTION,
+      lambda: send_request_to_google_api(
+          settings.prediction_endpoint, request_payload
+      ),
+  )
+
+
+def start_image_to_video(
+    veo_request: models.VeoApiRequest,
+    settings: config.AppSettings,
+) -> tuple[str, concurrent.futures.Future] | None:
+  """Requests a video from an image, without waiting for it.
+
+  Args:
+    veo_request: The request model to Veo containing information such as the
+      prompt.
+    settings: An instance of AppSettings containing configuration, including
+      the derived fetch_endpoint.
+
+  Returns:
+    The name of the long-running operation and a future resolved with the
+    operation once done, or None if the request failed, after retrying it
+    while rejected for quota.
+  """
+  request_payload = veo_request.to_api_payload()
+  logger.info('Making image to video request with this payload')
+  logger.info(request_payload)
+
+  try:
+    resp = _request_prediction(request_payload, settings)
+  except requests.exceptions.HTTPError as e:
+    logger.error('Error sending image_to_video request: %s', e)
+    return None
+  return resp['name'], get_operation_poller(settings).submit(resp['name'])
 
 
 def image_to_video(
@@ -184,17 +292,15 @@ def image_to_video(
 
   Returns:
     A dictionary containing the response from the Video Generation API,
-    including the operation details and generated video information.
-
+    including the operation details and generated video information, or None
+    if the request failed, after retrying it while rejected for quota.
   """
   request_payload = veo_request.to_api_payload()
   logger.info('Making image to video request with this payload')
   logger.info(request_payload)
 
   try:
-    resp = send_request_to_google_api(
-        settings.prediction_endpoint, request_payload
-    )
+    resp = _request_prediction(request_payload, settings)
     return fetch_operation(resp['name'], settings)
   except requests.exceptions.HTTPError as e:
     logger.error('Error sending image_to_video request: %s', e)
@@ -218,41 +324,97 @@ def generate_videos_and_download(
     product: A dictionary containing product information.
 
   Returns:
-    A list of dictionaries, containing information about a generated video
+    A list of dictionaries, containing information about a generated video,
+    empty if the generation failed.
   """
-  output_videos = image_to_video(veo_request, settings)
-  file_name = storage.get_file_name_from_gcs_url(veo_request.image_uri)
-
-  output_video_files = []
-  logger.info(
-      'Generated videos %s for %s',
-      len(output_videos['response']['videos']),
-      file_name,
+  output_video_files, moves = _download_generated_videos(
+      veo_request,
+      image_to_video(veo_request, settings),
+      output_file_prefix,
+      product,
   )
+  _move_generated_videos(output_video_files, moves, storage_client)
+  return output_video_files
 
-  for video in output_videos['response']['videos']:
-    veo_name = storage.get_file_name_from_gcs_url(video['gcsUri'])
-    output_video_local_path = f'{file_name}-{output_file_prefix}-{veo_name}'
 
-    storage.download_file_locally(video['gcsUri'], output_video_local_path)
+def _download_generated_videos(
+    veo_request: models.VeoApiRequest,
+    output_videos: dict[str, any] | None,
+    output_file_prefix: str,
+    product: dict[str, any],
+) -> tuple[list[dict[str, any]], list[tuple[str, str]]]:
+  """Downloads the videos of a done operation, see above.
 
-    video_uri = storage.move_blob(
-        video['gcsUri'], file_name, storage_client=storage_client
+  Returns:
+    The information about each downloaded video, and the move of each video
+    into the folder of its product, to be made by _move_generated_videos.
+  """
+  file_name = storage.get_file_name_from_gcs_url(veo_request.image_uri)
+  if output_videos is None or 'response' not in output_videos:
+    # The request failed, or the operation finished with an error.
+    logger.error(
+        'No videos were generated for %s: %s',
+        file_name,
+        (output_videos or {}).get('error', 'the request failed'),
+    )
+    return [], []
+
+  videos = output_videos['response']['videos']
+  logger.info('Generated videos %s for %s', len(videos), file_name)
+
+  local_file_names = [
+      f'{file_name}-{output_file_prefix}-'
+      f'{storage.get_file_name_from_gcs_url(video["gcsUri"])}'
+      for video in videos
+  ]
+  # The samples are downloaded together, instead of one at a time.
+  download_results = storage.download_many(
+      [video['gcsUri'] for video in videos], file_names=local_file_names
+  )
+  output_video_files = []
+  moves = []
+  for local_file_name, result in zip(local_file_names, download_results):
+    if not result.succeeded:
+      # A sample that could not be downloaded is left where Veo wrote it.
+      logger.error('Failed to download %s: %s', result.source, result.error)
+      continue
+    moves.append(
+        (result.source, storage.get_moved_blob_uri(result.source, file_name))
     )
-
     output_video_files.append({
-        'gcs_uri': video_uri,
-        'local_file': output_video_local_path,
-        'local_file_name': output_video_local_path.rsplit('/', maxsplit=1)[-1],
+        'local_file': local_file_name,
+        'local_file_name': local_file_name.rsplit('/', maxsplit=1)[-1],
         'product_title': product['title'],
         'promo_text': '',
     })
+  return output_video_files, moves
 
-  return output_video_files
+
+def _move_generated_videos(
+    output_video_files: list[dict[str, any]],
+    moves: list[tuple[str, str]],
+    storage_client: gcp_storage.Client = None,
+) -> None:
+  """Moves downloaded videos into their product folders, setting gcs_uri.
+
+  Args:
+    output_video_files: The information about each downloaded video.
+    moves: The move of each video, see _download_generated_videos.
+    storage_client: The Google Cloud Storage client.
+  """
+  # The samples are moved together, instead of one copy and delete at a time.
+  move_results = storage.move_many(moves, storage_client=storage_client)
+  for output_video_file, result in zip(output_video_files, move_results):
+    # A sample that could not be moved is left where Veo wrote it.
+    output_video_file['gcs_uri'] = (
+        result.destination if result.succeeded else result.source
+    )
 
 
 def generate_video_for_item(
-    item_data: dict, settings: config.AppSettings
+    item_data: dict,
+    settings: config.AppSettings,
+    prompt_cache: prompt_cache_lib.PromptCache | None = None,
 ) -> list[dict]:
   """Generates video(s) for a single item/entity based on configuration.
 
@@ -261,16 +423,41 @@ def generate_video_for_item(
       Expected keys: 'recolored_image_uri'
     settings: An instance of AppSettings containing configuration, including
       the derived fetch_endpoint.
+    prompt_cache: (Optional) A cache of the Gemini prompts generated before,
+      used when prompt_type is 'GEMINI'. Call its save() once done.
 
   Returns:
     A list of dictionaries containing information about the generated video(s),
       or an empty list if an error occurs during generation for this item.
   """
+  veo_request = _build_veo_request(item_data, settings, prompt_cache)
+  if veo_request is None:
+    return []
+  generated_videos = generate_videos_and_download(
+      veo_request=veo_request,
+      settings=settings,
+      output_file_prefix=settings.output_file_prefix,
+      product=item_data,
+  )
+  logging.info(
+      'Successfully generated %d video(s) for item: %s',
+      len(generated_videos),
+      veo_request.image_uri,
+  )
+  return generated_videos
+
+
+def _build_veo_request(
+    item_data: dict,
+    settings: config.AppSettings,
+    prompt_cache: prompt_cache_lib.PromptCache | None = None,
+) -> models.VeoApiRequest | None:
+  """Builds the Veo request of an item, or returns None if it has no image."""
   if 'recolored_image_uri' not in item_data:
     logger.warning(
         "Skipping item due to missing 'recolored_image_uri': %s", item_data
     )
-    return []
+    return None
 
   recolored_image_uri = item_data['recolored_image_uri']
   logger.info('Processing item: %s', recolored_image_uri)
@@ -294,6 +481,7 @@ def generate_video_for_item(
         gemini_prompt_request,
         project_id=settings.gcp_project_id,
         location=settings.gcp_region,
+        prompt_cache=prompt_cache,
     )
   else:
     logger.error('Invalid prompt type: %s', settings.prompt_type)
@@ -321,30 +509,30 @@ def generate_video_for_item(
       prompt_enhance=settings.veo_prompt_enhance,
       person_generation=settings.veo_person_generation,
   )
-  generated_videos = generate_videos_and_download(
-      veo_request=veo_request,
-      settings=settings,
-      output_file_prefix=settings.output_file_prefix,
-      product=item_data,
-  )
-  logging.info(
-      'Successfully generated %d video(s) for item: %s',
-      len(generated_videos),
-      recolored_image_uri,
-  )
-  return generated_videos
+  return veo_request
 
 
 def generate_videos_concurrently(
-    items_to_process: list[dict], settings: config.AppSettings
+    items_to_process: list[dict],
+    settings: config.AppSettings,
+    prompt_cache: prompt_cache_lib.PromptCache | None = None,
 ) -> list[dict]:
   """Generates videos for a list of items/entities concurrently.
 
+  The generation of each item is requested within the prediction budget, see
+  ratelimit. The operations are polled together by the shared operation
+  poller, and the videos of each item are downloaded as soon as its operation
+  is done, while the generation of later items is still being requested. At
+  most veo_max_workers items are requested, and veo_max_workers downloaded,
+  at once. The samples of all the items are then moved into their product
+  folders together.
+
   Args:
     items_to_process: A list of dictionaries, each containing data for an item.
-      Each dictionary is passed to generate_video_for_item.
     settings: An instance of AppSettings containing configuration, including
       the derived fetch_endpoint.
+    prompt_cache: (Optional) A cache of the Gemini prompts generated before,
+      used when prompt_type is 'GEMINI'. Call its save() once done.
 
   Returns:
     A flat list containing dictionaries of all successfully generated video
@@ -354,15 +542,93 @@ def generate_videos_concurrently(
       'Starting concurrent video generation for %d items.',
       len(items_to_process),
   )
-  all_generated_videos = []
-
-  worker_func = functools.partial(generate_video_for_item, settings=settings)
 
-  with concurrent.futures.ThreadPoolExecutor() as executor:
-    results_iterator = executor.map(worker_func, items_to_process)
-    for video_list in results_iterator:
-      if video_list:
-        all_generated_videos.extend(video_list)
+  def start_item(
+      item_data: dict,
+  ) -> tuple[models.VeoApiRequest, str, concurrent.futures.Future] | None:
+    # An item that fails, e.g. once Gemini has rejected its retries, is
+    # logged and skipped, so the rest of the batch goes on.
+    try:
+      veo_request = _build_veo_request(item_data, settings, prompt_cache)
+      if veo_request is None:
+        return None
+      started = start_image_to_video(veo_request, settings)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+      logger.error('Failed to start the generation for %s: %s', item_data, e)
+      return None
+    if started is None:
+      # Handled as a generation that returned nothing, as in image_to_video.
+      failed = concurrent.futures.Future()
+      failed.set_result(None)
+      return veo_request, None, failed
+    return veo_request, *started
+
+  def finish_item(
+      item_data: dict,
+      veo_request: models.VeoApiRequest,
+      lro_name: str | None,
+      operation: concurrent.futures.Future,
+  ) -> tuple[list[dict], list[tuple[str, str]]]:
+    try:
+      generated_videos, moves = _download_generated_videos(
+          veo_request,
+          _get_operation_result(lro_name, operation),
+          settings.output_file_prefix,
+          item_data,
+      )
+    except Exception as e:  # pylint: disable=broad-exception-caught
+      logger.error(
+          'Failed to download the videos for %s: %s', veo_request.image_uri, e
+      )
+      return [], []
+    logger.info(
+        'Successfully generated %d video(s) for item: %s',
+        len(generated_videos),
+        veo_request.image_uri,
+    )
+    return generated_videos, moves
+
+  downloads = [None] * len(items_to_process)
+  with (
+      concurrent.futures.ThreadPoolExecutor(
+          settings.veo_max_workers
+      ) as start_executor,
+      concurrent.futures.ThreadPoolExecutor(
+          settings.veo_max_workers
+      ) as download_executor,
+  ):
+    starts = {
+        start_executor.submit(start_item, item_data): i
+        for i, item_data in enumerate(items_to_process)
+    }
+    started_items = [None] * len(items_to_process)
+    operations_by_future = {}
+    pending = set(starts)
+    while pending:
+      done, pending = concurrent.futures.wait(
+          pending, return_when=concurrent.futures.FIRST_COMPLETED
+      )
+      for future in done:
+        if future in starts:
+          i = starts[future]
+          started_items[i] = future.result()
+          if started_items[i] is not None:
+            operations_by_future[started_items[i][-1]] = i
+            pending.add(started_items[i][-1])
+        else:
+          i = operations_by_future[future]
+          downloads[i] = download_executor.submit(
+              finish_item, items_to_process[i], *started_items[i]
+          )
+  all_generated_videos = []
+  all_moves = []
+  for download in downloads:
+    if download is not None:
+      generated_videos, moves = download.result()
+      all_generated_videos.extend(generated_videos)
+      all_moves.extend(moves)
+  # The samples of the whole batch are moved together, see move_many.
+  _move_generated_videos(all_generated_videos, all_moves)
   logger.info(
       'Finished concurrent video generation. Total videos generated: %d',
       len(all_generated_videos),
@@ -370,6 +636,27 @@ def generate_videos_concurrently(
   return all_generated_videos
 
 
+def _configure_rate_limits(settings: config.AppSettings) -> None:
+  """Sets the budgets of the Veo and Gemini calls from the settings."""
+  ratelimit.configure_rate_limit(
+      ratelimit.PREDICTION,
+      settings.veo_requests_per_minute,
+      settings.veo_max_concurrent_requests,
+  )
+  ratelimit.configure_rate_limit(
+      ratelimit.POLLING, settings.veo_poll_requests_per_minute
+  )
+  ratelimit.configure_rate_limit(
+      ratelimit.GEMINI,
+      settings.gemini_requests_per_minute,
+      settings.gemini_max_concurrent_requests,
+  )
+  ratelimit.configure_retries(
+      max_retries=settings.api_max_retries,
+      max_backoff=settings.api_retry_max_backoff_seconds,
+  )
+
+
 def generate_videos(
     output_uri_path: str,
     resized_image_width: int,
@@ -381,9 +668,9 @@ def generate_videos(
   """Generates videos from images.
 
   This function performs the following steps:
-  1. Resizes input images into landscape and portrait formats.
-  2. Recolors the background of the resized images.
-  3. Generates videos (VEOs) from the recolored images.
+  1. Resizes input images into landscape and portrait formats and recolors
+     their background, in a single pass per image.
+  2. Generates videos (VEOs) from the recolored images.
 
   Args:
       output_uri_path: The GCS URI of the folder where output will be stored.
@@ -397,18 +684,43 @@ def generate_videos(
   Returns:
       A list of dictionaries with information about a selected video.
   """
-  selected_products = utils.process_and_resize_images(
+  config.configure_storage(settings)
+  clients.configure_api_client(settings.api_connection_pool_size)
+  _configure_rate_limits(settings)
+  prepared_image_cache = None
+  if settings.prepared_image_cache_enabled:
+    prepared_image_cache = image_cache.PreparedImageCache(
+        index_path=settings.prepared_image_cache_index_path,
+        manifest_uri=settings.prepared_images_manifest_uri,
+    )
+  selected_products = utils.prepare_product_images(
       settings.images_uri,
       resized_image_width,
       resized_image_height,
       original_background_color,
-      output_uri_path,
-  )
-  utils.recolor_background_and_upload(
-      selected_products,
-      output_uri_path,
-      original_background_color,
       background_color,
+      output_uri_path,
+      max_workers=settings.image_prep_max_workers,
+      color_metric=settings.background_color_metric,
+      color_table_cache_dir=settings.color_table_cache_dir,
+      cache=prepared_image_cache,
+      memory_budget_bytes=settings.image_worker_memory_budget_bytes,
   )
-  output_video_files = generate_videos_concurrently(selected_products, settings)
+  prompt_cache = None
+  if settings.prompt_type == 'GEMINI' and settings.gemini_prompt_cache_enabled:
+    prompt_cache = prompt_cache_lib.PromptCache(
+        index_path=settings.gemini_prompt_cache_index_path,
+        manifest_uri=(
+            settings.gemini_prompts_manifest_uri
+            if settings.gemini_prompt_cache_shared
+            else None
+        ),
+    )
+  try:
+    output_video_files = generate_videos_concurrently(
+        selected_products, settings, prompt_cache
+    )
+  finally:
+    if prompt_cache is not None:
+      prompt_cache.save()
   return output_video_files
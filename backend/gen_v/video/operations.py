@@ -0,0 +1,277 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Polling of long-running operations, such as Veo generation jobs.
+
+A single scheduler thread tracks every outstanding operation and hands the
+polls that are due to a small pool of threads, so thousands of jobs don't
+need a thread each. Operations are polled often at first, then less and less,
+and never earlier than a Retry-After header asks.
+"""
+
+import concurrent.futures
+import contextlib
+import dataclasses
+import datetime
+import email.utils
+import heapq
+import itertools
+import logging
+import sys
+import threading
+import time
+from typing import Any, Callable
+
+import requests
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_INITIAL_INTERVAL_SECONDS = 2.0
+DEFAULT_MAX_INTERVAL_SECONDS = 30.0
+DEFAULT_BACKOFF_FACTOR = 1.5
+DEFAULT_TIMEOUT_SECONDS = 600.0
+DEFAULT_MAX_WORKERS = 4
+
+Operation = dict[str, Any]
+
+
+def get_retry_after(
+    error: requests.exceptions.RequestException,
+) -> float | None:
+  """Returns the seconds a failed request asks to wait before a retry.
+
+  Args:
+    error: The error of the request.
+
+  Returns:
+    The delay from the Retry-After header of the response, given in seconds
+    or as an HTTP date, or None if there is no usable header.
+  """
+  response = getattr(error, "response", None)
+  if response is None:
+    return None
+  retry_after = response.headers.get("Retry-After")
+  if not retry_after:
+    return None
+  try:
+    return max(float(retry_after), 0.0)
+  except ValueError:
+    pass
+  try:
+    retry_at = email.utils.parsedate_to_datetime(retry_after)
+  except (TypeError, ValueError):
+    return None
+  if retry_at.tzinfo is None:
+    retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+  now = datetime.datetime.now(datetime.timezone.utc)
+  return max((retry_at - now).total_seconds(), 0.0)
+
+
+@dataclasses.dataclass(order=True)
+class _PendingOperation:
+  """An operation waiting for its next poll, ordered by when it is due."""
+
+  next_poll_at: float
+  sequence: int
+  name: str = dataclasses.field(compare=False)
+  future: concurrent.futures.Future = dataclasses.field(compare=False)
+  interval: float = dataclasses.field(compare=False)
+  deadline: float = dataclasses.field(compare=False)
+
+
+class OperationPoller:
+  """Polls many long-running operations from one loop.
+
+  Each submitted operation gets a future, resolved with the operation once
+  it is done. Add a callback with add_done_callback to act on completion
+  without waiting for it.
+
+  An operation is polled as soon as it is submitted, then after
+  initial_interval seconds, with the interval growing by backoff_factor up to
+  max_interval after each poll. A failed poll is retried on the same
+  schedule, or after the delay given by its Retry-After header if longer.
+  """
+
+  def __init__(
+      self,
+      fetch: Callable[[str], Operation],
+      initial_interval: float = DEFAULT_INITIAL_INTERVAL_SECONDS,
+      max_interval: float = DEFAULT_MAX_INTERVAL_SECONDS,
+      backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+      timeout: float = DEFAULT_TIMEOUT_SECONDS,
+      max_workers: int = DEFAULT_MAX_WORKERS,
+  ):
+    """Initialises the poller. Its threads start with the first operation.
+
+    Args:
+      fetch: Returns the current state of an operation from its name. The
+        operation is complete once its 'done' field is true.
+      initial_interval: The seconds between the first polls of an operation.
+      max_interval: The longest the interval between polls grows to.
+      backoff_factor: How much the interval grows after each poll.
+      timeout: The seconds after which an operation that isn't done fails
+        with a TimeoutError.
+      max_workers: The maximum number of polls running at once.
+    """
+    self._fetch = fetch
+    self._initial_interval = initial_interval
+    self._max_interval = max_interval
+    self._backoff_factor = backoff_factor
+    self._timeout = timeout
+    self._max_workers = max_workers
+    self._condition = threading.Condition()
+    self._pending = []
+    self._sequence = itertools.count()
+    self._executor = None
+    self._scheduler = None
+    self._closed = False
+
+  def submit(self, operation_name: str) -> concurrent.futures.Future:
+    """Starts tracking an operation.
+
+    Args:
+      operation_name: The name of the operation.
+
+    Returns:
+      A future resolved with the done operation. It fails with a TimeoutError
+      if the operation isn't done within the timeout, or with the error of a
+      poll that can't be retried.
+
+    Raises:
+      RuntimeError: If the poller was closed.
+    """
+    future = concurrent.futures.Future()
+    with self._condition:
+      if self._closed:
+        raise RuntimeError("The operation poller is closed.")
+      if self._scheduler is None:
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            self._max_workers, thread_name_prefix="gen_v_operation_poller"
+        )
+        self._scheduler = threading.Thread(
+            target=self._schedule_polls,
+            name="gen_v_operation_scheduler",
+            daemon=True,
+        )
+        self._scheduler.start()
+      now = time.monotonic()
+      self._push(
+          _PendingOperation(
+              next_poll_at=now,
+              sequence=next(self._sequence),
+              name=operation_name,
+              future=future,
+              interval=self._initial_interval,
+              deadline=now + self._timeout,
+          )
+      )
+    return future
+
+  def close(self) -> None:
+    """Stops polling, cancelling the futures of the outstanding operations."""
+    with self._condition:
+      if self._closed:
+        return
+      self._closed = True
+      pending, self._pending = self._pending, []
+      self._condition.notify()
+    for operation in pending:
+      operation.future.cancel()
+    if self._scheduler is not None:
+      self._scheduler.join()
+      self._executor.shutdown(wait=True)
+
+  def __enter__(self) -> "OperationPoller":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def _push(self, operation: _PendingOperation) -> None:
+    """Queues an operation for its next poll. Needs the condition held."""
+    heapq.heappush(self._pending, operation)
+    self._condition.notify()
+
+  def _schedule_polls(self) -> None:
+    """Hands each operation to the pool when its poll is due, until closed."""
+    while True:
+      with self._condition:
+        while not self._closed:
+          now = time.monotonic()
+          if self._pending and self._pending[0].next_poll_at <= now:
+            break
+          self._condition.wait(
+              self._pending[0].next_poll_at - now if self._pending else None
+          )
+        if self._closed:
+          return
+        due = []
+        while self._pending and self._pending[0].next_poll_at <= now:
+          due.append(heapq.heappop(self._pending))
+      for operation in due:
+        self._executor.submit(self._poll, operation)
+
+  def _poll(self, operation: _PendingOperation) -> None:
+    """Polls an operation, resolving its future or scheduling the next poll."""
+    if operation.future.done():
+      return
+    delay = operation.interval
+    try:
+      result = self._fetch(operation.name)
+    except requests.exceptions.RequestException as e:
+      logger.error("Error while fetching operation %s: %s", operation.name, e)
+      delay = max(delay, get_retry_after(e) or 0.0)
+    # The error is handed to the caller rather than lost in the pool.
+    except Exception as e:  # pylint: disable=broad-exception-caught
+      _resolve(operation.future, error=e)
+      return
+    else:
+      if result.get("done"):
+        _resolve(operation.future, result=result)
+        return
+
+    now = time.monotonic()
+    if now >= operation.deadline:
+      _resolve(
+          operation.future,
+          error=TimeoutError(
+              f"Operation {operation.name} isn't done after"
+              f" {self._timeout} seconds."
+          ),
+      )
+      return
+    operation.next_poll_at = min(now + delay, operation.deadline)
+    operation.interval = min(
+        operation.interval * self._backoff_factor, self._max_interval
+    )
+    with self._condition:
+      if self._closed:
+        operation.future.cancel()
+        return
+      self._push(operation)
+
+
+def _resolve(
+    future: concurrent.futures.Future,
+    result: Operation | None = None,
+    error: Exception | None = None,
+) -> None:
+  """Sets the outcome of a future, unless it was cancelled meanwhile."""
+  with contextlib.suppress(concurrent.futures.InvalidStateError):
+    if error is not None:
+      future.set_exception(error)
+    else:
+      future.set_result(result)
@@ -0,0 +1,341 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Prepared image overlays, such as logos and stickers, and their cache.
+
+The same few overlay images are applied to every video in a batch, so they are
+downloaded, decoded and resized once per process and reused as raster arrays.
+"""
+import collections
+import dataclasses
+import logging
+import sys
+import threading
+
+import moviepy as mp
+from moviepy import tools as mp_tools
+import numpy as np
+
+from gen_v import models
+from gen_v import storage
+from gen_v.utils import image as image_utils
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_DEFAULT_MAX_ENTRIES = 32
+# Fixed-point precision of Pillow's alpha compositing, see AlphaComposite.c.
+_PRECISION_BITS = 7
+
+
+@dataclasses.dataclass(frozen=True)
+class PreparedOverlay:
+  """An overlay image decoded and resized, ready to composite.
+
+  The arrays are read-only, as they are shared by every video using the
+  overlay.
+
+  Attributes:
+    rgb: The colour channels, as a (height, width, 3) uint8 array.
+    alpha: The opacity, as a (height, width) float array in [0, 1].
+    mask: The opacity as MoviePy composites it, as a (height, width) uint8
+      array.
+    premultiplied_rgb: The colour channels multiplied by the mask, as a
+      (height, width, 3) uint32 array.
+  """
+
+  rgb: np.ndarray
+  alpha: np.ndarray
+  mask: np.ndarray
+  premultiplied_rgb: np.ndarray
+
+  @classmethod
+  def from_rgba(cls, rgba: np.ndarray) -> "PreparedOverlay":
+    """Creates a prepared overlay from a (height, width, 4) uint8 array."""
+    rgb = np.ascontiguousarray(rgba[:, :, :3])
+    # Matches the mask MoviePy derives from the alpha channel of an image.
+    alpha = 1.0 * rgba[:, :, 3] / 255
+    mask = _to_composite_mask(alpha)
+    premultiplied_rgb = rgb.astype(np.uint32) * mask[:, :, np.newaxis]
+    for array in (rgb, alpha, mask, premultiplied_rgb):
+      array.flags.writeable = False
+    return cls(rgb, alpha, mask, premultiplied_rgb)
+
+  @property
+  def size(self) -> tuple[int, int]:
+    """The (width, height) of the overlay in pixels."""
+    return self.rgb.shape[1], self.rgb.shape[0]
+
+  def to_clip(self) -> mp.ImageClip:
+    """Returns an image clip of the overlay with its alpha as the mask."""
+    return mp.ImageClip(self.rgb).with_mask(
+        mp.ImageClip(self.alpha, is_mask=True)
+    )
+
+
+def _to_composite_mask(alpha: np.ndarray) -> np.ndarray:
+  """Converts a float mask to uint8 the way MoviePy does when compositing."""
+  return (alpha * 255).astype(np.uint8)
+
+
+def prepare_overlay(image_bytes: bytes, height: int | None) -> PreparedOverlay:
+  """Decodes an overlay image and resizes it to a height.
+
+  Args:
+    image_bytes: The encoded image.
+    height: The height to resize the overlay to, keeping its aspect ratio. If
+      not set (or 0), the overlay keeps its original size.
+
+  Returns:
+    The prepared overlay.
+  """
+  with image_utils.open_image(image_bytes) as image:
+    if image.mode != "RGB":
+      # Palette and greyscale images would otherwise be resized without
+      # antialiasing.
+      image = image.convert("RGBA")
+    if height:
+      # RGB images are rescaled from their bytes, so JPEGs can be drafted.
+      image = image_utils.rescale_image_height(
+          image_bytes if image.mode == "RGB" else image, height
+      )
+    rgba = np.asarray(image.convert("RGBA"))
+  return PreparedOverlay.from_rgba(rgba)
+
+
+class OverlayAssetCache:
+  """A thread-safe, in-memory cache of prepared overlays.
+
+  Overlays are keyed by their URI, the fingerprint of their content and the
+  target height, so a replaced asset is prepared again. Only the file
+  metadata is fetched on a hit, or nothing if the caller already has the
+  fingerprint. Concurrent requests for the same overlay prepare it once.
+
+  Attributes:
+    hits: The number of lookups served from the cache.
+    misses: The number of lookups that prepared the overlay.
+  """
+
+  def __init__(self, max_entries: int = _DEFAULT_MAX_ENTRIES):
+    """Initialises the cache.
+
+    Args:
+      max_entries: The number of overlays to keep, least recently used first
+        out.
+    """
+    self._max_entries = max_entries
+    self._overlays = collections.OrderedDict()
+    self._key_locks = {}
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(
+      self, image_input: models.ImageInput, fingerprint: str | None = None
+  ) -> PreparedOverlay:
+    """Returns the prepared overlay for an image input.
+
+    Args:
+      image_input: The overlay, with the URI of the image and its height.
+      fingerprint: (Optional) The fingerprint of the image, see
+        storage.get_blob_fingerprint. Fetched if not given.
+
+    Returns:
+      The prepared overlay.
+
+    Raises:
+      FileNotFoundError: If the overlay image does not exist.
+    """
+    fingerprint = fingerprint or storage.get_blob_fingerprint(image_input.path)
+    key = (image_input.path, fingerprint, image_input.height or 0)
+    with self._lock:
+      key_lock = self._key_locks.setdefault(key, threading.Lock())
+    try:
+      with key_lock:
+        with self._lock:
+          overlay = self._overlays.get(key)
+          if overlay is not None:
+            self._overlays.move_to_end(key)
+            self.hits += 1
+            return overlay
+        overlay = prepare_overlay(
+            storage.download_bytes(image_input.path, use_cache=True),
+            image_input.height,
+        )
+        with self._lock:
+          self.misses += 1
+          self._overlays[key] = overlay
+          while len(self._overlays) > self._max_entries:
+            self._overlays.popitem(last=False)
+    finally:
+      # Later lookups find the overlay in the cache, or prepare it again if
+      # this one failed, so the lock is only kept while it is in use.
+      with self._lock:
+        if self._key_locks.get(key) is key_lock:
+          del self._key_locks[key]
+    logger.info("Prepared overlay %s at %s", image_input.path, overlay.size)
+    return overlay
+
+  def clear(self) -> None:
+    """Removes all prepared overlays."""
+    with self._lock:
+      self._overlays.clear()
+      self._key_locks.clear()
+
+
+_default_cache = OverlayAssetCache()
+
+
+def get_default_overlay_cache() -> OverlayAssetCache:
+  """Returns the overlay cache shared by the current process."""
+  return _default_cache
+
+
+def blend_overlay(
+    frame: np.ndarray,
+    overlay: PreparedOverlay,
+    position: tuple[int, int],
+    mask: np.ndarray | None = None,
+) -> None:
+  """Alpha blends an overlay onto an opaque frame, in place.
+
+  Only the region of the frame covered by the overlay is read and written.
+  The result is identical to Pillow's alpha compositing, which MoviePy uses
+  to composite clips.
+
+  Args:
+    frame: The (height, width, 3) uint8 frame to draw on.
+    overlay: The overlay to draw.
+    position: The (x, y) of the top left corner of the overlay on the frame.
+      The overlay is clipped to the frame.
+    mask: (Optional) A (height, width) uint8 mask to use instead of the
+      overlay's own, such as a faded one.
+  """
+  frame_height, frame_width = frame.shape[:2]
+  overlay_width, overlay_height = overlay.size
+  x, y = position
+  left, top = max(x, 0), max(y, 0)
+  right = min(x + overlay_width, frame_width)
+  bottom = min(y + overlay_height, frame_height)
+  if left >= right or top >= bottom:
+    return
+  overlay_region = (
+      slice(top - y, bottom - y),
+      slice(left - x, right - x),
+  )
+  if mask is None:
+    mask = overlay.mask[overlay_region].astype(np.uint32)
+    premultiplied_rgb = overlay.premultiplied_rgb[overlay_region]
+  else:
+    mask = mask[overlay_region].astype(np.uint32)
+    premultiplied_rgb = overlay.rgb[overlay_region] * mask[..., np.newaxis]
+  roi = frame[top:bottom, left:right]
+  blended = premultiplied_rgb + roi * (255 - mask)[..., np.newaxis]
+  blended <<= _PRECISION_BITS
+  blended += 0x80 << _PRECISION_BITS
+  blended = (((blended >> 8) + blended) >> 8) >> _PRECISION_BITS
+  roi[...] = blended
+
+
+def get_fade_mask(
+    overlay: PreparedOverlay,
+    clip_time: float,
+    duration: float,
+    fade_duration: float,
+) -> np.ndarray | None:
+  """Returns the overlay mask faded in and out, as MoviePy's cross fades do.
+
+  Args:
+    overlay: The overlay.
+    clip_time: The time since the start of the overlay, in seconds.
+    duration: How long the overlay is shown, in seconds.
+    fade_duration: How long the fade in and fade out last, in seconds.
+
+  Returns:
+    The faded uint8 mask, or None outside of the fades.
+  """
+  alpha = overlay.alpha
+  fading = False
+  if clip_time < fade_duration:
+    alpha = 1.0 * clip_time / fade_duration * alpha
+    fading = True
+  if duration - clip_time < fade_duration:
+    alpha = 1.0 * (duration - clip_time) / fade_duration * alpha
+    fading = True
+  return _to_composite_mask(alpha) if fading else None
+
+
+@dataclasses.dataclass(frozen=True)
+class OverlayPlacement:
+  """An overlay shown on a video for a period of time.
+
+  Attributes:
+    overlay: The prepared overlay.
+    start: When the overlay appears, in seconds.
+    duration: How long the overlay is shown, in seconds.
+    position: The position of the overlay, as given to MoviePy's
+      with_position.
+    fade_duration: How long the fade in and fade out last, in seconds.
+  """
+
+  overlay: PreparedOverlay
+  start: float
+  duration: float
+  position: tuple[str | int, str | int]
+  fade_duration: float = 1
+
+  def is_showing(self, time: float) -> bool:
+    """Returns whether the overlay is on screen at a time in the video."""
+    return self.start <= time < self.start + self.duration
+
+
+def composite_overlays(
+    video_clip: mp.VideoClip, placements: list[OverlayPlacement]
+) -> mp.VideoClip:
+  """Draws overlays on a video, blending only the regions they cover.
+
+  This gives the same frames as compositing each overlay clip, with cross
+  fades, on the video in a CompositeVideoClip, without blending whole frames.
+
+  Args:
+    video_clip: The opaque video to draw on.
+    placements: The overlays, drawn in order.
+
+  Returns:
+    The video clip with the overlays.
+  """
+  frame_size = tuple(video_clip.size)
+  positions = [
+      mp_tools.compute_position(
+          placement.overlay.size, frame_size, placement.position
+      )
+      for placement in placements
+  ]
+
+  def draw_overlays(get_frame, time):
+    frame = np.array(get_frame(time), dtype=np.uint8)
+    for placement, position in zip(placements, positions):
+      if placement.is_showing(time):
+        clip_time = time - placement.start
+        mask = get_fade_mask(
+            placement.overlay,
+            clip_time,
+            placement.duration,
+            placement.fade_duration,
+        )
+        blend_overlay(frame, placement.overlay, position, mask)
+    return frame
+
+  return video_clip.transform(draw_overlays)
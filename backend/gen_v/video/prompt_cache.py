@@ -0,0 +1,61 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Content-addressed cache of the video prompts generated by Gemini.
+
+Entries map a hash of the image content, the prompt text, the model name and
+the media resolution to the prompt Gemini generated from them, so a campaign
+run again on unchanged images reuses its prompts instead of asking Gemini.
+"""
+
+import hashlib
+
+from gen_v import models
+from gen_v.utils import image_cache
+
+
+def make_prompt_cache_key(
+    request_data: models.GeminiPromptRequest, media_resolution: str
+) -> str:
+  """Builds the cache key of a Gemini prompt request.
+
+  Args:
+    request_data: The request, with the image bytes loaded if it has an
+      image.
+    media_resolution: The resolution the image is sent to Gemini at.
+
+  Returns:
+    A hex SHA-256 digest identifying the generated prompt.
+  """
+  image_hash = hashlib.sha256(request_data.image_bytes or b"").hexdigest()
+  return image_cache.make_cache_key(
+      f"sha256:{image_hash}",
+      prompt_text=request_data.prompt_text,
+      model_name=request_data.model_name,
+      media_resolution=media_resolution,
+  )
+
+
+class PromptCache(image_cache.ManifestCache):
+  """A cache index of Gemini prompts, stored locally and/or on GCS."""
+
+  name = "Gemini prompt cache"
+
+  def get_prompt(self, key: str) -> str | None:
+    """Returns the prompt cached for a key, or None if it isn't cached."""
+    entry = self.get(key)
+    return entry["prompt"] if entry else None
+
+  def put_prompt(self, key: str, prompt: str) -> None:
+    """Caches the prompt for a key. Call save() to persist it."""
+    self.put(key, {"prompt": prompt})
@@ -0,0 +1,305 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Keeps the calls to Vertex AI within their quotas.
+
+Veo predictions, operation polls and Gemini prompts each have a budget: a
+token bucket spacing the calls to a number of requests per minute, and a
+bound on the calls in flight. A call rejected with a 429 or 503 is retried
+after a jittered, exponentially growing delay, or the Retry-After delay if
+longer, and holds back the other calls of its budget meanwhile, so a large
+batch settles at the throughput its quota allows instead of failing items.
+"""
+
+import dataclasses
+import itertools
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Callable, TypeVar
+
+from google.genai import errors as genai_errors
+import requests
+
+from gen_v.video import operations
+
+
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+PREDICTION = "prediction"
+POLLING = "polling"
+GEMINI = "gemini"
+
+# The status codes of the calls rejected for quota or overload, worth retrying.
+RETRYABLE_STATUS_CODES = frozenset({429, 503})
+
+_T = TypeVar("_T")
+
+
+class RateLimiter:
+  """Admits calls at a steady rate, with a bound on the calls in flight.
+
+  Use it as a context manager around each call:
+
+    with limiter:
+      send_request()
+
+  Entering blocks until a token of the bucket is available and, if
+  max_concurrent is set, until fewer than max_concurrent calls are in flight.
+  Callers are admitted in the order they arrive. It is safe to use from
+  several threads.
+  """
+
+  def __init__(
+      self,
+      requests_per_minute: float,
+      max_concurrent: int | None = None,
+      burst: int = 1,
+  ):
+    """Initialises the limiter.
+
+    Args:
+      requests_per_minute: The sustained rate at which calls are admitted.
+      max_concurrent: (Optional) The maximum number of calls in flight.
+        Defaults to no bound.
+      burst: The number of calls admitted at once after an idle period.
+
+    Raises:
+      ValueError: If a limit isn't positive.
+    """
+    if requests_per_minute <= 0 or burst < 1:
+      raise ValueError(
+          "requests_per_minute and burst must be positive, got"
+          f" {requests_per_minute} and {burst}"
+      )
+    if max_concurrent is not None and max_concurrent < 1:
+      raise ValueError(
+          f"max_concurrent must be at least 1, got {max_concurrent}"
+      )
+    self.requests_per_minute = requests_per_minute
+    self.max_concurrent = max_concurrent
+    self._interval = 60 / requests_per_minute
+    self._burst_allowance = (burst - 1) * self._interval
+    self._lock = threading.Lock()
+    # When the next call would be admitted if the bucket were always empty.
+    self._next_admission = time.monotonic()
+    self._slots = (
+        threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+    )
+
+  def acquire(self) -> None:
+    """Waits until a call can be made, and counts it as in flight."""
+    if self._slots is not None:
+      self._slots.acquire()
+    with self._lock:
+      now = time.monotonic()
+      admission = max(self._next_admission, now)
+      self._next_admission = admission + self._interval
+    delay = admission - self._burst_allowance - now
+    if delay > 0:
+      time.sleep(delay)
+
+  def release(self) -> None:
+    """Marks a call as no longer in flight."""
+    if self._slots is not None:
+      self._slots.release()
+
+  def back_off(self, delay: float) -> None:
+    """Admits no new call for the next delay seconds."""
+    with self._lock:
+      self._next_admission = max(
+          self._next_admission,
+          time.monotonic() + delay + self._burst_allowance,
+      )
+
+  def __enter__(self) -> "RateLimiter":
+    self.acquire()
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.release()
+
+
+@dataclasses.dataclass(frozen=True)
+class RetrySettings:
+  """How calls rejected for quota or overload are retried.
+
+  Attributes:
+    max_retries: The number of retries before the error is raised.
+    initial_backoff: The longest delay before the first retry, in seconds.
+    max_backoff: The longest delay before any retry, in seconds.
+  """
+
+  max_retries: int = 5
+  initial_backoff: float = 1.0
+  max_backoff: float = 60.0
+
+
+# The requests per minute and calls in flight of each budget by default.
+_DEFAULT_LIMITS = {
+    PREDICTION: (10, 4),
+    POLLING: (300, None),
+    GEMINI: (60, 8),
+}
+
+_lock = threading.Lock()
+_limiters = {
+    budget: RateLimiter(*limits) for budget, limits in _DEFAULT_LIMITS.items()
+}
+_retry_settings = RetrySettings()
+
+
+def get_rate_limiter(budget: str) -> RateLimiter:
+  """Returns the limiter of a budget: PREDICTION, POLLING or GEMINI."""
+  with _lock:
+    return _limiters[budget]
+
+
+def configure_rate_limit(
+    budget: str,
+    requests_per_minute: float,
+    max_concurrent: int | None = None,
+) -> None:
+  """Sets the limits of a budget.
+
+  The limiter of the budget is replaced only if its limits change, so calls
+  already waiting on it keep their place.
+
+  Args:
+    budget: The budget to configure: PREDICTION, POLLING or GEMINI.
+    requests_per_minute: The sustained rate at which calls are admitted.
+    max_concurrent: (Optional) The maximum number of calls in flight.
+
+  Raises:
+    KeyError: If the budget is unknown.
+    ValueError: If a limit isn't positive.
+  """
+  with _lock:
+    limiter = _limiters[budget]
+    if (
+        limiter.requests_per_minute != requests_per_minute
+        or limiter.max_concurrent != max_concurrent
+    ):
+      _limiters[budget] = RateLimiter(requests_per_minute, max_concurrent)
+
+
+def configure_retries(
+    max_retries: int = RetrySettings.max_retries,
+    initial_backoff: float = RetrySettings.initial_backoff,
+    max_backoff: float = RetrySettings.max_backoff,
+) -> None:
+  """Sets how calls rejected for quota or overload are retried.
+
+  Args:
+    max_retries: The number of retries before the error is raised.
+    initial_backoff: The longest delay before the first retry, in seconds.
+    max_backoff: The longest delay before any retry, in seconds.
+
+  Raises:
+    ValueError: If max_retries is negative or a backoff isn't positive.
+  """
+  global _retry_settings
+  if max_retries < 0 or initial_backoff <= 0 or max_backoff <= 0:
+    raise ValueError(
+        "max_retries can't be negative and the backoffs must be positive, got"
+        f" {max_retries}, {initial_backoff} and {max_backoff}"
+    )
+  with _lock:
+    _retry_settings = RetrySettings(max_retries, initial_backoff, max_backoff)
+
+
+def get_retry_settings() -> RetrySettings:
+  """Returns how calls rejected for quota or overload are retried."""
+  return _retry_settings
+
+
+def reset_rate_limits() -> None:
+  """Restores the default limits of every budget and the default retries."""
+  global _retry_settings
+  with _lock:
+    for budget, limits in _DEFAULT_LIMITS.items():
+      _limiters[budget] = RateLimiter(*limits)
+    _retry_settings = RetrySettings()
+
+
+def get_status_code(error: Exception) -> int | None:
+  """Returns the HTTP status code of a failed call, if known."""
+  if isinstance(error, genai_errors.APIError):
+    return error.code
+  response = getattr(error, "response", None)
+  return getattr(response, "status_code", None)
+
+
+def is_retryable(error: Exception) -> bool:
+  """Whether a call failed for quota or overload, and is worth retrying."""
+  return get_status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def _get_backoff(attempt: int, settings: RetrySettings) -> float:
+  """Returns a delay with full jitter, growing exponentially per attempt."""
+  return random.uniform(
+      0, min(settings.max_backoff, settings.initial_backoff * 2**attempt)
+  )
+
+
+def call_with_retries(
+    budget: str,
+    func: Callable[[], _T],
+    max_retries: int | None = None,
+) -> _T:
+  """Makes a call within a budget, retrying it if rejected for quota.
+
+  Args:
+    budget: The budget the call counts against: PREDICTION, POLLING or
+      GEMINI.
+    func: Makes the call. It raises a requests HTTPError or a Gen AI
+      APIError if the call fails.
+    max_retries: (Optional) The number of retries before the error is raised.
+      Defaults to the configured setting. With 0, a rejected call still holds
+      back the budget, but is left to the caller to retry.
+
+  Returns:
+    The result of the call.
+
+  Raises:
+    The error of the call if it can't be retried, or still fails after the
+    retries.
+  """
+  settings = get_retry_settings()
+  if max_retries is None:
+    max_retries = settings.max_retries
+  for attempt in itertools.count():
+    limiter = get_rate_limiter(budget)
+    try:
+      with limiter:
+        return func()
+    except (requests.exceptions.HTTPError, genai_errors.APIError) as e:
+      if not is_retryable(e):
+        raise
+      delay = max(
+          _get_backoff(attempt, settings), operations.get_retry_after(e) or 0.0
+      )
+      limiter.back_off(delay)
+      if attempt >= max_retries:
+        raise
+      logger.warning(
+          "The %s call was rejected (%s), retrying in %.1f seconds.",
+          budget,
+          get_status_code(e),
+          delay,
+      )
+    time.sleep(delay)
@@ -13,6 +13,7 @@
 # limitations under the License.
 """Tests for the config file."""
 from unittest import mock
+from gen_v import config
 
 
 def test_images_uri(mock_app_settings):
@@ -24,6 +25,25 @@ def test_images_uri(mock_app_settings):
     assert mock_app_settings.images_uri == expected_uri
 
 
+def test_prepared_images_manifest_uri(mock_app_settings):
+  """Tests the prepared_images_manifest_uri computed field."""
+  expected_uri = 'gs://my-bucket/my-folder/prepared-images-manifest.json'
+  assert mock_app_settings.prepared_images_manifest_uri == expected_uri
+
+
+def test_gemini_prompts_manifest_uri(mock_app_settings):
+  """Tests the gemini_prompts_manifest_uri computed field."""
+  expected_uri = 'gs://my-bucket/my-folder/gemini-prompts-manifest.json'
+  assert mock_app_settings.gemini_prompts_manifest_uri == expected_uri
+
+
+def test_image_worker_memory_budget_bytes(mock_app_settings):
+  """Tests the image worker memory budget is converted to bytes."""
+  assert mock_app_settings.image_worker_memory_budget_bytes is None
+  mock_app_settings.image_worker_memory_budget_mb = 2
+  assert mock_app_settings.image_worker_memory_budget_bytes == 2 * 1024 * 1024
+
+
 def test_intros_outros_uri(mock_app_settings):
   """Tests the intros_outros_uri computed field."""
   expected_uri = 'my-bucket/my-folder/input-videos/'
@@ -104,3 +124,21 @@ def test_output_file_prefix_portrait(mock_app_settings):
   settings = mock_app_settings
   settings.video_orientation = 'PORTRAIT'
   assert settings.output_file_prefix == 'video-portrait'
+
+
+@mock.patch('gen_v.config.storage', autospec=True)
+def test_configure_storage(mock_storage, mock_app_settings):
+  """Tests the storage settings are applied, with sizes in bytes."""
+  mock_app_settings.blob_cache_dir = '/tmp/cache'
+  mock_app_settings.blob_cache_max_mb = 3
+
+  config.configure_storage(mock_app_settings)
+
+  mock_storage.configure_storage_client.assert_called_once_with(32)
+  mock_storage.configure_blob_cache.assert_called_once_with(
+      cache_dir='/tmp/cache',
+      max_bytes=3 * 1024 * 1024,
+      metadata_ttl_seconds=0,
+  )
+  mock_storage.configure_chunked_transfers.assert_called_once()
+  mock_storage.configure_prefetching.assert_called_once()
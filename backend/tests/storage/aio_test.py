@@ -0,0 +1,197 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the asyncio storage facade."""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+from unittest import mock
+
+from google.auth import credentials
+import httpx
+from gen_v import storage
+from gen_v.storage import aio
+from gen_v.storage import gcs_aio
+import pytest
+
+
+@pytest.fixture(name='memory_backend', autouse=True)
+def fixture_memory_backend():
+  backend = storage.get_backend('mem://')
+  yield backend
+  backend.clear()
+
+
+def test_bytes_round_trip():
+  async def run():
+    async with storage.AsyncStorage(max_workers=4) as aio_storage:
+      await aio_storage.upload_bytes(b'logo', 'mem://b/logo.png')
+      return (
+          await aio_storage.download_bytes('mem://b/logo.png'),
+          await aio_storage.get_fingerprint('mem://b/logo.png'),
+      )
+
+  data, fingerprint = asyncio.run(run())
+
+  assert data == b'logo'
+  assert fingerprint == storage.get_blob_fingerprint('mem://b/logo.png')
+
+
+def test_calls_are_bounded_by_workers(memory_backend):
+  in_flight = 0
+  max_in_flight = 0
+  lock = threading.Lock()
+  read_bytes = memory_backend.read_bytes
+
+  def slow_read_bytes(uri):
+    nonlocal in_flight, max_in_flight
+    with lock:
+      in_flight += 1
+      max_in_flight = max(max_in_flight, in_flight)
+    time.sleep(0.01)
+    with lock:
+      in_flight -= 1
+    return read_bytes(uri)
+
+  storage.upload_bytes(b'x', 'mem://b/a.png')
+  memory_backend.read_bytes = slow_read_bytes
+
+  async def run():
+    async with storage.AsyncStorage(max_workers=3) as aio_storage:
+      return await asyncio.gather(
+          *(aio_storage.download_bytes('mem://b/a.png') for _ in range(20))
+      )
+
+  try:
+    contents = asyncio.run(run())
+  finally:
+    del memory_backend.read_bytes
+
+  assert contents == [b'x'] * 20
+  assert max_in_flight == 3
+
+
+def test_list_files_in_batches(monkeypatch):
+  monkeypatch.setattr(aio, '_LIST_BATCH_SIZE', 2)
+  for name in ['a.png', 'b.png', 'c.png', 'd.png', 'e.txt']:
+    storage.upload_bytes(b'x', f'mem://b/img/{name}')
+
+  async def run():
+    async with storage.AsyncStorage() as aio_storage:
+      return [
+          uri
+          async for uri in aio_storage.list_files(
+              'mem://b/img/', extensions=['.png']
+          )
+      ]
+
+  assert asyncio.run(run()) == [
+      'mem://b/img/a.png',
+      'mem://b/img/b.png',
+      'mem://b/img/c.png',
+      'mem://b/img/d.png',
+  ]
+
+
+def test_download_and_upload_many(tmp_path):
+  storage.upload_bytes(b'a', 'mem://b/a.png')
+  (tmp_path / 'up.png').write_bytes(b'up')
+
+  async def run():
+    async with storage.AsyncStorage() as aio_storage:
+      downloads = await aio_storage.download_many(
+          ['mem://b/a.png', 'mem://b/missing.png'], str(tmp_path)
+      )
+      uploads = await aio_storage.upload_many(
+          [(str(tmp_path / 'up.png'), 'mem://b/up.png')]
+      )
+      return downloads, uploads
+
+  downloads, uploads = asyncio.run(run())
+
+  assert [result.succeeded for result in downloads] == [True, False]
+  assert isinstance(downloads[1].error, FileNotFoundError)
+  assert (tmp_path / 'a.png').read_bytes() == b'a'
+  assert uploads[0].succeeded
+  assert storage.download_bytes('mem://b/up.png') == b'up'
+  assert (tmp_path / 'up.png').exists()
+
+
+def test_move_many():
+  storage.upload_bytes(b'video', 'mem://b/veo/1/sample_0.mp4')
+
+  async def run():
+    async with storage.AsyncStorage() as aio_storage:
+      return await aio_storage.move_many([
+          ('mem://b/veo/1/sample_0.mp4', 'mem://b/veo/p/sample_0.mp4'),
+          ('mem://b/veo/1/missing.mp4', 'mem://b/veo/p/missing.mp4'),
+      ])
+
+  results = asyncio.run(run())
+
+  assert [result.succeeded for result in results] == [True, False]
+  assert storage.download_bytes('mem://b/veo/p/sample_0.mp4') == b'video'
+  with pytest.raises(FileNotFoundError):
+    storage.download_bytes('mem://b/veo/1/sample_0.mp4')
+
+
+def test_move_many_across_schemes_raises():
+  async def run():
+    async with storage.AsyncStorage() as aio_storage:
+      await aio_storage.move_many([('mem://b/a.mp4', 'gs://b/a.mp4')])
+
+  with pytest.raises(ValueError):
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize('kwargs', [{'max_concurrency': 0}, {'max_workers': 0}])
+def test_invalid_limits(kwargs):
+  with pytest.raises(ValueError):
+    storage.AsyncStorage(**kwargs)
+
+
+def test_gcs_downloads_are_made_without_threads():
+  in_flight = 0
+  max_in_flight = 0
+
+  async def handle(request):
+    nonlocal in_flight, max_in_flight
+    in_flight += 1
+    max_in_flight = max(max_in_flight, in_flight)
+    await asyncio.sleep(0.01)
+    in_flight -= 1
+    return httpx.Response(200, content=request.url.path.encode())
+
+  executor = mock.Mock(spec=concurrent.futures.ThreadPoolExecutor)
+
+  async def run():
+    gcs_client = gcs_aio.AsyncGcsClient(
+        credentials=credentials.AnonymousCredentials(),
+        transport=httpx.MockTransport(handle),
+    )
+    async with storage.AsyncStorage(
+        max_concurrency=50, executor=executor, gcs_client=gcs_client
+    ) as aio_storage:
+      contents = await asyncio.gather(
+          *(aio_storage.download_bytes('gs://b/logo.png') for _ in range(200))
+      )
+    await gcs_client.aclose()
+    return contents
+
+  contents = asyncio.run(run())
+
+  assert contents == [b'/storage/v1/b/b/o/logo.png'] * 200
+  assert max_in_flight == 50
+  executor.submit.assert_not_called()
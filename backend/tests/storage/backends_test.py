@@ -0,0 +1,192 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the storage backends."""
+
+import base64
+import hashlib
+from unittest import mock
+
+from gen_v import storage
+from gen_v.storage import backends
+from google.cloud import storage as gcp_storage
+import pytest
+
+
+@pytest.fixture(name='memory_backend')
+def fixture_memory_backend():
+  backend = storage.get_backend('mem://')
+  yield backend
+  backend.clear()
+
+
+@pytest.fixture(name='local_root')
+def fixture_local_root(tmp_path):
+  return f'file://{tmp_path}'
+
+
+def test_get_backend_by_scheme():
+  assert isinstance(storage.get_backend('gs://b/a.png'), storage.GcsBackend)
+  assert isinstance(storage.get_backend('b/a.png'), storage.GcsBackend)
+  assert isinstance(storage.get_backend('file:///a.png'), storage.LocalBackend)
+  assert isinstance(storage.get_backend('mem://b/a.png'), storage.MemoryBackend)
+  with pytest.raises(ValueError):
+    storage.get_backend('s3://b/a.png')
+
+
+def test_get_backend_with_storage_client():
+  storage_client = mock.MagicMock(spec=gcp_storage.Client)
+
+  backend = storage.get_backend('gs://b/a.png', storage_client)
+
+  assert backend.storage_client is storage_client
+  assert isinstance(
+      storage.get_backend('mem://b/a.png', storage_client),
+      storage.MemoryBackend,
+  )
+
+
+def test_register_backend():
+  backend = storage.MemoryBackend()
+  storage.register_backend('scratch', backend)
+  try:
+    storage.upload_bytes(b'data', 'scratch://b/a.bin')
+    assert backend.read_bytes('scratch://b/a.bin') == b'data'
+  finally:
+    with backends._lock:  # pylint: disable=protected-access
+      del backends._backends['scratch']  # pylint: disable=protected-access
+
+
+def test_to_uri():
+  assert storage.to_uri('b/folder') == 'gs://b/folder'
+  assert storage.to_uri('mem://b/folder') == 'mem://b/folder'
+
+
+def test_memory_backend_round_trip(memory_backend):
+  storage.upload_bytes(b'logo', 'mem://b/logo.png')
+  with storage.open_write('mem://b/video.mp4') as f:
+    f.write(b'video')
+
+  assert storage.download_bytes('mem://b/logo.png') == b'logo'
+  with storage.open_read('mem://b/video.mp4') as f:
+    assert f.read() == b'video'
+  memory_backend.delete('mem://b/logo.png')
+  with pytest.raises(FileNotFoundError):
+    storage.download_bytes('mem://b/logo.png')
+
+
+def test_downloads_through_blob_cache(memory_backend, tmp_path):
+  storage.upload_bytes(b'logo', 'mem://b/logo.png')
+  storage.upload_bytes(b'intro', 'mem://b/intro.mp4')
+
+  with mock.patch.object(
+      memory_backend, 'download_file', wraps=memory_backend.download_file
+  ) as mock_download_file:
+    assert storage.download_bytes('mem://b/logo.png', use_cache=True) == b'logo'
+    storage.download_many(
+        ['mem://b/intro.mp4'], destination_dir=str(tmp_path), use_cache=True
+    )
+
+  assert (tmp_path / 'intro.mp4').read_bytes() == b'intro'
+  for call in mock_download_file.call_args_list:
+    assert call.kwargs == {'use_cache': True}
+  assert mock_download_file.call_count == 2
+
+
+@pytest.mark.usefixtures('memory_backend')
+def test_fingerprints_match_across_backends(local_root):
+  storage.upload_bytes(b'same', 'mem://b/a.png')
+  storage.upload_bytes(b'same', f'{local_root}/a.png')
+  md5 = base64.b64encode(hashlib.md5(b'same').digest()).decode('utf-8')
+
+  assert storage.get_blob_fingerprint('mem://b/a.png') == f'md5:{md5}'
+  assert storage.get_blob_fingerprint(f'{local_root}/a.png') == f'md5:{md5}'
+  assert list(storage.iter_file_fingerprints_in_gcs_folder('mem://b/')) == [
+      ('mem://b/a.png', f'md5:{md5}')
+  ]
+
+
+@pytest.mark.parametrize(
+    'kwargs, expected_paths',
+    [
+        ({}, ['img/a.png', 'img/b.jpg', 'img/sub/c.png']),
+        ({'recursive': False}, ['img/a.png', 'img/b.jpg']),
+        ({'extensions': ['.png']}, ['img/a.png', 'img/sub/c.png']),
+        ({'match_glob': 'img/*.png'}, ['img/a.png']),
+        (
+            {'match_glob': 'img/**.{png,jpg}'},
+            [
+                'img/a.png',
+                'img/b.jpg',
+                'img/sub/c.png',
+            ],
+        ),
+    ],
+)
+@pytest.mark.usefixtures('memory_backend')
+def test_list_files_memory_and_local(local_root, kwargs, expected_paths):
+  local_path = local_root[len('file:///') :]
+  for path in ['img/a.png', 'img/b.jpg', 'img/sub/c.png', 'img/README']:
+    storage.upload_bytes(b'x', f'mem://b/{path}')
+    storage.upload_bytes(b'x', f'{local_root}/{path}')
+  local_kwargs = dict(kwargs)
+  if 'match_glob' in kwargs:
+    local_kwargs['match_glob'] = f"{local_path}/{kwargs['match_glob']}"
+
+  memory_uris = list(storage.iter_files_in_gcs_folder('mem://b/img/', **kwargs))
+  local_uris = list(
+      storage.iter_files_in_gcs_folder(f'{local_root}/img/', **local_kwargs)
+  )
+
+  assert memory_uris == [f'mem://b/{path}' for path in expected_paths]
+  assert local_uris == [f'{local_root}/{path}' for path in expected_paths]
+
+
+def test_local_backend_files(local_root, tmp_path):
+  local_file = tmp_path / 'upload.txt'
+  local_file.write_text('content')
+
+  storage.upload_file_to_gcs(str(local_file), f'{local_root}/out/a.txt')
+  downloaded = storage.download_file_locally(
+      f'{local_root}/out/a.txt', tmp_string=str(tmp_path)
+  )
+
+  assert not local_file.exists()
+  assert downloaded == f'{tmp_path}/a.txt'
+  assert (tmp_path / 'a.txt').read_text() == 'content'
+
+
+def test_local_backend_rejects_relative_uris():
+  with pytest.raises(ValueError):
+    storage.download_bytes('file://relative/a.png')
+
+
+@pytest.mark.usefixtures('memory_backend')
+def test_move_many_in_memory():
+  storage.upload_bytes(b'video', 'mem://b/veo/1/sample_0.mp4')
+
+  results = storage.move_many([
+      ('mem://b/veo/1/sample_0.mp4', 'mem://b/veo/p/sample_0.mp4'),
+      ('mem://b/veo/1/missing.mp4', 'mem://b/veo/p/missing.mp4'),
+  ])
+
+  assert [result.succeeded for result in results] == [True, False]
+  assert isinstance(results[1].error, FileNotFoundError)
+  assert storage.download_bytes('mem://b/veo/p/sample_0.mp4') == b'video'
+  with pytest.raises(FileNotFoundError):
+    storage.download_bytes('mem://b/veo/1/sample_0.mp4')
+
+
+def test_move_many_across_schemes_raises():
+  with pytest.raises(ValueError):
+    storage.move_many([('mem://b/a.mp4', 'gs://b/a.mp4')])
@@ -0,0 +1,156 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the local blob cache."""
+import concurrent.futures
+import os
+from unittest import mock
+from google.api_core import exceptions as api_core_exceptions
+import pytest
+from gen_v.storage import cache
+
+
+class _FakeBlob:
+  """A blob whose content depends on the current generation of the bucket."""
+
+  def __init__(self, bucket, name, generation=None):
+    self.bucket = bucket
+    self.name = name
+    self.generation = generation
+    self.reload = mock.MagicMock(side_effect=self._reload)
+
+  def _reload(self, client=None):
+    del client
+    self.generation = self.bucket.generation
+
+
+class _FakeBucket:
+
+  def __init__(self):
+    self.name = 'bucket'
+    self.generation = 1
+
+  def blob(self, name, generation=None):
+    return _FakeBlob(self, name, generation)
+
+
+@pytest.fixture(name='mock_download')
+def fixture_mock_download():
+  def download(blob, file_path):
+    if blob.generation != blob.bucket.generation:
+      raise api_core_exceptions.NotFound('old generation')
+    with open(file_path, 'w', encoding='utf-8') as f:
+      f.write(f'{blob.name}@{blob.generation}')
+
+  with mock.patch.object(
+      cache.chunked, 'download_blob_to_file', side_effect=download
+  ) as mock_download:
+    yield mock_download
+
+
+def _read(file_path) -> str:
+  with open(file_path, 'r', encoding='utf-8') as f:
+    return f.read()
+
+
+def test_fetch_downloads_once_per_generation(mock_download, tmp_path):
+  blob_cache = cache.BlobCache(str(tmp_path / 'cache'))
+  bucket = _FakeBucket()
+  font = bucket.blob('font.ttf')
+
+  blob_cache.fetch(font, str(tmp_path / 'a.ttf'), None)
+  blob_cache.fetch(font, str(tmp_path / 'b.ttf'), None)
+  bucket.generation = 2
+  blob_cache.fetch(font, str(tmp_path / 'c.ttf'), None)
+
+  assert _read(tmp_path / 'b.ttf') == 'font.ttf@1'
+  assert _read(tmp_path / 'c.ttf') == 'font.ttf@2'
+  assert mock_download.call_count == 2
+  assert font.reload.call_count == 3
+  assert (blob_cache.hits, blob_cache.misses) == (1, 2)
+
+
+def test_fetch_trusts_generation_within_ttl(mock_download, tmp_path):
+  blob_cache = cache.BlobCache(
+      str(tmp_path / 'cache'), metadata_ttl_seconds=3600
+  )
+  bucket = _FakeBucket()
+
+  blob_cache.fetch(bucket.blob('font.ttf'), str(tmp_path / 'a.ttf'), None)
+  cached_font = bucket.blob('font.ttf')
+  blob_cache.fetch(cached_font, str(tmp_path / 'b.ttf'), None)
+
+  cached_font.reload.assert_not_called()
+  assert mock_download.call_count == 1
+
+  bucket.generation = 2
+  with mock.patch('time.time', return_value=4e9):
+    replaced_font = bucket.blob('font.ttf')
+    blob_cache.fetch(replaced_font, str(tmp_path / 'c.ttf'), None)
+
+  assert _read(tmp_path / 'c.ttf') == 'font.ttf@2'
+  replaced_font.reload.assert_called_once()
+
+
+def test_fetch_checks_generation_of_replaced_blob(mock_download, tmp_path):
+  blob_cache = cache.BlobCache(
+      str(tmp_path / 'cache'), metadata_ttl_seconds=3600
+  )
+  bucket = _FakeBucket()
+  blob_cache.fetch(bucket.blob('font.ttf'), str(tmp_path / 'a.ttf'), None)
+  for entry in os.scandir(tmp_path / 'cache' / 'objects'):
+    os.remove(entry.path)
+
+  bucket.generation = 2
+  replaced_font = bucket.blob('font.ttf')
+  blob_cache.fetch(replaced_font, str(tmp_path / 'b.ttf'), None)
+
+  assert _read(tmp_path / 'b.ttf') == 'font.ttf@2'
+  replaced_font.reload.assert_called_once()
+  assert mock_download.call_count == 3
+
+
+def test_fetch_evicts_least_recently_used(mock_download, tmp_path):
+  del mock_download
+  blob_cache = cache.BlobCache(str(tmp_path / 'cache'), max_bytes=25)
+  bucket = _FakeBucket()
+
+  for name in ('logo1.png', 'logo2.png', 'logo3.png'):
+    blob_cache.fetch(bucket.blob(name), str(tmp_path / name), None)
+    # Make the order of use unambiguous for the LRU eviction.
+    for entry in os.scandir(tmp_path / 'cache' / 'objects'):
+      os.utime(entry.path, (entry.stat().st_mtime - 10,) * 2)
+
+  objects = os.listdir(tmp_path / 'cache' / 'objects')
+  assert len(objects) == 2
+  blob_cache.fetch(bucket.blob('logo1.png'), str(tmp_path / 'again.png'), None)
+  assert blob_cache.misses == 4
+
+
+def test_fetch_concurrently_downloads_once(mock_download, tmp_path):
+  blob_cache = cache.BlobCache(str(tmp_path / 'cache'))
+  bucket = _FakeBucket()
+
+  with concurrent.futures.ThreadPoolExecutor(8) as executor:
+    list(
+        executor.map(
+            lambda i: blob_cache.fetch(
+                bucket.blob('intro.mp4'), str(tmp_path / f'{i}.mp4'), None
+            ),
+            range(16),
+        )
+    )
+
+  assert mock_download.call_count == 1
+  assert all(_read(tmp_path / f'{i}.mp4') == 'intro.mp4@1' for i in range(16))
+  assert (blob_cache.hits, blob_cache.misses) == (15, 1)
@@ -0,0 +1,223 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for chunked blob transfers."""
+import base64
+from unittest import mock
+from google import resumable_media
+from google.api_core import exceptions as api_core_exceptions
+from google.cloud import storage
+from google.cloud.storage import transfer_manager
+import google_crc32c
+import pytest
+from gen_v.storage import chunked
+
+
+@pytest.fixture(name='chunked_settings', autouse=True)
+def fixture_chunked_settings():
+  """Uses a 1 KiB threshold and restores the defaults after each test."""
+  chunked.configure_chunked_transfers(
+      threshold_bytes=1024, chunk_size_bytes=256
+  )
+  yield
+  chunked.configure_chunked_transfers()
+
+
+@pytest.fixture(name='mock_transfer_manager')
+def fixture_mock_transfer_manager():
+  with (mock.patch.object(transfer_manager, 'upload_chunks_concurrently'),):
+    yield transfer_manager
+
+
+def _file_of_size(tmp_path, size: int) -> str:
+  file_path = tmp_path / 'video.mp4'
+  file_path.write_bytes(b'x' * size)
+  return str(file_path)
+
+
+def test_compute_file_crc32c(tmp_path):
+  file_path = tmp_path / 'hello.txt'
+  file_path.write_bytes(b'hello world')
+  # The value Cloud Storage reports for an object with this content.
+  assert chunked.compute_file_crc32c(str(file_path)) == 'yZRlqg=='
+
+
+class _FakeBlob:
+  """A blob whose downloads read from bytes, as Cloud Storage serves them."""
+
+  def __init__(self, data: bytes, size_known: bool = False):
+    self.name = 'video.mp4'
+    self.data = data
+    self.size = len(data) if size_known else None
+    self.generation = 7 if size_known else None
+    self.crc32c = self._crc32c() if size_known else None
+    self.ranges = []
+    self.reload = mock.MagicMock(side_effect=self._reload)
+    self.download_to_filename = mock.MagicMock()
+
+  def _crc32c(self) -> str:
+    checksum = google_crc32c.Checksum(self.data)
+    return base64.b64encode(checksum.digest()).decode('utf-8')
+
+  def _reload(self, if_generation_match=None):
+    del if_generation_match
+    self.size = len(self.data)
+    self.generation = 7
+    self.crc32c = self._crc32c()
+
+  def download_to_file(self, f, start, end, checksum):
+    del checksum
+    self.ranges.append((start, end))
+    if start >= len(self.data):
+      raise api_core_exceptions.RequestRangeNotSatisfiable('bad range')
+    f.write(self.data[start : end + 1])
+    # The response headers carry the generation and checksum of the object.
+    self.generation = 7
+    self.crc32c = self._crc32c()
+
+
+def test_download_small_blob_of_unknown_size_skips_metadata(tmp_path):
+  blob = _FakeBlob(b'small video')
+  file_path = str(tmp_path / 'small.mp4')
+
+  chunked.download_blob_to_file(blob, file_path)
+
+  assert blob.ranges == [(0, 1023)]
+  blob.reload.assert_not_called()
+  assert (tmp_path / 'small.mp4').read_bytes() == b'small video'
+
+
+def test_download_empty_blob_of_unknown_size(tmp_path):
+  blob = _FakeBlob(b'')
+  file_path = str(tmp_path / 'empty.mp4')
+
+  chunked.download_blob_to_file(blob, file_path)
+
+  assert blob.ranges == [(0, 1023)]
+  blob.reload.assert_not_called()
+  assert (tmp_path / 'empty.mp4').read_bytes() == b''
+
+
+def test_download_small_blob_of_known_size_uses_single_stream():
+  blob = _FakeBlob(b'small video', size_known=True)
+
+  chunked.download_blob_to_file(blob, '/tmp/small.mp4')
+
+  blob.download_to_filename.assert_called_once_with('/tmp/small.mp4')
+  blob.reload.assert_not_called()
+
+
+def test_download_large_blob_of_known_size_in_chunks(tmp_path):
+  data = bytes(range(256)) * 5 + b'end'
+  blob = _FakeBlob(data, size_known=True)
+  file_path = str(tmp_path / 'large.mp4')
+
+  chunked.download_blob_to_file(blob, file_path)
+
+  blob.reload.assert_not_called()
+  assert sorted(blob.ranges) == [
+      (0, 255),
+      (256, 511),
+      (512, 767),
+      (768, 1023),
+      (1024, 1279),
+      (1280, 1282),
+  ]
+  assert (tmp_path / 'large.mp4').read_bytes() == data
+
+
+def test_download_large_blob_of_unknown_size_reads_the_rest(tmp_path):
+  data = bytes(range(256)) * 5 + b'end'
+  blob = _FakeBlob(data)
+  file_path = str(tmp_path / 'large.mp4')
+
+  chunked.download_blob_to_file(blob, file_path)
+
+  blob.reload.assert_called_once_with(if_generation_match=7)
+  assert blob.ranges[0] == (0, 1023)
+  assert sorted(blob.ranges[1:]) == [(1024, 1279), (1280, 1282)]
+  assert (tmp_path / 'large.mp4').read_bytes() == data
+
+
+def test_download_checksum_mismatch_removes_file(tmp_path):
+  blob = _FakeBlob(b'x' * 2048, size_known=True)
+  blob.crc32c = 'AAAAAA=='
+  blob.download_to_file = mock.MagicMock(
+      side_effect=lambda f, start, end, checksum: f.write(b'y')
+  )
+  file_path = tmp_path / 'large.mp4'
+
+  with pytest.raises(resumable_media.DataCorruption):
+    chunked.download_blob_to_file(blob, str(file_path))
+
+  assert not file_path.exists()
+
+
+def test_download_without_threshold_skips_metadata():
+  chunked.configure_chunked_transfers(threshold_bytes=None)
+  blob = _FakeBlob(b'x' * 2048)
+
+  chunked.download_blob_to_file(blob, '/tmp/video.mp4')
+
+  blob.reload.assert_not_called()
+  blob.download_to_filename.assert_called_once_with('/tmp/video.mp4')
+
+
+def test_upload_large_file_checks_assembled_object(
+    mock_transfer_manager, tmp_path
+):
+  file_path = _file_of_size(tmp_path, 2048)
+  blob = mock.MagicMock(spec=storage.Blob)
+  blob.crc32c = chunked.compute_file_crc32c(file_path)
+  storage_client = mock.MagicMock(spec=storage.Client)
+
+  chunked.upload_file_to_blob(file_path, blob, storage_client)
+
+  mock_transfer_manager.upload_chunks_concurrently.assert_called_once()
+  blob.upload_from_filename.assert_not_called()
+  blob.reload.assert_called_once_with(client=storage_client)
+  blob.delete.assert_not_called()
+
+
+def test_upload_large_file_checksum_mismatch_deletes_object(
+    mock_transfer_manager, tmp_path
+):
+  del mock_transfer_manager
+  file_path = _file_of_size(tmp_path, 2048)
+  blob = mock.MagicMock(spec=storage.Blob)
+  blob.name = 'video.mp4'
+  blob.crc32c = 'AAAAAA=='
+  storage_client = mock.MagicMock(spec=storage.Client)
+
+  with pytest.raises(resumable_media.DataCorruption):
+    chunked.upload_file_to_blob(file_path, blob, storage_client)
+
+  blob.delete.assert_called_once_with(client=storage_client)
+
+
+def test_upload_small_file_uses_single_stream(mock_transfer_manager, tmp_path):
+  file_path = _file_of_size(tmp_path, 10)
+  blob = mock.MagicMock(spec=storage.Blob)
+  storage_client = mock.MagicMock(spec=storage.Client)
+
+  chunked.upload_file_to_blob(file_path, blob, storage_client)
+
+  blob.upload_from_filename.assert_called_once_with(
+      filename=file_path, client=storage_client
+  )
+  mock_transfer_manager.upload_chunks_concurrently.assert_not_called()
+
+
+def test_configure_chunked_transfers_rejects_invalid_values():
+  with pytest.raises(ValueError):
+    chunked.configure_chunked_transfers(max_workers=0)
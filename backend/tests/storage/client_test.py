@@ -0,0 +1,89 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the shared storage client."""
+import concurrent.futures
+from unittest import mock
+import pytest
+from gen_v.storage import client
+
+_create_storage_client = client._create_storage_client  # pylint: disable=protected-access
+
+
+@pytest.fixture(name='mock_create_client', autouse=True)
+def fixture_mock_create_client():
+  """Patches client creation and resets the shared client around each test."""
+  client.reset_storage_client()
+  with mock.patch(
+      'gen_v.storage.client._create_storage_client',
+      side_effect=lambda pool_size: mock.MagicMock(pool_size=pool_size),
+  ) as mock_create:
+    yield mock_create
+  client.configure_storage_client()
+  client.reset_storage_client()
+
+
+def test_get_storage_client_is_shared_across_threads(mock_create_client):
+  with concurrent.futures.ThreadPoolExecutor(8) as executor:
+    clients = list(
+        executor.map(lambda _: client.get_storage_client(), range(32))
+    )
+
+  assert all(c is clients[0] for c in clients)
+  mock_create_client.assert_called_once_with(
+      client.DEFAULT_CONNECTION_POOL_SIZE
+  )
+
+
+def test_get_storage_client_recreated_in_forked_process(mock_create_client):
+  first = client.get_storage_client()
+  with mock.patch('os.getpid', return_value=-1):
+    second = client.get_storage_client()
+
+  assert first is not second
+  assert mock_create_client.call_count == 2
+
+
+def test_configure_storage_client_pool_size(mock_create_client):
+  first = client.get_storage_client()
+  client.configure_storage_client(64)
+  second = client.get_storage_client()
+  client.configure_storage_client(64)
+
+  assert first is not second
+  assert second.pool_size == 64
+  assert client.get_storage_client() is second
+  assert mock_create_client.call_count == 2
+
+
+def test_configure_storage_client_rejects_empty_pool():
+  with pytest.raises(ValueError):
+    client.configure_storage_client(0)
+
+
+def test_create_storage_client_mounts_pool():
+  credentials = mock.MagicMock()
+  with (
+      mock.patch(
+          'google.auth.default', return_value=(credentials, 'my-project')
+      ),
+      mock.patch('google.cloud.storage.Client') as mock_storage_client,
+  ):
+    storage_client = _create_storage_client(16)
+
+  assert storage_client is mock_storage_client.return_value
+  kwargs = mock_storage_client.call_args.kwargs
+  assert kwargs['project'] == 'my-project'
+  assert kwargs['credentials'] is credentials
+  adapter = kwargs['_http'].get_adapter('https://storage.googleapis.com')
+  assert adapter._pool_maxsize == 16  # pylint: disable=protected-access
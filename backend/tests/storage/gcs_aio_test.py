@@ -0,0 +1,128 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the Cloud Storage transfers made on the event loop."""
+
+import asyncio
+import email.parser
+import json
+
+from google import resumable_media
+from google.api_core import exceptions as api_core_exceptions
+from google.auth import credentials
+import httpx
+from gen_v.storage import gcs_aio
+import pytest
+
+
+class _FakeGcs:
+  """Serves blobs over the JSON API, as Cloud Storage does."""
+
+  def __init__(self):
+    self.blobs = {}
+    self.statuses = []
+
+  def handle(self, request: httpx.Request) -> httpx.Response:
+    if self.statuses:
+      return httpx.Response(self.statuses.pop(0))
+    if request.method == 'POST':
+      return self._upload(request)
+    name = request.url.path.split('/o/', 1)[1]
+    if name not in self.blobs:
+      return httpx.Response(404, json={'error': {'message': 'No such object'}})
+    data = self.blobs[name]
+    crc32c = gcs_aio.compute_crc32c(data)
+    return httpx.Response(
+        200, content=data, headers={'x-goog-hash': f'crc32c={crc32c},md5=x'}
+    )
+
+  def _upload(self, request: httpx.Request) -> httpx.Response:
+    message = email.parser.BytesParser().parsebytes(
+        b'Content-Type: '
+        + request.headers['Content-Type'].encode()
+        + b'\r\n\r\n'
+        + request.content
+    )
+    metadata_part, media_part = message.get_payload()
+    metadata = json.loads(metadata_part.get_payload())
+    data = media_part.get_payload(decode=True)
+    assert media_part.get_content_type() == metadata['contentType']
+    if gcs_aio.compute_crc32c(data) != metadata['crc32c']:
+      return httpx.Response(400, json={'error': {'message': 'Bad checksum'}})
+    self.blobs[metadata['name']] = data
+    return httpx.Response(200, json=metadata)
+
+
+@pytest.fixture(name='fake_gcs')
+def fixture_fake_gcs(monkeypatch):
+  monkeypatch.setattr(gcs_aio, '_INITIAL_BACKOFF_SECONDS', 0)
+  return _FakeGcs()
+
+
+def _run(fake_gcs, transfer):
+  """Runs a transfer with a client of the fake Cloud Storage."""
+
+  async def run():
+    gcs_client = gcs_aio.AsyncGcsClient(
+        credentials=credentials.AnonymousCredentials(),
+        transport=httpx.MockTransport(fake_gcs.handle),
+    )
+    try:
+      return await transfer(gcs_client)
+    finally:
+      await gcs_client.aclose()
+
+  return asyncio.run(run())
+
+
+def test_bytes_round_trip(fake_gcs):
+  async def transfer(gcs_client):
+    await gcs_client.upload_bytes(b'logo', 'gs://b/logos/a.png', 'image/png')
+    return await gcs_client.download_bytes('gs://b/logos/a.png')
+
+  assert _run(fake_gcs, transfer) == b'logo'
+  assert fake_gcs.blobs == {'logos/a.png': b'logo'}
+
+
+def test_download_retries_transient_errors(fake_gcs):
+  fake_gcs.blobs['a.png'] = b'logo'
+  fake_gcs.statuses = [503, 429]
+
+  assert _run(fake_gcs, lambda c: c.download_bytes('gs://b/a.png')) == b'logo'
+
+
+def test_download_missing_blob(fake_gcs):
+  with pytest.raises(api_core_exceptions.NotFound):
+    _run(fake_gcs, lambda c: c.download_bytes('gs://b/a.png'))
+
+
+def test_download_checksum_mismatch(fake_gcs):
+  fake_gcs.blobs['a.png'] = b'logo'
+  handle = fake_gcs.handle
+
+  def corrupt(request):
+    response = handle(request)
+    return httpx.Response(200, content=b'lego', headers=response.headers)
+
+  fake_gcs.handle = corrupt
+
+  with pytest.raises(resumable_media.DataCorruption):
+    _run(fake_gcs, lambda c: c.download_bytes('gs://b/a.png'))
+
+
+def test_upload_is_not_retried(fake_gcs):
+  fake_gcs.statuses = [503]
+
+  with pytest.raises(api_core_exceptions.ServiceUnavailable):
+    _run(fake_gcs, lambda c: c.upload_bytes(b'logo', 'gs://b/a.png'))
+  assert not fake_gcs.blobs
@@ -17,6 +17,7 @@
 
 from unittest import mock
 from gen_v import storage as gcs
+from google.api_core import exceptions as api_core_exceptions
 from google.cloud import storage
 import pytest
 
@@ -53,6 +54,7 @@ def fixture_mock_blob(fs):
       b'This is a test file content.'
   )
   mock_blob.self_link = ''
+  mock_blob.size = 1024
   yield mock_blob
 
 
@@ -161,3 +163,331 @@ def test_move_blob(mock_storage_client):
   print(f'result: {new_link}')
 
   assert new_link == expected_destination
+
+
+def test_get_blob_fingerprint(mock_storage_client, mock_bucket, mock_blob):
+  mock_bucket.get_blob.return_value = mock_blob
+  mock_blob.md5_hash = 'abc=='
+  assert gcs.get_blob_fingerprint('gs://b/f.png', mock_storage_client) == (
+      'md5:abc=='
+  )
+
+  mock_blob.md5_hash = None
+  mock_blob.crc32c = 'xyz=='
+  mock_blob.size = 42
+  assert gcs.get_blob_fingerprint('gs://b/f.png', mock_storage_client) == (
+      'crc32c:xyz==:42'
+  )
+
+
+def test_iter_file_fingerprints_in_gcs_folder_uses_listed_checksums(
+    mock_storage_client,
+):
+  listed = _named_blobs('images/a.png', 'images/b.png')
+  listed[0].md5_hash = 'abc=='
+  listed[1].md5_hash = None
+  listed[1].crc32c = 'xyz=='
+  listed[1].size = 42
+  mock_storage_client.list_blobs.return_value = listed
+
+  fingerprints = list(
+      gcs.iter_file_fingerprints_in_gcs_folder(
+          'gs://b/images/', storage_client=mock_storage_client
+      )
+  )
+
+  assert fingerprints == [
+      ('gs://b/images/a.png', 'md5:abc=='),
+      ('gs://b/images/b.png', 'crc32c:xyz==:42'),
+  ]
+  mock_storage_client.bucket.assert_not_called()
+
+
+def test_get_blob_fingerprint_missing_blob(mock_storage_client, mock_bucket):
+  mock_bucket.get_blob.return_value = None
+  with pytest.raises(FileNotFoundError):
+    gcs.get_blob_fingerprint('gs://b/missing.png', mock_storage_client)
+
+
+def test_get_existing_blob(mock_storage_client, mock_bucket, mock_blob):
+  mock_bucket.get_blob.return_value = mock_blob
+  assert gcs.get_existing_blob('gs://b/f.png', mock_storage_client) == (
+      mock_blob
+  )
+  mock_bucket.get_blob.assert_called_once_with('f.png')
+
+
+def test_download_many_reports_errors_per_file(mock_storage_client, mock_blob):
+  def download_to_filename(filename: str):
+    if filename.endswith('missing.mp4'):
+      raise api_core_exceptions.NotFound('missing')
+
+  mock_blob.download_to_filename = download_to_filename
+  progress = []
+
+  results = gcs.download_many(
+      ['gs://b/a.mp4', 'gs://b/missing.mp4', 'gs://b/c.mp4'],
+      destination_dir='/tmp',
+      progress_callback=lambda result, done, total: progress.append(
+          (done, total)
+      ),
+      storage_client=mock_storage_client,
+  )
+
+  assert [result.destination for result in results] == [
+      '/tmp/a.mp4',
+      '/tmp/missing.mp4',
+      '/tmp/c.mp4',
+  ]
+  assert [result.succeeded for result in results] == [True, False, True]
+  assert isinstance(results[1].error, api_core_exceptions.NotFound)
+  assert progress == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_download_many_with_file_names(mock_storage_client):
+  results = gcs.download_many(
+      ['gs://b/a.mp4'],
+      file_names=['renamed.mp4'],
+      storage_client=mock_storage_client,
+  )
+  assert results[0].destination == '/content/renamed.mp4'
+
+
+def test_upload_many_removes_uploaded_files(mock_storage_client, fake_fs):
+  fake_fs.create_file('/var/data/a.png', contents='a')
+
+  results = gcs.upload_many(
+      [
+          ('/var/data/a.png', 'gs://b/a.png'),
+          ('/var/data/b.png', 'gs://b/b.png'),
+      ],
+      remove_local_files=True,
+      storage_client=mock_storage_client,
+  )
+
+  assert [result.succeeded for result in results] == [True, False]
+  assert isinstance(results[1].error, FileNotFoundError)
+  assert not fake_fs.exists('/var/data/a.png')
+
+
+def test_download_file_locally_from_cache(mock_storage_client, mock_blob):
+  with mock.patch('gen_v.storage.cache.get_blob_cache') as mock_get_cache:
+    local_path = gcs.download_file_locally(
+        'gs://b/font.ttf', storage_client=mock_storage_client, use_cache=True
+    )
+
+  assert local_path == '/content/font.ttf'
+  mock_get_cache.return_value.fetch.assert_called_once_with(
+      mock_blob, local_path, mock_storage_client
+  )
+
+
+def test_download_bytes(mock_storage_client, mock_blob):
+  mock_blob.download_as_bytes.return_value = b'logo'
+
+  assert gcs.download_bytes('gs://b/logo.png', mock_storage_client) == b'logo'
+  mock_storage_client.bucket.assert_called_with('b')
+
+
+def test_upload_bytes(mock_storage_client, mock_blob):
+  gcs.upload_bytes(b'logo', 'gs://b/logo.png', 'image/png', mock_storage_client)
+  gcs.upload_bytes(b'data', 'gs://b/data.bin', None, mock_storage_client)
+
+  assert mock_blob.upload_from_string.call_args_list == [
+      mock.call(b'logo', content_type='image/png'),
+      mock.call(b'data', content_type='application/octet-stream'),
+  ]
+
+
+def test_open_read_and_write(mock_storage_client, mock_blob):
+  with gcs.open_read('gs://b/in.mp4', mock_storage_client) as f:
+    assert f.read() == b'This is a test file content.'
+  gcs.open_write('gs://b/out.mp4', 'video/mp4', mock_storage_client)
+
+  assert mock_blob.open.call_args_list == [
+      mock.call('rb'),
+      mock.call('wb', content_type='video/mp4'),
+  ]
+
+
+def test_upload_many_bytes(mock_storage_client, mock_blob):
+  mock_blob.upload_from_string.side_effect = [
+      None,
+      api_core_exceptions.Forbidden('denied'),
+  ]
+
+  results = gcs.upload_many_bytes(
+      [(b'a', 'gs://b/a.png'), (b'b', 'gs://b/b.png')],
+      content_type='image/png',
+      max_workers=1,
+      storage_client=mock_storage_client,
+  )
+
+  assert [result.source for result in results] == ['<memory>', '<memory>']
+  assert [result.succeeded for result in results] == [True, False]
+  assert isinstance(results[1].error, api_core_exceptions.Forbidden)
+
+
+def _named_blob(name):
+  blob = mock.MagicMock(spec=storage.Blob)
+  blob.name = name
+  return blob
+
+
+def _named_blobs(*names):
+  return [_named_blob(name) for name in names]
+
+
+def test_retrieve_all_files_from_gcs_folder(mock_storage_client):
+  mock_storage_client.list_blobs.return_value = _named_blobs(
+      'images/', 'images/a.png', 'images/sub/b.jpg'
+  )
+
+  uris = gcs.retrieve_all_files_from_gcs_folder(
+      'gs://b/images/', mock_storage_client
+  )
+
+  assert uris == ['gs://b/images/a.png', 'gs://b/images/sub/b.jpg']
+  mock_storage_client.list_blobs.assert_called_once_with(
+      'b',
+      prefix='images/',
+      delimiter=None,
+      match_glob=None,
+      page_size=1000,
+      fields='items(name,md5Hash,crc32c,size),nextPageToken',
+  )
+
+
+@pytest.mark.parametrize(
+    'extensions, expected_glob',
+    [(['png'], 'images/**.png'), (['.png', 'jpg'], 'images/**.{png,jpg}')],
+)
+def test_iter_files_in_gcs_folder_filters_extensions_on_server(
+    mock_storage_client, extensions, expected_glob
+):
+  mock_storage_client.list_blobs.return_value = []
+
+  list(
+      gcs.iter_files_in_gcs_folder(
+          'gs://b/images/',
+          extensions=extensions,
+          recursive=False,
+          storage_client=mock_storage_client,
+      )
+  )
+
+  _, kwargs = mock_storage_client.list_blobs.call_args
+  assert kwargs['match_glob'] == expected_glob
+  assert kwargs['delimiter'] == '/'
+
+
+def test_iter_files_in_gcs_folder_filters_extensions_locally_for_globs(
+    mock_storage_client,
+):
+  mock_storage_client.list_blobs.return_value = _named_blobs(
+      'images[1]/a.png', 'images[1]/a.txt'
+  )
+
+  uris = list(
+      gcs.iter_files_in_gcs_folder(
+          'gs://b/images[1]/',
+          extensions=['png'],
+          storage_client=mock_storage_client,
+      )
+  )
+
+  assert uris == ['gs://b/images[1]/a.png']
+  _, kwargs = mock_storage_client.list_blobs.call_args
+  assert kwargs['match_glob'] is None
+
+
+def test_iter_files_in_gcs_folder_is_lazy(mock_storage_client):
+  listed = []
+
+  def list_blobs(*unused_args, **unused_kwargs):
+    for blob in _named_blobs('a.png', 'b.png'):
+      listed.append(blob.name)
+      yield blob
+
+  mock_storage_client.list_blobs.side_effect = list_blobs
+
+  uris = gcs.iter_files_in_gcs_folder(
+      'gs://b/', storage_client=mock_storage_client
+  )
+
+  assert next(uris) == 'gs://b/a.png'
+  assert listed == ['a.png']
+
+
+def test_get_moved_blob_uri():
+  assert (
+      gcs.get_moved_blob_uri('gs://b/veo/123/sample_0.mp4', 'product.png')
+      == 'gs://b/veo/product.png/sample_0.mp4'
+  )
+
+
+@pytest.fixture(name='named_blobs')
+def fixture_named_blobs(mock_storage_client, mock_bucket):
+  """Gives each blob name its own mock blob."""
+  blobs = {}
+
+  def get_blob(name):
+    if name not in blobs:
+      blobs[name] = _named_blob(name)
+      blobs[name].rewrite.return_value = (None, 1, 1)
+    return blobs[name]
+
+  mock_bucket.blob.side_effect = get_blob
+  mock_storage_client.batch.return_value = mock.MagicMock()
+  yield blobs
+
+
+def test_move_many_continues_rewrites(mock_storage_client, named_blobs):
+  destination = named_blobs['veo/p.png/big.mp4'] = _named_blob(
+      'veo/p.png/big.mp4'
+  )
+  destination.rewrite.side_effect = [('token', 1, 2), (None, 2, 2)]
+
+  results = gcs.move_many(
+      [('gs://b/veo/1/big.mp4', 'gs://b/veo/p.png/big.mp4')],
+      storage_client=mock_storage_client,
+  )
+
+  assert results[0].succeeded
+  source = named_blobs['veo/1/big.mp4']
+  assert destination.rewrite.call_args_list == [
+      mock.call(source),
+      mock.call(source, token='token'),
+  ]
+  source.delete.assert_called_once_with()
+  mock_storage_client.batch.assert_called_once()
+
+
+def test_move_many_reports_failed_copies_and_deletes(
+    mock_storage_client, named_blobs
+):
+  named_blobs['p/a.mp4'] = _named_blob('p/a.mp4')
+  named_blobs['p/a.mp4'].rewrite.side_effect = api_core_exceptions.NotFound(
+      'missing'
+  )
+  named_blobs['1/b.mp4'] = _named_blob('1/b.mp4')
+  named_blobs['1/b.mp4'].delete.side_effect = api_core_exceptions.Forbidden(
+      'denied'
+  )
+  mock_storage_client.batch.return_value.__exit__.side_effect = (
+      api_core_exceptions.Forbidden('denied')
+  )
+
+  results = gcs.move_many(
+      [
+          ('gs://b/1/a.mp4', 'gs://b/p/a.mp4'),
+          ('gs://b/1/b.mp4', 'gs://b/p/b.mp4'),
+          ('gs://b/1/c.mp4', 'gs://b/p/c.mp4'),
+      ],
+      storage_client=mock_storage_client,
+  )
+
+  assert [result.succeeded for result in results] == [False, False, True]
+  assert isinstance(results[0].error, api_core_exceptions.NotFound)
+  assert isinstance(results[1].error, api_core_exceptions.Forbidden)
+  named_blobs['1/a.mp4'].delete.assert_not_called()
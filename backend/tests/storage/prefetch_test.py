@@ -0,0 +1,163 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the prefetching downloads."""
+
+import os
+import threading
+
+from gen_v import storage
+from gen_v.storage import prefetch
+import pytest
+
+
+@pytest.fixture(name='memory_backend', autouse=True)
+def fixture_memory_backend():
+  backend = storage.get_backend('mem://')
+  yield backend
+  backend.clear()
+
+
+def _upload_files(count: int, size: int = 10) -> list[str]:
+  """Uploads files to memory, returning their URIs."""
+  uris = [f'mem://b/in/{i}.mp4' for i in range(count)]
+  for i, uri in enumerate(uris):
+    storage.upload_bytes(bytes([i]) * size, uri)
+  return uris
+
+
+def test_prefetch_files_in_order_and_removes_released_files():
+  uris = _upload_files(5)
+
+  with storage.prefetch_files(uris, max_files=2) as prefetched:
+    paths = []
+    for i, download in enumerate(prefetched):
+      with download:
+        assert download.succeeded
+        assert download.source == uris[i]
+        with open(download.destination, 'rb') as f:
+          assert f.read() == bytes([i]) * 10
+        paths.append(download.destination)
+      assert not os.path.exists(download.destination)
+
+  assert len(set(paths)) == 5
+  assert not os.path.exists(os.path.dirname(paths[0]))
+
+
+def test_prefetch_files_downloads_ahead(memory_backend):
+  uris = _upload_files(4)
+  downloaded = []
+  download_file = memory_backend.download_file
+
+  def record_download(uri, local_file_path, **kwargs):
+    download_file(uri, local_file_path, **kwargs)
+    downloaded.append(uri)
+
+  memory_backend.download_file = record_download
+  try:
+    with storage.prefetch_files(uris, max_files=2) as prefetched:
+      first = next(prefetched)
+      first.release()
+      # The second file was requested along with the first, the third once
+      # the first was handed out.
+      prefetched._executor.shutdown(wait=True)  # pylint: disable=protected-access
+      assert sorted(downloaded) == uris[:3]
+  finally:
+    del memory_backend.download_file
+
+
+def test_prefetch_files_stops_at_disk_budget():
+  uris = _upload_files(10, size=100)
+
+  with storage.prefetch_files(uris, max_files=4, max_bytes=150) as prefetched:
+    held = [next(prefetched) for _ in range(3)]
+    pending = prefetched._pending  # pylint: disable=protected-access
+    for future in pending:
+      future.result()
+    pending_count = len(pending)
+
+    prefetched._fill()  # pylint: disable=protected-access
+
+    # The held files exceed the budget, so no further download is started.
+    assert len(pending) == pending_count
+    for download in held:
+      download.release()
+    assert [download.source for download in prefetched] == uris[3:]
+
+
+def test_prefetch_files_reports_failed_downloads():
+  uris = _upload_files(1) + ['mem://b/in/missing.mp4']
+
+  with storage.prefetch_files(uris) as prefetched:
+    downloads = list(prefetched)
+
+  assert downloads[0].succeeded
+  assert isinstance(downloads[1].error, FileNotFoundError)
+
+
+def test_prefetch_bytes_reads_files_into_memory(monkeypatch):
+  uris = _upload_files(3, size=100) + ['mem://b/in/missing.mp4']
+  monkeypatch.setattr(prefetch.tempfile, 'mkdtemp', None)
+
+  with storage.prefetch_bytes(uris, max_files=2, max_bytes=150) as prefetched:
+    downloads = list(prefetched)
+    contents = []
+    for download in downloads:
+      with download:
+        contents.append(download.data)
+      assert download.data is None
+    assert not prefetched._unreleased_bytes  # pylint: disable=protected-access
+
+  assert [download.destination for download in downloads] == [None] * 4
+  assert contents == [bytes([i]) * 100 for i in range(3)] + [None]
+  assert isinstance(downloads[3].error, FileNotFoundError)
+
+
+def test_close_removes_unreleased_files(tmp_path):
+  uris = _upload_files(3)
+
+  with storage.prefetch_files(
+      uris, destination_dir=str(tmp_path), file_names=['a', 'b', 'c']
+  ) as prefetched:
+    next(prefetched)
+
+  assert not os.listdir(tmp_path)
+
+
+def test_prefetch_files_consumes_uris_lazily():
+  uris = _upload_files(10)
+  consumed = []
+  lock = threading.Lock()
+
+  def iter_uris():
+    for uri in uris:
+      with lock:
+        consumed.append(uri)
+      yield uri
+
+  with storage.prefetch_files(iter_uris(), max_files=2) as prefetched:
+    next(prefetched).release()
+
+  assert len(consumed) == 3
+
+
+def test_configure_prefetching():
+  storage.configure_prefetching(max_files=2, max_bytes=1024)
+  try:
+    assert prefetch.get_prefetch_settings() == prefetch.PrefetchSettings(
+        2, 1024
+    )
+    with pytest.raises(ValueError):
+      storage.configure_prefetching(max_files=0)
+  finally:
+    storage.configure_prefetching()
@@ -0,0 +1,93 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the prepared image cache."""
+import json
+import os
+from unittest import mock
+from google.api_core import exceptions as api_core_exceptions
+import pytest
+from gen_v.utils import image_cache
+
+_ENTRY = {
+    'title': 'product.png',
+    'resized_image_uri': 'bucket/out/product-resized-80_60.png',
+    'recolored_image_uri': 'gs://bucket/out/product-recolored.png',
+}
+
+
+@pytest.fixture(name='mock_manifest_blob')
+def fixture_mock_manifest_blob():
+  """Mocks the manifest blob returned by storage.get_blob."""
+  with mock.patch(
+      'gen_v.utils.image_cache.storage.get_blob', autospec=True
+  ) as mock_get_blob:
+    mock_blob = mock_get_blob.return_value
+    mock_blob.download_as_bytes.side_effect = api_core_exceptions.NotFound(
+        'missing'
+    )
+    yield mock_blob
+
+
+def test_make_cache_key_depends_on_source_and_params():
+  """Tests keys are stable and change with the source or parameters."""
+  key = image_cache.make_cache_key('md5:abc', width=80, height=60)
+
+  assert key == image_cache.make_cache_key('md5:abc', height=60, width=80)
+  assert key != image_cache.make_cache_key('md5:abd', width=80, height=60)
+  assert key != image_cache.make_cache_key('md5:abc', width=60, height=80)
+
+
+def test_local_index_round_trip(tmpdir):
+  """Tests saved entries are found by a new cache using the same index."""
+  index_path = os.path.join(tmpdir, 'cache', 'index.json')
+  cache = image_cache.PreparedImageCache(index_path=index_path)
+  assert cache.get('key') is None
+  cache.put('key', _ENTRY)
+  cache.save()
+
+  reloaded_cache = image_cache.PreparedImageCache(index_path=index_path)
+
+  assert reloaded_cache.get('key') == _ENTRY
+  assert (cache.hits, cache.misses) == (0, 1)
+  assert (reloaded_cache.hits, reloaded_cache.misses) == (1, 0)
+  assert reloaded_cache.hit_rate == 1.0
+
+
+def test_save_merges_manifest_after_conflict(mock_manifest_blob):
+  """Tests a concurrent manifest update is merged instead of overwritten."""
+  cache = image_cache.PreparedImageCache(manifest_uri='gs://bucket/m.json')
+  cache.put('mine', _ENTRY)
+  # Another worker writes its entry between our read and our write.
+  mock_manifest_blob.download_as_bytes.side_effect = [
+      b'{}',
+      json.dumps({'theirs': _ENTRY}).encode('utf-8'),
+  ]
+  mock_manifest_blob.generation = 7
+  mock_manifest_blob.upload_from_string.side_effect = [
+      api_core_exceptions.PreconditionFailed('conflict'),
+      None,
+  ]
+
+  cache.save()
+
+  assert mock_manifest_blob.upload_from_string.call_count == 2
+  (data,) = mock_manifest_blob.upload_from_string.call_args.args
+  assert json.loads(data) == {'theirs': _ENTRY, 'mine': _ENTRY}
+  assert (
+      mock_manifest_blob.upload_from_string.call_args.kwargs[
+          'if_generation_match'
+      ]
+      == 7
+  )
+  assert cache.get('theirs') == _ENTRY
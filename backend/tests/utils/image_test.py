@@ -12,12 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Unit tests for image utils."""
+import io
 import os
+import tempfile
 from unittest import mock
+import numpy as np
 from PIL import Image
 import pytest
 from gen_v import models
+from gen_v import storage
 from gen_v.utils import image
+from gen_v.utils import image_cache
 
 
 @pytest.fixture(name='sample_image_files')
@@ -43,11 +48,39 @@ def fixture_sample_image_files(tmpdir):
   return image_paths
 
 
+@pytest.fixture(name='memory_backend')
+def fixture_memory_backend():
+  """Returns the in-memory storage, recording the files read from it."""
+  backend = storage.get_backend('mem://')
+  with mock.patch.object(
+      backend, 'read_bytes', wraps=backend.read_bytes
+  ) as mock_read_bytes:
+    yield mock.Mock(read_bytes=mock_read_bytes)
+  backend.clear()
+
+
+def _upload_to_memory(path: str, uri: str) -> str:
+  """Uploads a file to the in-memory storage, returning its URI."""
+  storage.upload_bytes(_read_bytes(path), uri)
+  return uri
+
+
 @pytest.fixture(name='mock_gcs_storage')
-def fixture_mock_gcs_storage():
-  """Mocks the gen_v.storage module functions."""
+def fixture_mock_gcs_storage(memory_backend):  # pylint: disable=unused-argument
+  """Mocks the gen_v.storage module functions.
+
+  The images listed are read ahead by the real prefetcher, so tests list
+  images uploaded to the in-memory storage.
+  """
   with mock.patch('gen_v.utils.image.storage', autospec=True) as mock_storage:
     mock_storage.retrieve_all_files_from_gcs_folder.return_value = []
+    mock_storage.iter_files_in_gcs_folder.side_effect = lambda uri: iter(
+        mock_storage.retrieve_all_files_from_gcs_folder.return_value
+    )
+    listed_uris = mock_storage.retrieve_all_files_from_gcs_folder
+    mock_storage.iter_file_fingerprints_in_gcs_folder.side_effect = (
+        lambda uri: [(u, f'md5:{u}') for u in listed_uris.return_value]
+    )
     mock_storage.get_file_name_from_gcs_url.side_effect = lambda uri: uri.split(
         '/'
     )[-1]
@@ -55,6 +88,9 @@ def fixture_mock_gcs_storage():
         lambda uri, **kwargs: f"/tmp/local_{uri.split('/')[-1]}"
     )
     mock_storage.upload_file_to_gcs.return_value = None
+    mock_storage.upload_many_bytes.return_value = []
+    mock_storage.to_uri.side_effect = storage.to_uri
+    mock_storage.prefetch_bytes.side_effect = storage.prefetch_bytes
     yield mock_storage
 
 
@@ -104,6 +140,38 @@ def test_rescale_image_to_fit_tall_image_into_square(sample_image_files):
   assert rescaled_img.height == 100
 
 
+def test_rescale_image_to_fit_decodes_path_once(sample_image_files):
+  """Tests the source file is only opened once when fitting an image."""
+  with mock.patch.object(
+      image.Image, 'open', wraps=Image.open
+  ) as mock_image_open:
+    rescaled_img = image.rescale_image_to_fit(
+        sample_image_files['wide'], desired_width=100, desired_height=100
+    )
+
+  mock_image_open.assert_called_once()
+  assert rescaled_img.size == (100, 50)
+
+
+def test_rescale_image_to_fit_accepts_bytes_and_open_images():
+  """Tests in-memory sources and open images are rescaled to fit."""
+  buffer = io.BytesIO()
+  Image.new('RGB', (1600, 1200), color=(0, 255, 0)).save(buffer, 'JPEG')
+  jpeg_bytes = buffer.getvalue()
+
+  from_bytes = image.rescale_image_to_fit(jpeg_bytes, 200, 200)
+  from_stream = image.rescale_image_to_fit(io.BytesIO(jpeg_bytes), 200, 200)
+  with Image.open(io.BytesIO(jpeg_bytes)) as open_image:
+    from_open_image = image.rescale_image_to_fit(open_image, 200, 200)
+    # The caller's image is left as it was, not draft-decoded.
+    assert open_image.size == (1600, 1200)
+
+  for rescaled_img in (from_bytes, from_stream, from_open_image):
+    assert rescaled_img.size == (200, 150)
+    assert rescaled_img.mode == 'RGBA'
+    assert rescaled_img.getpixel((100, 75))[1] > 250
+
+
 @pytest.mark.parametrize(
     'hex_input, expected_rgb_tuple',
     [
@@ -193,26 +261,156 @@ def test_replace_solid_background(sample_image_files, tmpdir):
     assert actual_color == (255, 0, 0, 255)
 
 
-@mock.patch('gen_v.utils.image.place_rescaled_image_on_background')
+def _replace_background_color_per_pixel(
+    source_image, target_color, replacement_color, threshold
+):
+  """Reference per-pixel implementation used to check the vectorized one."""
+  result = source_image.convert('RGBA')
+  image_data = result.load()
+  replacement_rgba = (*replacement_color.to_tuple(), 255)
+  for x in range(result.width):
+    for y in range(result.height):
+      current_color = models.RGBColor.from_tuple(image_data[x, y][:3])
+      if current_color.distance_to(target_color) < threshold:
+        image_data[x, y] = replacement_rgba
+  return result
+
+
+@pytest.mark.parametrize('threshold', [0, 1, 25, 60.5])
+def test_recolor_image_background_matches_per_pixel(threshold):
+  """Tests the vectorized recolor is pixel-identical to the per-pixel one."""
+  rng = np.random.default_rng(seed=42)
+  pixels = rng.integers(200, 256, size=(40, 60, 4), dtype=np.uint8)
+  pixels[10:30, 20:40, :3] = rng.integers(0, 256, size=(20, 20, 3))
+  source_image = Image.fromarray(pixels, 'RGBA')
+  target_color = models.RGBColor(r=230, g=230, b=230)
+  replacement_color = models.RGBColor(r=12, g=34, b=56)
+
+  result = image.recolor_image_background(
+      source_image, target_color, replacement_color, threshold
+  )
+  expected = _replace_background_color_per_pixel(
+      source_image, target_color, replacement_color, threshold
+  )
+
+  assert result.mode == 'RGBA'
+  assert np.array_equal(np.asarray(result), np.asarray(expected))
+
+
+@pytest.mark.parametrize('memory_budget_bytes', [1, 24 * 60 * 7, None])
+def test_recolor_image_background_in_bands_matches_whole_image(
+    memory_budget_bytes,
+):
+  """Tests recoloring in bands gives the same output as the whole image."""
+  rng = np.random.default_rng(seed=7)
+  pixels = rng.integers(200, 256, size=(40, 60, 3), dtype=np.uint8)
+  source_image = Image.fromarray(pixels, 'RGB')
+  target_color = models.RGBColor(r=230, g=230, b=230)
+  replacement_color = models.RGBColor(r=12, g=34, b=56)
+
+  result = image.recolor_image_background(
+      source_image,
+      target_color,
+      replacement_color,
+      memory_budget_bytes=memory_budget_bytes,
+  )
+  expected = _replace_background_color_per_pixel(
+      source_image, target_color, replacement_color, 25
+  )
+
+  assert np.array_equal(np.asarray(result), np.asarray(expected))
+
+
+@pytest.mark.parametrize(
+    'memory_budget_bytes, expected_band_height',
+    [(None, 100), (1, 1), (24 * 50 * 10, 10), (10**9, 100)],
+)
+def test_get_band_height(memory_budget_bytes, expected_band_height):
+  """Tests the band height is derived from the budget and clamped."""
+  assert (
+      image.get_band_height(50, 100, memory_budget_bytes)
+      == expected_band_height
+  )
+
+
+@pytest.mark.parametrize('memory_budget_bytes', [1, 16 * 101 * 7, None])
+def test_reduce_image_in_bands_matches_whole_image(memory_budget_bytes):
+  """Tests reducing in bands gives the same image as Image.reduce."""
+  rng = np.random.default_rng(0)
+  source_image = Image.fromarray(
+      rng.integers(0, 256, (103, 101, 4), dtype=np.uint8), 'RGBA'
+  )
+
+  result = image.reduce_image(source_image, 3, memory_budget_bytes)
+
+  assert result.size == (34, 35)
+  assert np.array_equal(np.asarray(result), np.asarray(source_image.reduce(3)))
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'RGBA'])
+def test_prepare_variants_same_with_memory_budget(
+    mode, mock_gcs_storage, tmpdir
+):
+  """Tests the memory budget doesn't change the variants of a large image."""
+  img_uri = 'gs://my-bucket/input-images/product.png'
+  source_path = str(tmpdir.join('product.png'))
+  pixels = np.random.default_rng(0).integers(
+      0, 256, (1700, 2500, len(mode)), dtype=np.uint8
+  )
+  Image.fromarray(pixels, mode).save(source_path)
+
+  variants = []
+  for memory_budget_bytes in (None, 1024 * 1024):
+    image._prepare_product_image_variants(  # pylint: disable=protected-access
+        img_uri,
+        [(320, 180), (180, 320)],
+        models.RGBColor(r=255, g=255, b=255),
+        models.RGBColor(r=255, g=0, b=0),
+        'my-bucket/output',
+        memory_budget_bytes=memory_budget_bytes,
+        image_bytes=_read_bytes(source_path),
+    )
+    uploads = mock_gcs_storage.upload_many_bytes.call_args.args[0]
+    variants.append([data for data, _ in uploads])
+
+  assert variants[0] == variants[1]
+
+
+def test_get_color_match_mask_excludes_threshold_distance():
+  """Tests pixels exactly at the threshold distance are not matched."""
+  pixels = np.array([[[0, 0, 0], [3, 4, 0], [2, 4, 0]]], dtype=np.uint8)
+
+  mask = image.get_color_match_mask(
+      pixels, models.RGBColor(r=0, g=0, b=0), threshold=5
+  )
+
+  assert mask.tolist() == [[True, False, True]]
+
+
+def _read_bytes(path: str) -> bytes:
+  """Returns the content of a file."""
+  with open(path, 'rb') as f:
+    return f.read()
+
+
 def test_process_and_resize_images_simple_flow(
-    mock_place,
     mock_gcs_storage,
+    memory_backend,
     sample_image_files,
 ):
   """Tests the basic flow of processing one image."""
-  input_gcs_uri = 'gs://my-bucket/input-images/'
+  input_gcs_uri = 'mem://my-bucket/input-images/'
   output_gcs_uri_base = 'gs://my-bucket/resized'
   img_name = 'sample_test_image.png'
-  img_uri = f'{input_gcs_uri}{img_name}'
+  img_uri = _upload_to_memory(
+      sample_image_files['wide'], f'{input_gcs_uri}{img_name}'
+  )
   local_resized_path = 'sample_test_image-resized-80_60.png'
   expected_output_uri = f'{output_gcs_uri_base}/{local_resized_path}'
   width, height = 80, 60
   bg_color = models.RGBColor(r=255, g=255, b=255)
 
   mock_gcs_storage.retrieve_all_files_from_gcs_folder.return_value = [img_uri]
-  mock_gcs_storage.download_file_locally.return_value = sample_image_files[
-      'wide'
-  ]
 
   result = image.process_and_resize_images(
       images_uri=input_gcs_uri,
@@ -226,17 +424,19 @@ def test_process_and_resize_images_simple_flow(
   assert result[0]['title'] == img_name
   assert result[0]['resized_image_uri'] == expected_output_uri
 
-  mock_gcs_storage.retrieve_all_files_from_gcs_folder.assert_called_once_with(
+  mock_gcs_storage.iter_files_in_gcs_folder.assert_called_once_with(
       input_gcs_uri
   )
-  mock_gcs_storage.download_file_locally.assert_called_once_with(img_uri)
-  mock_place.assert_called_once()
-  mock_gcs_storage.upload_file_to_gcs.assert_called_once()
+  memory_backend.read_bytes.assert_called_once_with(img_uri)
+  mock_gcs_storage.download_bytes.assert_not_called()
+  mock_gcs_storage.download_file_locally.assert_not_called()
+  (image_bytes, uri, content_type), _ = mock_gcs_storage.upload_bytes.call_args
+  assert (uri, content_type) == (expected_output_uri, 'image/png')
+  with Image.open(io.BytesIO(image_bytes)) as resized:
+    assert resized.size == (width, height)
 
 
-@mock.patch('gen_v.utils.image.replace_background_color')
 def test_recolor_background_and_upload_simple_flow(
-    mock_replace,
     mock_gcs_storage,
     sample_image_files,
 ):
@@ -257,9 +457,9 @@ def test_recolor_background_and_upload_simple_flow(
       {'title': 'sample_test_image.png', 'resized_image_uri': resized_image_uri}
   ]
 
-  mock_gcs_storage.download_file_locally.return_value = sample_image_files[
-      'wide'
-  ]
+  mock_gcs_storage.download_bytes.return_value = _read_bytes(
+      sample_image_files['wide']
+  )
   mock_gcs_storage.get_file_name_from_gcs_url.return_value = resized_img_name
 
   image.recolor_background_and_upload(
@@ -274,8 +474,312 @@ def test_recolor_background_and_upload_simple_flow(
       selected_products[0]['recolored_image_uri'] == expected_recolored_gcs_uri
   )
 
-  mock_gcs_storage.download_file_locally.assert_called_once_with(
-      resized_image_uri
+  mock_gcs_storage.download_bytes.assert_called_once_with(resized_image_uri)
+  (image_bytes, uri, content_type), _ = mock_gcs_storage.upload_bytes.call_args
+  assert (uri, content_type) == (expected_recolored_gcs_uri, 'image/png')
+  with Image.open(io.BytesIO(image_bytes)) as recolored:
+    # The green image matched the target colour, so all of it was recolored.
+    assert recolored.getpixel((0, 0)) == (255, 0, 0, 255)
+
+
+def test_place_image_on_background_matches_file_based(
+    sample_image_files, tmpdir
+):
+  """Tests the in-memory placement matches the file-based function."""
+  bg_color = models.RGBColor(r=255, g=255, b=255)
+  expected = image.place_rescaled_image_on_background(
+      sample_image_files['tall'], 300, 250, bg_color, tmpdir.join('out.png')
+  )
+
+  with Image.open(sample_image_files['tall']) as source_image:
+    result = image.place_image_on_background(source_image, 300, 250, bg_color)
+
+  assert result.size == (300, 250)
+  assert np.array_equal(np.asarray(result), np.asarray(expected))
+
+
+def test_prepare_product_images_single_download(
+    mock_gcs_storage, memory_backend, sample_image_files, tmpdir, monkeypatch
+):
+  """Tests each image is downloaded once and both outputs are uploaded."""
+  # Images are read ahead and uploaded from memory, nothing is written to the
+  # working or the temporary directory.
+  work_dir = tmpdir.mkdir('work')
+  monkeypatch.chdir(work_dir)
+  monkeypatch.setattr(tempfile, 'tempdir', str(work_dir))
+  img_uri = _upload_to_memory(
+      sample_image_files['wide'], 'mem://my-bucket/input-images/product.png'
   )
-  mock_replace.assert_called_once()
-  mock_gcs_storage.upload_file_to_gcs.assert_called_once()
+  output_uri = 'my-bucket/output'
+  original_color = models.RGBColor(r=255, g=255, b=255)
+  background_color = models.RGBColor(r=255, g=0, b=0)
+  mock_gcs_storage.retrieve_all_files_from_gcs_folder.return_value = [img_uri]
+
+  with mock.patch.object(
+      tempfile, 'mkdtemp', wraps=tempfile.mkdtemp
+  ) as mock_mkdtemp:
+    result = image.prepare_product_images(
+        images_uri='mem://my-bucket/input-images/',
+        width=80,
+        height=60,
+        original_background_color=original_color,
+        background_color=background_color,
+        output_uri=output_uri,
+    )
+
+  assert result == [{
+      'title': 'product.png',
+      'resized_image_uri': f'{output_uri}/product-resized-80_60.png',
+      'recolored_image_uri': (
+          f'gs://{output_uri}/product-resized-80_60-recolored-255_0_0.png'
+      ),
+  }]
+  memory_backend.read_bytes.assert_called_once_with(img_uri)
+  mock_gcs_storage.download_bytes.assert_not_called()
+  (uploads,), kwargs = mock_gcs_storage.upload_many_bytes.call_args
+  assert kwargs == {'content_type': 'image/png'}
+  assert [uri for _, uri in uploads] == [
+      result[0]['resized_image_uri'],
+      result[0]['recolored_image_uri'],
+  ]
+  mock_mkdtemp.assert_not_called()
+  assert not work_dir.listdir()
+  with Image.open(io.BytesIO(uploads[1][0])) as recolored:
+    # The white letterbox bars were recolored, the green product was not.
+    assert recolored.getpixel((0, 0)) == (255, 0, 0, 255)
+    assert recolored.getpixel((40, 30)) == (0, 255, 0, 255)
+
+
+def test_prepare_product_images_raises_failed_upload(
+    mock_gcs_storage, sample_image_files, tmpdir, monkeypatch
+):
+  """Tests no URI is returned, or cached, for an output never uploaded."""
+  monkeypatch.chdir(tmpdir)
+  error = OSError('upload failed')
+  mock_gcs_storage.retrieve_all_files_from_gcs_folder.return_value = [
+      _upload_to_memory(
+          sample_image_files['wide'], 'mem://my-bucket/input-images/product.png'
+      )
+  ]
+  mock_gcs_storage.upload_many_bytes.return_value = [
+      storage.TransferResult('<memory>', 'my-bucket/out/a'),
+      storage.TransferResult('<memory>', 'gs://my-bucket/out/b', error),
+  ]
+
+  with pytest.raises(OSError, match='upload failed'):
+    image.prepare_product_images(
+        images_uri='mem://my-bucket/input-images/',
+        width=80,
+        height=60,
+        original_background_color=models.RGBColor(r=255, g=255, b=255),
+        background_color=models.RGBColor(r=255, g=0, b=0),
+        output_uri='my-bucket/out',
+    )
+
+
+def test_color_match_table_is_shared_through_cache_dir(tmpdir):
+  """Tests the table is saved once and memory-mapped from the cache dir."""
+  target_color = models.RGBColor(r=10, g=20, b=30)
+
+  table = image.get_color_match_table(target_color, 7, cache_dir=str(tmpdir))
+
+  assert isinstance(table, np.memmap)
+  assert len(tmpdir.listdir()) == 1
+  assert np.array_equal(table, image.build_color_match_table(target_color, 7))
+
+
+def test_get_color_match_mask_cielab():
+  """Tests the CIELAB metric uses the perceptual colour difference."""
+  # Both colours are 30 RGB units away from white, but the yellow tint is
+  # perceptually further away than the light grey.
+  pixels = np.array([[[225, 225, 225], [255, 255, 225]]], dtype=np.uint8)
+  white = models.RGBColor(r=255, g=255, b=255)
+
+  mask = image.get_color_match_mask(
+      pixels, white, threshold=12, color_metric='CIELAB'
+  )
+
+  assert mask.tolist() == [[True, False]]
+
+
+def test_build_color_match_table_rejects_unknown_metric():
+  """Tests an unsupported colour metric raises a ValueError."""
+  with pytest.raises(ValueError):
+    image.build_color_match_table(
+        models.RGBColor(r=0, g=0, b=0), 10, color_metric='HSV'
+    )
+
+
+def test_prepare_product_images_reuses_cached_outputs(mock_gcs_storage):
+  """Tests cached images are not prepared again and misses are recorded."""
+  cached_uri = 'mem://my-bucket/input-images/renamed.png'
+  new_uri = 'mem://my-bucket/input-images/new.png'
+  storage.upload_bytes(b'new', new_uri)
+  mock_gcs_storage.retrieve_all_files_from_gcs_folder.return_value = [
+      cached_uri,
+      new_uri,
+  ]
+  params = {
+      'width': 80,
+      'height': 60,
+      'original_background_color': models.RGBColor(r=255, g=255, b=255),
+      'background_color': models.RGBColor(r=255, g=0, b=0),
+  }
+  cached_entry = {
+      'title': 'original.png',
+      'resized_image_uri': 'my-bucket/output/original-resized-80_60.png',
+      'recolored_image_uri': 'gs://my-bucket/output/original-recolored.png',
+  }
+  mock_gcs_storage.iter_files_in_gcs_folder.side_effect = None
+  mock_gcs_storage.iter_files_in_gcs_folder.return_value = [
+      'gs://my-bucket/output/original-resized-80_60.png',
+      'gs://my-bucket/output/original-recolored.png',
+  ]
+  cache = image_cache.PreparedImageCache()
+  cache.put(
+      image_cache.make_cache_key(
+          f'md5:{cached_uri}',
+          threshold=25,
+          color_metric='RGB',
+          output_uri='my-bucket/output',
+          **params,
+      ),
+      cached_entry,
+  )
+  new_entry = {'title': 'new.png', 'recolored_image_uri': 'gs://x/new.png'}
+
+  with mock.patch.object(
+      image, '_prepare_product_image_variants', return_value=[new_entry]
+  ) as mock_prepare:
+    result = image.prepare_product_images(
+        images_uri='mem://my-bucket/input-images/',
+        output_uri='my-bucket/output',
+        cache=cache,
+        **params,
+    )
+
+  assert result == [{**cached_entry, 'title': 'renamed.png'}, new_entry]
+  mock_prepare.assert_called_once()
+  assert mock_prepare.call_args.args == (new_uri,)
+  assert mock_prepare.call_args.kwargs['image_bytes'] == b'new'
+  assert (cache.hits, cache.misses) == (1, 1)
+  mock_gcs_storage.get_blob_fingerprint.assert_not_called()
+  mock_gcs_storage.iter_files_in_gcs_folder.assert_called_once_with(
+      'gs://my-bucket/output/', recursive=False
+  )
+
+
+def test_prepare_product_images_prepares_again_missing_cached_outputs(
+    mock_gcs_storage,
+):
+  """Tests an image is prepared again if its cached outputs were deleted."""
+  img_uri = 'mem://my-bucket/input-images/product.png'
+  storage.upload_bytes(b'product', img_uri)
+  mock_gcs_storage.retrieve_all_files_from_gcs_folder.return_value = [img_uri]
+  mock_gcs_storage.iter_files_in_gcs_folder.side_effect = None
+  # Only the resized image is left in the output folder.
+  mock_gcs_storage.iter_files_in_gcs_folder.return_value = [
+      'gs://my-bucket/output/product-resized-80_60.png'
+  ]
+  params = {
+      'width': 80,
+      'height': 60,
+      'original_background_color': models.RGBColor(r=255, g=255, b=255),
+      'background_color': models.RGBColor(r=255, g=0, b=0),
+  }
+  cache = image_cache.PreparedImageCache()
+  cache_key = image_cache.make_cache_key(
+      f'md5:{img_uri}',
+      threshold=25,
+      color_metric='RGB',
+      output_uri='my-bucket/output',
+      **params,
+  )
+  cache.put(
+      cache_key,
+      {
+          'title': 'product.png',
+          'resized_image_uri': 'my-bucket/output/product-resized-80_60.png',
+          'recolored_image_uri': 'gs://my-bucket/output/product-recolored.png',
+      },
+  )
+  prepared_entry = {'title': 'product.png', 'recolored_image_uri': 'gs://x/p'}
+
+  with mock.patch.object(
+      image, '_prepare_product_image_variants', return_value=[prepared_entry]
+  ) as mock_prepare:
+    result = image.prepare_product_images(
+        images_uri='mem://my-bucket/input-images/',
+        output_uri='my-bucket/output',
+        cache=cache,
+        **params,
+    )
+
+  assert result == [prepared_entry]
+  mock_prepare.assert_called_once()
+  assert cache.get(cache_key) == prepared_entry
+
+
+def test_prepare_product_image_variants_from_one_download(
+    mock_gcs_storage, memory_backend, sample_image_files, tmpdir, monkeypatch
+):
+  """Tests every size is prepared from a single download of each image."""
+  monkeypatch.chdir(tmpdir)
+  img_uri = _upload_to_memory(
+      sample_image_files['tall'], 'mem://my-bucket/input-images/product.png'
+  )
+  sizes = [(80, 60), (60, 80), (50, 50)]
+  mock_gcs_storage.retrieve_all_files_from_gcs_folder.return_value = [img_uri]
+
+  result = image.prepare_product_image_variants(
+      images_uri='mem://my-bucket/input-images/',
+      sizes=sizes,
+      original_background_color=models.RGBColor(r=255, g=255, b=255),
+      background_color=models.RGBColor(r=255, g=0, b=0),
+      output_uri='my-bucket/output',
+  )
+
+  assert list(result) == sizes
+  memory_backend.read_bytes.assert_called_once_with(img_uri)
+  mock_gcs_storage.download_bytes.assert_not_called()
+  (uploads,), _ = mock_gcs_storage.upload_many_bytes.call_args
+  assert len(uploads) == 2 * len(sizes)
+  uploaded_images = {uri: image_bytes for image_bytes, uri in uploads}
+  for width, height in sizes:
+    (product,) = result[(width, height)]
+    assert product['title'] == 'product.png'
+    assert product['resized_image_uri'] == (
+        f'my-bucket/output/product-resized-{width}_{height}.png'
+    )
+    with Image.open(
+        io.BytesIO(uploaded_images[product['resized_image_uri']])
+    ) as resized:
+      assert resized.size == (width, height)
+
+
+def test_prepare_product_images_in_memory_backend(sample_image_files):
+  """Tests images are prepared offline, from and to in-memory storage."""
+  with open(sample_image_files['wide'], 'rb') as f:
+    storage.upload_bytes(f.read(), 'mem://bucket/input/product.png')
+  try:
+    result = image.prepare_product_images(
+        images_uri='mem://bucket/input/',
+        width=80,
+        height=60,
+        original_background_color=models.RGBColor(r=255, g=255, b=255),
+        background_color=models.RGBColor(r=255, g=0, b=0),
+        output_uri='mem://bucket/output',
+    )
+
+    recolored_uri = (
+        'mem://bucket/output/product-resized-80_60-recolored-255_0_0.png'
+    )
+    assert result == [{
+        'title': 'product.png',
+        'resized_image_uri': 'mem://bucket/output/product-resized-80_60.png',
+        'recolored_image_uri': recolored_uri,
+    }]
+    with image.open_image(storage.download_bytes(recolored_uri)) as recolored:
+      assert recolored.getpixel((0, 0)) == (255, 0, 0, 255)
+  finally:
+    storage.get_backend('mem://').clear()
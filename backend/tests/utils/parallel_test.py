@@ -0,0 +1,62 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the parallel utils."""
+import concurrent.futures
+import functools
+import threading
+import time
+import pytest
+from gen_v.utils import parallel
+
+
+def test_map_in_order_bounds_in_flight_items():
+  """Tests results keep input order and in-flight items stay bounded."""
+  lock = threading.Lock()
+  in_flight = 0
+  max_seen = 0
+
+  def work(item):
+    nonlocal in_flight, max_seen
+    with lock:
+      in_flight += 1
+      max_seen = max(max_seen, in_flight)
+    # Later items finish first, so ordering is not accidental.
+    time.sleep(0.01 * (10 - item))
+    with lock:
+      in_flight -= 1
+    return item * 2
+
+  with concurrent.futures.ThreadPoolExecutor(8) as executor:
+    results = list(
+        parallel.map_in_order(executor, work, range(10), max_in_flight=3)
+    )
+
+  assert results == [item * 2 for item in range(10)]
+  assert max_seen <= 3
+
+
+def test_map_in_order_rejects_invalid_max_in_flight():
+  """Tests a max_in_flight below 1 raises a ValueError."""
+  with concurrent.futures.ThreadPoolExecutor(1) as executor:
+    with pytest.raises(ValueError):
+      list(parallel.map_in_order(executor, abs, [1], max_in_flight=0))
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_process_map_returns_results_in_order(max_workers):
+  """Tests process_map gives the same results with and without a pool."""
+  results = parallel.process_map(
+      functools.partial(pow, exp=2), range(6), max_workers=max_workers
+  )
+  assert results == [0, 1, 4, 9, 16, 25]
@@ -0,0 +1,143 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the shared Google API clients."""
+import concurrent.futures
+import datetime
+from unittest import mock
+import pytest
+import requests
+from gen_v.video import clients
+
+
+def _utcnow() -> datetime.datetime:
+  return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _mock_credentials(expires_in: datetime.timedelta) -> mock.MagicMock:
+  """Returns credentials whose refresh extends the token by an hour."""
+  credentials = mock.MagicMock(valid=True, token='token-0')
+  credentials.expiry = _utcnow() + expires_in
+
+  def refresh(request):
+    del request
+    credentials.token = f'token-{credentials.refresh.call_count}'
+    credentials.expiry = _utcnow() + datetime.timedelta(hours=1)
+
+  credentials.refresh.side_effect = refresh
+  return credentials
+
+
+@pytest.fixture(name='shared_client', autouse=True)
+def fixture_shared_client():
+  """Resets the shared clients around each test."""
+  clients.reset_api_client()
+  clients.reset_genai_clients()
+  yield
+  clients.configure_api_client()
+  clients.reset_api_client()
+  clients.reset_genai_clients()
+
+
+def test_get_access_token_is_cached():
+  credentials = _mock_credentials(datetime.timedelta(hours=1))
+  api_client = clients.GoogleApiClient(credentials=credentials)
+
+  assert api_client.get_access_token() == 'token-0'
+  assert api_client.get_access_token() == 'token-0'
+  credentials.refresh.assert_not_called()
+
+
+def test_get_access_token_refreshes_before_expiry():
+  credentials = _mock_credentials(datetime.timedelta(minutes=1))
+  api_client = clients.GoogleApiClient(credentials=credentials)
+
+  with concurrent.futures.ThreadPoolExecutor(8) as executor:
+    tokens = list(
+        executor.map(lambda _: api_client.get_access_token(), range(32))
+    )
+
+  assert tokens == ['token-1'] * 32
+  credentials.refresh.assert_called_once()
+
+
+def test_get_access_token_uses_default_credentials():
+  credentials = _mock_credentials(datetime.timedelta(hours=1))
+  with mock.patch(
+      'google.auth.default', return_value=(credentials, 'my-project')
+  ) as mock_default:
+    api_client = clients.GoogleApiClient()
+    mock_default.assert_not_called()
+
+    api_client.get_access_token()
+    api_client.get_access_token()
+
+  mock_default.assert_called_once()
+
+
+@mock.patch.object(requests.Session, 'post', autospec=True)
+def test_post_reuses_session(mock_post):
+  mock_post.return_value.json.return_value = {'done': True}
+  api_client = clients.GoogleApiClient(
+      credentials=_mock_credentials(datetime.timedelta(hours=1))
+  )
+
+  for _ in range(2):
+    assert api_client.post('https://api/v1', {'key': 'value'}) == {'done': True}
+
+  sessions = {call.args[0] for call in mock_post.call_args_list}
+  assert len(sessions) == 1
+  _, call_kwargs = mock_post.call_args
+  assert call_kwargs['headers']['Authorization'] == 'Bearer token-0'
+  assert call_kwargs['json'] == {'key': 'value'}
+  mock_post.return_value.raise_for_status.assert_called()
+
+
+def test_get_api_client_is_shared():
+  api_client = clients.get_api_client()
+
+  assert clients.get_api_client() is api_client
+  with mock.patch('os.getpid', return_value=-1):
+    assert clients.get_api_client() is not api_client
+
+
+def test_configure_api_client_pool_size():
+  first = clients.get_api_client()
+  clients.configure_api_client(64)
+  second = clients.get_api_client()
+  clients.configure_api_client(64)
+
+  assert first is not second
+  assert clients.get_api_client() is second
+  with pytest.raises(ValueError):
+    clients.configure_api_client(0)
+
+
+@mock.patch('google.genai.Client', autospec=True)
+def test_get_genai_client_is_shared_per_location(mock_genai_client):
+  mock_genai_client.side_effect = mock.Mock
+  with concurrent.futures.ThreadPoolExecutor(8) as executor:
+    shared = set(
+        executor.map(
+            lambda _: clients.get_genai_client('project', 'us-central1'),
+            range(32),
+        )
+    )
+  other = clients.get_genai_client('project', 'europe-west4')
+
+  assert len(shared) == 1
+  assert other not in shared
+  assert mock_genai_client.call_args_list == [
+      mock.call(vertexai=True, project='project', location='us-central1'),
+      mock.call(vertexai=True, project='project', location='europe-west4'),
+  ]
@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Unit tests for video editing."""
+import os
 from unittest import mock
 from PIL import Image
+from gen_v import models
+from gen_v import storage
 from gen_v import video
 
 
@@ -37,3 +40,176 @@ def test_display_image_calls_provided_function_correctly(
   mock_custom_display_func.assert_called_once_with(
       mock_pil_image, height=test_height
   )
+
+
+@mock.patch('gen_v.video.editing.add_text_clips_to_video', autospec=True)
+@mock.patch('gen_v.video.editing.overlay_image_on_video', autospec=True)
+def test_process_videos_removes_each_download_once_processed(
+    mock_overlay, mock_add_text
+):
+  """Tests each video is downloaded ahead of use and removed once used."""
+  videos = []
+  for i in range(5):
+    storage.upload_bytes(b'video', f'mem://bucket/video{i}.mp4')
+    videos.append({
+        'gcs_uri': f'mem://bucket/video{i}.mp4',
+        'local_file_name': f'video{i}.mp4',
+        'promo_text': '',
+    })
+  processed = []
+
+  def overlay(local_video_file, images, output_video, **kwargs):
+    del images, output_video, kwargs
+    assert os.path.exists(local_video_file.path)
+    processed.append(local_video_file.path)
+
+  mock_overlay.side_effect = overlay
+
+  try:
+    video.process_videos_with_overlays_and_text(
+        videos,
+        [],
+        models.TextInput(text='', font='gs://bucket/font.ttf'),
+        'bucket/overlays',
+        'bucket/final',
+        max_workers=2,
+    )
+  finally:
+    storage.get_backend('mem://').clear()
+
+  assert sorted(os.path.basename(path) for path in processed) == [
+      f'video{i}.mp4' for i in range(5)
+  ]
+  assert not any(os.path.exists(path) for path in processed)
+  assert mock_add_text.call_count == 5
+
+
+@mock.patch('gen_v.video.editing.add_text_clips_to_video', autospec=True)
+@mock.patch('gen_v.video.editing.overlay_image_on_video', autospec=True)
+def test_process_videos_continues_after_failed_video(
+    mock_overlay, mock_add_text
+):
+  """Tests a video that fails to process doesn't stop the others."""
+  videos = []
+  for i in range(3):
+    storage.upload_bytes(b'video', f'mem://bucket/video{i}.mp4')
+    videos.append({
+        'gcs_uri': f'mem://bucket/video{i}.mp4',
+        'local_file_name': f'video{i}.mp4',
+        'promo_text': '',
+    })
+  mock_overlay.side_effect = [OSError('corrupt video'), None, None]
+
+  try:
+    video.process_videos_with_overlays_and_text(
+        videos,
+        [],
+        models.TextInput(text='', font='gs://bucket/font.ttf'),
+        'bucket/overlays',
+        'bucket/final',
+        max_workers=1,
+    )
+  finally:
+    storage.get_backend('mem://').clear()
+
+  assert mock_overlay.call_count == 3
+  assert mock_add_text.call_count == 2
+
+
+@mock.patch('gen_v.video.editing.add_text_clips_to_video', autospec=True)
+@mock.patch('gen_v.video.editing.overlay_image_on_video', autospec=True)
+@mock.patch('gen_v.video.editing.gcs.get_blob_fingerprint', autospec=True)
+def test_process_videos_fingerprints_each_overlay_once(
+    mock_fingerprint, mock_overlay, mock_add_text
+):
+  """Tests the overlays are fingerprinted once for the whole batch."""
+  del mock_add_text
+  mock_fingerprint.side_effect = lambda uri: f'md5:{uri}'
+  images = [
+      models.ImageInput(path='gs://bucket/logo.png', start=0),
+      models.ImageInput(path='gs://bucket/badge.png', start=0),
+  ]
+  videos = []
+  for i in range(3):
+    storage.upload_bytes(b'video', f'mem://bucket/video{i}.mp4')
+    videos.append({
+        'gcs_uri': f'mem://bucket/video{i}.mp4',
+        'local_file_name': f'video{i}.mp4',
+        'promo_text': '',
+    })
+
+  try:
+    video.process_videos_with_overlays_and_text(
+        videos,
+        images,
+        models.TextInput(text='', font='gs://bucket/font.ttf'),
+        'bucket/overlays',
+        'bucket/final',
+    )
+  finally:
+    storage.get_backend('mem://').clear()
+
+  assert mock_fingerprint.call_count == 2
+  assert mock_overlay.call_count == 3
+  for call in mock_overlay.call_args_list:
+    assert call.kwargs['overlay_fingerprints'] == {
+        'gs://bucket/logo.png': 'md5:gs://bucket/logo.png',
+        'gs://bucket/badge.png': 'md5:gs://bucket/badge.png',
+    }
+
+
+@mock.patch('gen_v.video.editing.add_text_clips_to_video', autospec=True)
+@mock.patch('gen_v.video.editing.overlay_image_on_video', autospec=True)
+@mock.patch('gen_v.video.editing.gcs.get_blob_fingerprint', autospec=True)
+def test_process_videos_skips_videos_while_overlay_is_missing(
+    mock_fingerprint, mock_overlay, mock_add_text, caplog
+):
+  """Tests a missing overlay fails the videos using it, not the batch."""
+  mock_fingerprint.side_effect = [
+      FileNotFoundError('logo.png not found'),
+      'md5:logo',
+  ]
+  videos = []
+  for i in range(3):
+    storage.upload_bytes(b'video', f'mem://bucket/video{i}.mp4')
+    videos.append({
+        'gcs_uri': f'mem://bucket/video{i}.mp4',
+        'local_file_name': f'video{i}.mp4',
+        'promo_text': '',
+    })
+
+  try:
+    video.process_videos_with_overlays_and_text(
+        videos,
+        [models.ImageInput(path='gs://bucket/logo.png', start=0)],
+        models.TextInput(text='', font='gs://bucket/font.ttf'),
+        'bucket/overlays',
+        'bucket/final',
+        max_workers=1,
+    )
+  finally:
+    storage.get_backend('mem://').clear()
+
+  assert mock_fingerprint.call_count == 2
+  assert mock_overlay.call_count == 2
+  assert mock_add_text.call_count == 2
+  (error,) = [r for r in caplog.records if r.levelname == 'ERROR']
+  assert error.getMessage() == 'Error processing video: video0.mp4'
+  assert isinstance(error.exc_info[1], FileNotFoundError)
+
+
+@mock.patch('gen_v.video.editing.config.configure_storage', autospec=True)
+def test_process_videos_configures_storage(
+    mock_configure_storage, mock_app_settings
+):
+  """Tests the settings configure storage before the videos are processed."""
+  video.process_videos_with_overlays_and_text(
+      [],
+      [],
+      models.TextInput(text='', font='gs://bucket/font.ttf'),
+      'bucket/overlays',
+      'bucket/final',
+      settings=mock_app_settings,
+  )
+
+  mock_configure_storage.assert_called_once_with(mock_app_settings)
@@ -12,19 +12,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Unit tests for video generation."""
+import concurrent.futures
+import os
 from unittest import mock
 from google import genai
 from google.cloud import storage
+from google.genai import errors as genai_errors
 from google.genai import types
 import pytest
 import requests
 from gen_v import models
 from gen_v.video import generation
+from gen_v.video import prompt_cache
+from gen_v.video import ratelimit
+
+
+@pytest.fixture(name='fast_rate_limits', autouse=True)
+def fast_rate_limits_fixture():
+  """Lifts the rate limits, so the tests don't wait between calls."""
+  for budget in (ratelimit.PREDICTION, ratelimit.POLLING, ratelimit.GEMINI):
+    ratelimit.configure_rate_limit(budget, 60_000)
+  ratelimit.configure_retries(initial_backoff=0.01, max_backoff=0.01)
+  yield
+  ratelimit.reset_rate_limits()
 
 
 @pytest.fixture(name='mock_requests_post')
 def mock_requests_post_fixture():
-  with mock.patch.object(requests, 'post', autospec=True) as requests_post:
+  with mock.patch.object(
+      requests.Session, 'post', autospec=True
+  ) as requests_post:
     yield requests_post
 
 
@@ -152,8 +169,8 @@ def test_send_request_to_google_api(mock_requests_post):
   assert response == expected_response_json
 
   mock_requests_post.assert_called_once()
-  call_args, call_kwargs = mock_requests_post.call_args
-  assert call_args[0] == mock_api_endpoint
+  (_, endpoint), call_kwargs = mock_requests_post.call_args
+  assert endpoint == mock_api_endpoint
   assert (
       call_kwargs['headers']['Authorization'] == f'Bearer {mock_access_token}'
   )
@@ -199,10 +216,48 @@ def test_get_gemini_prompt_success_with_image(
   assert call_kwargs['model'] == test_model_name
 
 
-@mock.patch('gen_v.video.generation.time.sleep')
+def test_get_gemini_prompt_reuses_cached_prompt(png_file_in_fs):
+  index_path = os.path.join(os.path.dirname(png_file_in_fs), 'prompts.json')
+  mock_client = mock.Mock(spec=genai.Client)
+  mock_client.models.generate_content.return_value.text = 'A spinning toy'
+
+  def generate(prompt_text: str) -> str:
+    cache = prompt_cache.PromptCache(index_path=index_path)
+    prompt = generation.get_gemini_generated_video_prompt(
+        models.GeminiPromptRequest(
+            prompt_text=prompt_text, image_file_path=png_file_in_fs
+        ),
+        client=mock_client,
+        prompt_cache=cache,
+    )
+    cache.save()
+    return prompt
+
+  assert generate('Animate it') == 'A spinning toy'
+  assert generate('Animate it') == 'A spinning toy'
+  assert mock_client.models.generate_content.call_count == 1
+  generate('Animate it slowly')
+  assert mock_client.models.generate_content.call_count == 2
+
+
+@mock.patch('gen_v.video.clients.get_genai_client', autospec=True)
+def test_get_gemini_prompt_uses_shared_client(mock_get_client):
+  request = models.GeminiPromptRequest(
+      prompt_text='Animate this', image_file_path=None
+  )
+
+  for _ in range(2):
+    generation.get_gemini_generated_video_prompt(
+        request, project_id='my-project', location='us-central1'
+    )
+
+  mock_get_client.assert_called_with('my-project', 'us-central1')
+  assert mock_get_client.return_value.models.generate_content.call_count == 2
+
+
 @mock.patch('gen_v.video.generation.send_request_to_google_api')
 def test_fetch_operation_success_first_try(
-    mock_send_request, mock_sleep, mock_app_settings
+    mock_send_request, mock_app_settings
 ):
   """Tests fetch_operation succeeds when API returns 'done': True."""
   lro_name = 'operations/op123'
@@ -216,7 +271,6 @@ def test_fetch_operation_success_first_try(
   mock_send_request.assert_called_once_with(
       mock_app_settings.fetch_endpoint, expected_request_data
   )
-  mock_sleep.assert_not_called()
 
 
 @mock.patch('gen_v.video.generation.fetch_operation')
@@ -253,7 +307,7 @@ def test_image_to_video_success(
   assert result == final_response
 
 
-@mock.patch('gen_v.video.generation.storage.download_file_locally')
+@mock.patch('gen_v.video.generation.storage.download_many')
 @mock.patch('gen_v.storage.get_file_name_from_gcs_url')
 @mock.patch('gen_v.video.generation.image_to_video')
 def test_generate_videos_and_download_success_simple(
@@ -261,6 +315,7 @@ def test_generate_videos_and_download_success_simple(
     mock_get_filename,
     mock_download,
     mock_storage_client,
+    mock_blob,
     veo_api_request_data,
     mock_app_settings,
     product_data,
@@ -268,8 +323,10 @@ def test_generate_videos_and_download_success_simple(
   """Tests the simple success path of generate_videos_and_download."""
   output_prefix = 'promo_v1'
   input_image_filename = 'image_dog.png'
-  generated_video_gcs_uri = 'gs://bucket_name/image_dog.png/gen_video_abc.mp4'
+  generated_video_gcs_uri = 'gs://bucket_name/veo/1234/gen_video_abc.mp4'
+  moved_video_gcs_uri = 'gs://bucket_name/veo/image_dog.png/gen_video_abc.mp4'
   generated_video_filename = 'gen_video_abc.mp4'
+  mock_blob.rewrite.return_value = (None, 1024, 1024)
 
   mock_img_to_vid.return_value = {
       'response': {'videos': [{'gcsUri': generated_video_gcs_uri}]}
@@ -284,6 +341,11 @@ def test_generate_videos_and_download_success_simple(
       f'{input_image_filename}-{output_prefix}-{generated_video_filename}'
   )
   expected_local_filename = expected_local_path.rsplit('/', maxsplit=1)[-1]
+  mock_download.return_value = [
+      generation.storage.TransferResult(
+          generated_video_gcs_uri, f'/content/{expected_local_path}'
+      )
+  ]
 
   result = generation.generate_videos_and_download(
       veo_request=veo_api_request_data,
@@ -304,14 +366,21 @@ def test_generate_videos_and_download_success_simple(
   ])
 
   mock_download.assert_called_once_with(
-      generated_video_gcs_uri, expected_local_path
+      [generated_video_gcs_uri], file_names=[expected_local_path]
   )
 
   assert isinstance(result, list)
   assert len(result) == 1
 
+  mock_storage_client.bucket.return_value.blob.assert_any_call(
+      'veo/image_dog.png/gen_video_abc.mp4'
+  )
+  mock_blob.rewrite.assert_called_once_with(mock_blob)
+  mock_storage_client.batch.assert_called_once()
+  mock_blob.delete.assert_called_once()
+
   expected_output_item = {
-      'gcs_uri': generated_video_gcs_uri,
+      'gcs_uri': moved_video_gcs_uri,
       'local_file': expected_local_path,
       'local_file_name': expected_local_filename,
       'product_title': product_data['title'],
@@ -320,41 +389,243 @@ def test_generate_videos_and_download_success_simple(
   assert result[0] == expected_output_item
 
 
-@mock.patch('gen_v.video.generation.generate_video_for_item', autospec=True)
+@mock.patch('gen_v.video.generation.storage.download_many')
+def test_download_generated_videos_skips_failed_downloads(
+    mock_download, veo_api_request_data, product_data
+):
+  """Tests a sample that could not be downloaded is neither listed nor moved."""
+  samples = ['gs://b/veo/1/sample_0.mp4', 'gs://b/veo/1/sample_1.mp4']
+  mock_download.return_value = [
+      generation.storage.TransferResult(samples[0], '/content/0.mp4'),
+      generation.storage.TransferResult(
+          samples[1], '/content/1.mp4', OSError('download failed')
+      ),
+  ]
+
+  output_video_files, moves = generation._download_generated_videos(  # pylint: disable=protected-access
+      veo_api_request_data,
+      {'response': {'videos': [{'gcsUri': uri} for uri in samples]}},
+      'promo',
+      product_data,
+  )
+
+  assert len(output_video_files) == 1
+  assert output_video_files[0]['local_file'].endswith('sample_0.mp4')
+  assert [source for source, _ in moves] == [samples[0]]
+
+
+@mock.patch('gen_v.video.generation._move_generated_videos')
+@mock.patch('gen_v.video.generation._download_generated_videos')
+@mock.patch('gen_v.video.generation.start_image_to_video')
+@mock.patch('gen_v.video.generation.storage.download_file_locally')
 def test_generate_videos_concurrently_success(
-    mock_worker_func, mock_app_settings
+    mock_download_file,
+    mock_start,
+    mock_download_videos,
+    mock_move_videos,
+    mock_app_settings,
 ):
-  """Tests successful concurrent generation and result aggregation."""
+  """Tests all generations are started, then collected in the item order."""
   items_to_process = [
       {'recolored_image_uri': 'gs://b/img1.png'},
       {'recolored_image_uri': 'gs://b/img2.png'},
+      {'title': 'No image'},
       {'recolored_image_uri': 'gs://b/img3.png'},
   ]
-
-  # 1st item had 1 result, 2nd failed and skipped/returned an empty list, 3rd
-  # returned 2 results.
-  mock_worker_results = [
-      [{'gcs_uri': 'gs://v/vid1a.mp4'}],
-      [],
-      [
+  mock_download_file.return_value = '/content/img.png'
+  # 1st item had 1 result, 2nd returned an empty list, 3rd was skipped and
+  # 4th returned 2 results.
+  videos_by_image = {
+      'gs://b/img1.png': [{'gcs_uri': 'gs://v/vid1a.mp4'}],
+      'gs://b/img2.png': [],
+      'gs://b/img3.png': [
           {'gcs_uri': 'gs://v/vid3a.mp4'},
           {'gcs_uri': 'gs://v/vid3b.mp4'},
       ],
-  ]
-  mock_worker_func.side_effect = mock_worker_results
+  }
+
+  def start(veo_request, settings):
+    del settings
+    operation = concurrent.futures.Future()
+    operation.set_result(
+        {'done': True, 'videos': videos_by_image[veo_request.image_uri]}
+    )
+    return f'operations/{veo_request.image_uri}', operation
+
+  mock_start.side_effect = start
+  mock_download_videos.side_effect = (
+      lambda veo_request, output, prefix, product: (
+          output['videos'],
+          [(video['gcs_uri'], 'moved') for video in output['videos']],
+      )
+  )
+
+  final_videos = generation.generate_videos_concurrently(
+      items_to_process, mock_app_settings
+  )
 
-  expected_final_list = [
+  assert final_videos == [
       {'gcs_uri': 'gs://v/vid1a.mp4'},
       {'gcs_uri': 'gs://v/vid3a.mp4'},
       {'gcs_uri': 'gs://v/vid3b.mp4'},
   ]
+  assert mock_start.call_count == 3
+  # The samples of all the items are moved at once.
+  mock_move_videos.assert_called_once_with(
+      final_videos,
+      [
+          ('gs://v/vid1a.mp4', 'moved'),
+          ('gs://v/vid3a.mp4', 'moved'),
+          ('gs://v/vid3b.mp4', 'moved'),
+      ],
+  )
+
+
+@mock.patch('gen_v.video.generation._move_generated_videos')
+@mock.patch('gen_v.video.generation._download_generated_videos')
+@mock.patch('gen_v.video.generation.start_image_to_video')
+@mock.patch('gen_v.video.clients.get_genai_client', autospec=True)
+@mock.patch('gen_v.video.generation.storage.download_file_locally')
+def test_generate_videos_concurrently_skips_item_gemini_keeps_rejecting(
+    mock_download_file,
+    mock_get_client,
+    mock_start,
+    mock_download_videos,
+    mock_move_videos,
+    mock_app_settings,
+    tmp_path,
+):
+  """Tests an item whose Gemini calls keep failing with 429 is skipped."""
+  del mock_move_videos
+  mock_app_settings.prompt_type = 'GEMINI'
+  mock_app_settings.gemini_prompt_cache_enabled = False
+
+  def download_file(uri):
+    # Each image holds its own URI, so Gemini can tell them apart.
+    local_path = tmp_path / uri.rsplit('/', maxsplit=1)[-1]
+    local_path.write_bytes(uri.encode())
+    return str(local_path)
+
+  def generate_content(model, contents, config):
+    del model, config
+    if contents[1].inline_data.data == b'gs://b/img1.png':
+      raise genai_errors.ClientError(429, {'error': {'message': 'quota'}})
+    return mock.Mock(text='Animate this')
+
+  def start(veo_request, settings):
+    del settings
+    operation = concurrent.futures.Future()
+    operation.set_result({'done': True})
+    return f'operations/{veo_request.image_uri}', operation
+
+  mock_download_file.side_effect = download_file
+  mock_get_client.return_value.models.generate_content.side_effect = (
+      generate_content
+  )
+  mock_start.side_effect = start
+  mock_download_videos.side_effect = (
+      lambda veo_request, output, prefix, product: (
+          [{'gcs_uri': veo_request.image_uri}],
+          [],
+      )
+  )
+
+  final_videos = generation.generate_videos_concurrently(
+      [
+          {'recolored_image_uri': 'gs://b/img1.png'},
+          {'recolored_image_uri': 'gs://b/img2.png'},
+      ],
+      mock_app_settings,
+  )
+
+  assert final_videos == [{'gcs_uri': 'gs://b/img2.png'}]
+  mock_start.assert_called_once()
+  # The rejected calls were retried before the item was given up.
+  assert mock_get_client.return_value.models.generate_content.call_count > 2
+
+
+@mock.patch('gen_v.video.generation._move_generated_videos')
+@mock.patch('gen_v.video.generation._download_generated_videos')
+@mock.patch('gen_v.video.generation.start_image_to_video')
+@mock.patch('gen_v.video.generation.storage.download_file_locally')
+def test_generate_videos_concurrently_skips_item_failed_download(
+    mock_download_file,
+    mock_start,
+    mock_download_videos,
+    mock_move_videos,
+    mock_app_settings,
+):
+  """Tests an item whose videos can't be downloaded doesn't stop the batch."""
+  del mock_move_videos
+  mock_download_file.return_value = '/content/img.png'
+
+  def start(veo_request, settings):
+    del settings
+    operation = concurrent.futures.Future()
+    operation.set_result({'done': True})
+    return f'operations/{veo_request.image_uri}', operation
+
+  def download_videos(veo_request, output, prefix, product):
+    del output, prefix, product
+    if veo_request.image_uri == 'gs://b/img1.png':
+      raise OSError('disk full')
+    return [{'gcs_uri': veo_request.image_uri}], []
+
+  mock_start.side_effect = start
+  mock_download_videos.side_effect = download_videos
+
+  final_videos = generation.generate_videos_concurrently(
+      [
+          {'recolored_image_uri': 'gs://b/img1.png'},
+          {'recolored_image_uri': 'gs://b/img2.png'},
+      ],
+      mock_app_settings,
+  )
+
+  assert final_videos == [{'gcs_uri': 'gs://b/img2.png'}]
+
+
+@mock.patch('gen_v.video.generation.send_request_to_google_api')
+def test_start_image_to_video_retries_rejected_request(
+    mock_send_request, veo_api_request_data, mock_app_settings
+):
+  rejected = requests.Response()
+  rejected.status_code = 429
+  mock_send_request.side_effect = [
+      requests.exceptions.HTTPError(response=rejected),
+      {'name': 'operations/1'},
+      {'name': 'operations/1', 'done': True},
+  ]
+
+  lro_name, operation = generation.start_image_to_video(
+      veo_api_request_data, mock_app_settings
+  )
+
+  assert lro_name == 'operations/1'
+  assert operation.result(timeout=5) == {'name': 'operations/1', 'done': True}
+
+
+@mock.patch('gen_v.video.generation.start_image_to_video')
+@mock.patch('gen_v.video.generation.storage.download_file_locally')
+def test_generate_videos_concurrently_skips_failed_items(
+    mock_download_file, mock_start, mock_app_settings
+):
+  """Tests an item whose generation failed yields no video, not an error."""
+  mock_download_file.return_value = '/content/img.png'
+  failed_operation = concurrent.futures.Future()
+  failed_operation.set_result({'done': True, 'error': {'code': 8}})
+  mock_start.side_effect = [None, ('operations/2', failed_operation)]
 
   final_videos = generation.generate_videos_concurrently(
-      items_to_process, mock_app_settings
+      [
+          {'recolored_image_uri': 'gs://b/img1.png', 'title': 'One'},
+          {'recolored_image_uri': 'gs://b/img2.png', 'title': 'Two'},
+      ],
+      mock_app_settings,
   )
 
-  assert final_videos == expected_final_list
-  assert mock_worker_func.call_count == len(items_to_process)
+  assert not final_videos
+  assert mock_start.call_count == 2
 
 
 @mock.patch('gen_v.video.generation.generate_videos_and_download')
@@ -0,0 +1,165 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the long-running operation poller."""
+import concurrent.futures
+import email.utils
+import threading
+import time
+from unittest import mock
+
+import pytest
+import requests
+
+from gen_v.video import operations
+
+
+def _http_error(status_code: int, headers: dict[str, str]):
+  """Returns an HTTPError with a response."""
+  response = requests.Response()
+  response.status_code = status_code
+  response.headers.update(headers)
+  return requests.exceptions.HTTPError(response=response)
+
+
+class _FakeOperations:
+  """Operations done after a number of polls, recording when each is polled."""
+
+  def __init__(self, polls_until_done: dict[str, int]):
+    self._polls_until_done = polls_until_done
+    self.poll_times = {name: [] for name in polls_until_done}
+    self._lock = threading.Lock()
+
+  def fetch(self, name: str) -> dict:
+    with self._lock:
+      self.poll_times[name].append(time.monotonic())
+      done = len(self.poll_times[name]) >= self._polls_until_done[name]
+    return {'name': name, 'done': done}
+
+
+def test_poller_resolves_each_operation():
+  fake = _FakeOperations({f'operations/{i}': i % 3 + 1 for i in range(50)})
+
+  with operations.OperationPoller(
+      fake.fetch, initial_interval=0.01, max_workers=2
+  ) as poller:
+    futures = {name: poller.submit(name) for name in fake.poll_times}
+    results = {
+        name: future.result(timeout=5) for name, future in futures.items()
+    }
+
+  for i in range(50):
+    name = f'operations/{i}'
+    assert results[name] == {'name': name, 'done': True}
+    assert len(fake.poll_times[name]) == i % 3 + 1
+
+
+def test_poller_backs_off():
+  fake = _FakeOperations({'operations/1': 4})
+
+  with operations.OperationPoller(
+      fake.fetch, initial_interval=0.05, max_interval=0.1, backoff_factor=2
+  ) as poller:
+    poller.submit('operations/1').result(timeout=5)
+
+  poll_times = fake.poll_times['operations/1']
+  intervals = [
+      later - earlier for earlier, later in zip(poll_times, poll_times[1:])
+  ]
+  assert intervals[0] == pytest.approx(0.05, abs=0.03)
+  assert intervals[1] == pytest.approx(0.1, abs=0.03)
+  assert intervals[2] == pytest.approx(0.1, abs=0.03)
+
+
+def test_poller_honors_retry_after():
+  fetch = mock.Mock(
+      side_effect=[
+          _http_error(429, {'Retry-After': '0.2'}),
+          {'done': True},
+      ]
+  )
+
+  with operations.OperationPoller(fetch, initial_interval=0.01) as poller:
+    started = time.monotonic()
+    result = poller.submit('operations/1').result(timeout=5)
+
+  assert result == {'done': True}
+  assert time.monotonic() - started >= 0.2
+
+
+def test_poller_times_out():
+  fetch = mock.Mock(return_value={'done': False})
+
+  with operations.OperationPoller(
+      fetch, initial_interval=0.01, timeout=0.05
+  ) as poller:
+    future = poller.submit('operations/1')
+    with pytest.raises(TimeoutError):
+      future.result(timeout=5)
+
+
+def test_poller_fails_on_unexpected_errors():
+  fetch = mock.Mock(side_effect=KeyError('name'))
+
+  with operations.OperationPoller(fetch) as poller:
+    future = poller.submit('operations/1')
+    with pytest.raises(KeyError):
+      future.result(timeout=5)
+
+
+def test_close_cancels_outstanding_operations():
+  poller = operations.OperationPoller(
+      mock.Mock(return_value={'done': False}), initial_interval=60
+  )
+  future = poller.submit('operations/1')
+
+  poller.close()
+
+  assert future.cancelled()
+  with pytest.raises(RuntimeError):
+    poller.submit('operations/2')
+
+
+def test_callbacks_run_on_completion():
+  done = concurrent.futures.Future()
+
+  with operations.OperationPoller(lambda name: {'done': True}) as poller:
+    poller.submit('operations/1').add_done_callback(
+        lambda future: done.set_result(future.result())
+    )
+    assert done.result(timeout=5) == {'done': True}
+
+
+@pytest.mark.parametrize(
+    'headers, expected',
+    [
+        ({}, None),
+        ({'Retry-After': '7'}, 7),
+        ({'Retry-After': 'soon'}, None),
+    ],
+)
+def test_get_retry_after(headers, expected):
+  assert operations.get_retry_after(_http_error(503, headers)) == expected
+
+
+def test_get_retry_after_http_date():
+  retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+
+  retry_after = operations.get_retry_after(
+      _http_error(429, {'Retry-After': retry_at})
+  )
+
+  assert retry_after == pytest.approx(30, abs=2)
+  assert (
+      operations.get_retry_after(requests.exceptions.ConnectionError()) is None
+  )
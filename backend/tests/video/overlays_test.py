@@ -0,0 +1,203 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for prepared image overlays."""
+import io
+from unittest import mock
+import moviepy as mp
+import numpy as np
+from PIL import Image
+import pytest
+from gen_v import models
+from gen_v import storage
+from gen_v.utils import image as image_utils
+from gen_v.video import overlays
+
+
+def _png_bytes(mode: str = 'RGBA', size: tuple[int, int] = (80, 40)) -> bytes:
+  rng = np.random.default_rng(seed=0)
+  pixels = rng.integers(0, 256, size=(size[1], size[0], 4), dtype=np.uint8)
+  buffer = io.BytesIO()
+  Image.fromarray(pixels, 'RGBA').convert(mode).save(buffer, 'PNG')
+  return buffer.getvalue()
+
+
+_LOGO_URI = 'mem://bucket/logo.png'
+
+
+@pytest.fixture(name='mock_download_bytes')
+def fixture_mock_download_bytes():
+  """Stores a logo in memory, counting its downloads."""
+  storage.upload_bytes(_png_bytes(), _LOGO_URI)
+  with mock.patch(
+      'gen_v.storage.download_bytes', wraps=storage.download_bytes
+  ) as mock_download:
+    yield mock_download
+  storage.get_backend(_LOGO_URI).clear()
+
+
+def test_overlay_asset_cache_prepares_each_overlay_once(
+    mock_download_bytes,
+):
+  """Tests repeated lookups reuse the prepared overlay."""
+  cache = overlays.OverlayAssetCache()
+  logo = models.ImageInput(path=_LOGO_URI, start=0, height=20)
+
+  first = cache.get(logo)
+  second = cache.get(logo)
+
+  assert first is second
+  assert first.size == (40, 20)
+  mock_download_bytes.assert_called_once_with(_LOGO_URI, use_cache=True)
+  assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.usefixtures('mock_download_bytes')
+def test_overlay_asset_cache_prepares_new_content_and_height():
+  """Tests a replaced image or another height is prepared again."""
+  cache = overlays.OverlayAssetCache()
+  logo = models.ImageInput(path=_LOGO_URI, start=0, height=20)
+  first = cache.get(logo)
+
+  storage.upload_bytes(_png_bytes(size=(60, 40)), _LOGO_URI)
+  second = cache.get(logo)
+  third = cache.get(logo.model_copy(update={'height': 10}))
+
+  assert first is not second
+  assert second.size == (30, 20)
+  assert third.size == (15, 10)
+  assert cache.misses == 3
+
+
+def test_overlay_asset_cache_evicts_least_recently_used(
+    mock_download_bytes,
+):
+  """Tests the cache keeps at most max_entries overlays."""
+  cache = overlays.OverlayAssetCache(max_entries=1)
+  logo = models.ImageInput(path=_LOGO_URI, start=0, height=20)
+  cache.get(logo)
+  cache.get(logo.model_copy(update={'height': 10}))
+  cache.get(logo)
+
+  assert cache.misses == 3
+  assert mock_download_bytes.call_count == 3
+
+
+def test_overlay_asset_cache_uses_given_fingerprint(mock_download_bytes):
+  """Tests no metadata is fetched when the fingerprint is known."""
+  cache = overlays.OverlayAssetCache()
+  logo = models.ImageInput(path=_LOGO_URI, start=0, height=20)
+
+  with mock.patch('gen_v.storage.get_blob_fingerprint') as mock_fingerprint:
+    cache.get(logo, 'md5:logo')
+    cache.get(logo, 'md5:logo')
+
+  mock_fingerprint.assert_not_called()
+  mock_download_bytes.assert_called_once_with(_LOGO_URI, use_cache=True)
+
+
+def test_overlay_asset_cache_releases_lock_of_failed_overlay(
+    mock_download_bytes,
+):
+  """Tests a failed preparation leaves no lock behind and can be retried."""
+  cache = overlays.OverlayAssetCache()
+  logo = models.ImageInput(path=_LOGO_URI, start=0, height=20)
+  mock_download_bytes.side_effect = [OSError('download failed')]
+
+  with pytest.raises(OSError, match='download failed'):
+    cache.get(logo)
+
+  assert not cache._key_locks  # pylint: disable=protected-access
+  mock_download_bytes.side_effect = None
+  assert cache.get(logo).size == (40, 20)
+  assert not cache._key_locks  # pylint: disable=protected-access
+
+
+@pytest.mark.parametrize('mode', ['RGBA', 'P', 'LA'])
+def test_prepared_overlay_clip_matches_image_file_clip(mode, tmpdir):
+  """Tests the clip is identical to one from the resized image file."""
+  image_bytes = _png_bytes(mode)
+  with Image.open(io.BytesIO(image_bytes)) as image:
+    resized_path = str(tmpdir / 'resized.png')
+    image_utils.rescale_image_height(image.convert('RGBA'), 20).save(
+        resized_path
+    )
+  expected_clip = mp.ImageClip(resized_path)
+
+  clip = overlays.prepare_overlay(image_bytes, 20).to_clip()
+
+  assert np.array_equal(clip.get_frame(0), expected_clip.get_frame(0))
+  assert np.array_equal(clip.mask.get_frame(0), expected_clip.mask.get_frame(0))
+
+
+def test_prepared_overlay_arrays_are_read_only():
+  """Tests the shared arrays can't be modified."""
+  overlay = overlays.prepare_overlay(_png_bytes(), None)
+
+  assert overlay.size == (80, 40)
+  with pytest.raises(ValueError):
+    overlay.rgb[0, 0] = 0
+  assert np.array_equal(
+      overlay.premultiplied_rgb,
+      overlay.rgb * overlay.mask[:, :, None].astype(np.uint32),
+  )
+
+
+def _random_overlay(rng, width: int, height: int) -> overlays.PreparedOverlay:
+  rgba = rng.integers(0, 256, size=(height, width, 4), dtype=np.uint8)
+  return overlays.PreparedOverlay.from_rgba(rgba)
+
+
+def test_composite_overlays_matches_composite_video_clip():
+  """Tests blending regions gives the frames CompositeVideoClip gives."""
+  rng = np.random.default_rng(seed=1)
+  frames = rng.integers(0, 256, size=(8, 45, 80, 3), dtype=np.uint8)
+  video_clip = mp.VideoClip(
+      lambda t: frames[int(t * 4) % 8], duration=4
+  ).with_fps(4)
+  placements = [
+      overlays.OverlayPlacement(
+          _random_overlay(rng, 20, 15), 0.5, 3, ('right', 'top')
+      ),
+      overlays.OverlayPlacement(_random_overlay(rng, 30, 30), 1, 2.5, (-5, 30)),
+  ]
+  expected_clip = video_clip
+  for placement in placements:
+    overlay_clip = (
+        placement.overlay.to_clip()
+        .with_duration(placement.duration)
+        .with_position(placement.position)
+        .with_effects([mp.vfx.CrossFadeIn(placement.fade_duration)])
+        .with_effects([mp.vfx.CrossFadeOut(placement.fade_duration)])
+    )
+    expected_clip = mp.CompositeVideoClip(
+        [expected_clip, overlay_clip.with_start(placement.start)]
+    )
+
+  clip = overlays.composite_overlays(video_clip, placements)
+
+  for time in np.arange(0, 4, 0.125):
+    assert np.array_equal(clip.get_frame(time), expected_clip.get_frame(time))
+
+
+def test_blend_overlay_only_writes_covered_region():
+  """Tests pixels outside the overlay and the frame bounds are untouched."""
+  rng = np.random.default_rng(seed=2)
+  overlay = _random_overlay(rng, 10, 10)
+  frame = np.zeros((20, 20, 3), dtype=np.uint8)
+
+  overlays.blend_overlay(frame, overlay, (15, -5))
+  overlays.blend_overlay(frame, overlay, (30, 30))
+
+  assert not frame[:, :15].any()
+  assert not frame[5:].any()
@@ -0,0 +1,56 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the Gemini prompt cache."""
+import os
+from gen_v import models
+from gen_v.video import prompt_cache
+
+
+def _request(image_bytes: bytes, prompt_text='Animate it', model_name='m1'):
+  """Returns a request with image bytes, as if read from a file."""
+  request = models.GeminiPromptRequest(
+      prompt_text=prompt_text, image_file_path=None, model_name=model_name
+  )
+  request.image_bytes = image_bytes
+  return request
+
+
+def test_make_prompt_cache_key_depends_on_every_input():
+  """Tests keys change with the image, prompt, model or media resolution."""
+  key = prompt_cache.make_prompt_cache_key(_request(b'image'), 'LOW')
+
+  assert key == prompt_cache.make_prompt_cache_key(_request(b'image'), 'LOW')
+  assert key != prompt_cache.make_prompt_cache_key(_request(b'other'), 'LOW')
+  assert key != prompt_cache.make_prompt_cache_key(
+      _request(b'image', prompt_text='Animate'), 'LOW'
+  )
+  assert key != prompt_cache.make_prompt_cache_key(
+      _request(b'image', model_name='m2'), 'LOW'
+  )
+  assert key != prompt_cache.make_prompt_cache_key(_request(b'image'), 'HIGH')
+
+
+def test_prompt_cache_round_trip(tmpdir):
+  """Tests saved prompts are found by a new cache using the same index."""
+  index_path = os.path.join(tmpdir, 'prompts.json')
+  cache = prompt_cache.PromptCache(index_path=index_path)
+  assert cache.get_prompt('key') is None
+  cache.put_prompt('key', 'A spinning toy')
+  cache.save()
+
+  reloaded_cache = prompt_cache.PromptCache(index_path=index_path)
+
+  assert reloaded_cache.get_prompt('key') == 'A spinning toy'
+  assert reloaded_cache.get_prompt('other') is None
+  assert reloaded_cache.hit_rate == 0.5
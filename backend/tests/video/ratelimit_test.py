@@ -0,0 +1,172 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the rate limits of the Veo and Gemini calls."""
+import concurrent.futures
+import threading
+import time
+from unittest import mock
+
+from google.genai import errors as genai_errors
+import pytest
+import requests
+
+from gen_v.video import ratelimit
+
+
+def _http_error(status_code: int, headers: dict[str, str] | None = None):
+  """Returns an HTTPError with a response."""
+  response = requests.Response()
+  response.status_code = status_code
+  response.headers.update(headers or {})
+  return requests.exceptions.HTTPError(response=response)
+
+
+@pytest.fixture(name='rate_limits', autouse=True)
+def fixture_rate_limits():
+  """Sets fast limits and retries, restoring the defaults after each test."""
+  ratelimit.configure_rate_limit(ratelimit.PREDICTION, 60_000)
+  ratelimit.configure_retries(initial_backoff=0.01, max_backoff=0.01)
+  yield
+  ratelimit.reset_rate_limits()
+
+
+def test_rate_limiter_spaces_calls():
+  limiter = ratelimit.RateLimiter(requests_per_minute=600)
+
+  start = time.monotonic()
+  for _ in range(4):
+    with limiter:
+      pass
+
+  # The first call is admitted at once, the others 0.1s apart.
+  assert time.monotonic() - start == pytest.approx(0.3, abs=0.05)
+
+
+def test_rate_limiter_allows_burst():
+  limiter = ratelimit.RateLimiter(requests_per_minute=60, burst=3)
+
+  start = time.monotonic()
+  for _ in range(3):
+    with limiter:
+      pass
+
+  assert time.monotonic() - start < 0.05
+
+
+def test_rate_limiter_bounds_calls_in_flight():
+  limiter = ratelimit.RateLimiter(requests_per_minute=60_000, max_concurrent=2)
+  in_flight = 0
+  most_in_flight = 0
+  lock = threading.Lock()
+
+  def call(_):
+    nonlocal in_flight, most_in_flight
+    with limiter:
+      with lock:
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+      time.sleep(0.01)
+      with lock:
+        in_flight -= 1
+
+  with concurrent.futures.ThreadPoolExecutor(8) as executor:
+    list(executor.map(call, range(16)))
+
+  assert most_in_flight == 2
+
+
+def test_rate_limiter_back_off_holds_calls():
+  limiter = ratelimit.RateLimiter(requests_per_minute=60_000)
+
+  limiter.back_off(0.1)
+  start = time.monotonic()
+  with limiter:
+    pass
+
+  assert time.monotonic() - start == pytest.approx(0.1, abs=0.05)
+
+
+@pytest.mark.parametrize(
+    'requests_per_minute,max_concurrent', [(0, None), (1, 0)]
+)
+def test_rate_limiter_rejects_invalid_limits(
+    requests_per_minute, max_concurrent
+):
+  with pytest.raises(ValueError):
+    ratelimit.RateLimiter(requests_per_minute, max_concurrent)
+
+
+@pytest.mark.parametrize(
+    'error',
+    [
+        _http_error(429),
+        _http_error(503),
+        genai_errors.ServerError(503, {'error': {'message': 'overloaded'}}),
+        genai_errors.ClientError(429, {'error': {'message': 'quota'}}),
+    ],
+)
+def test_call_with_retries_retries_rejected_calls(error):
+  func = mock.Mock(side_effect=[error, error, 'done'])
+
+  assert ratelimit.call_with_retries(ratelimit.PREDICTION, func) == 'done'
+  assert func.call_count == 3
+
+
+def test_call_with_retries_raises_other_errors_at_once():
+  func = mock.Mock(side_effect=_http_error(400))
+
+  with pytest.raises(requests.exceptions.HTTPError):
+    ratelimit.call_with_retries(ratelimit.PREDICTION, func)
+  assert func.call_count == 1
+
+
+def test_call_with_retries_gives_up():
+  func = mock.Mock(side_effect=_http_error(429))
+
+  with pytest.raises(requests.exceptions.HTTPError):
+    ratelimit.call_with_retries(ratelimit.PREDICTION, func, max_retries=2)
+  assert func.call_count == 3
+
+
+def test_call_with_retries_honors_retry_after():
+  func = mock.Mock(side_effect=[_http_error(429, {'Retry-After': '0.2'}), 1])
+
+  start = time.monotonic()
+  ratelimit.call_with_retries(ratelimit.PREDICTION, func)
+
+  assert time.monotonic() - start == pytest.approx(0.2, abs=0.1)
+
+
+def test_rejected_call_holds_back_its_budget():
+  func = mock.Mock(side_effect=_http_error(429, {'Retry-After': '0.2'}))
+
+  with pytest.raises(requests.exceptions.HTTPError):
+    ratelimit.call_with_retries(ratelimit.PREDICTION, func, max_retries=0)
+  start = time.monotonic()
+  with ratelimit.get_rate_limiter(ratelimit.PREDICTION):
+    pass
+
+  assert time.monotonic() - start == pytest.approx(0.2, abs=0.1)
+
+
+def test_configure_rate_limit_keeps_unchanged_limiter():
+  ratelimit.configure_rate_limit(ratelimit.GEMINI, 120, 4)
+  limiter = ratelimit.get_rate_limiter(ratelimit.GEMINI)
+
+  ratelimit.configure_rate_limit(ratelimit.GEMINI, 120, 4)
+  assert ratelimit.get_rate_limiter(ratelimit.GEMINI) is limiter
+  ratelimit.configure_rate_limit(ratelimit.GEMINI, 240, 4)
+  assert ratelimit.get_rate_limiter(ratelimit.GEMINI).requests_per_minute == 240
+  with pytest.raises(ValueError):
+    ratelimit.configure_retries(max_retries=-1)